@@ -0,0 +1,81 @@
+"""
+Microbenchmarks of the repository functions and the Auth service.
+
+They are not part of the regular test run. Timings only compare on the same
+machine, so baselines are saved under benchmarks/micro/baselines, which is not
+committed, and a change is compared against a baseline of the main branch made
+on the same machine::
+
+    git checkout main
+    pytest benchmarks/micro --benchmark-autosave
+    git checkout my-change
+    pytest benchmarks/micro --benchmark-compare
+
+In CI, run both steps in the same job, so that they use the same runner, or
+point --benchmark-storage at a location kept per runner type.
+
+A comparison fails when the minimum time of any benchmark, the statistic
+least affected by other load on the machine, regresses by more than
+REGRESSION_THRESHOLD percent (BENCH_REGRESSION_THRESHOLD in the
+environment), unless --benchmark-compare-fail is given explicitly. Shared or
+virtualized runners vary more than that between two runs of the same tree;
+check the spread of two baseline runs there and raise the threshold above it.
+"""
+
+import asyncio
+import os
+from pathlib import Path
+
+import fakeredis
+import pytest
+
+from benchmarks.seed import seed, user_email
+from src.database.models import User
+
+REGRESSION_THRESHOLD = int(os.environ.get("BENCH_REGRESSION_THRESHOLD", 10))
+DATASETS = (1_000, 10_000)
+BASELINES = Path(__file__).parent / "baselines"
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    if config.getoption("benchmark_storage") == "file://./.benchmarks":
+        config.option.benchmark_storage = f"file://{BASELINES}"
+    if config.getoption("benchmark_compare") and not config.getoption(
+        "benchmark_compare_fail"
+    ):
+        from pytest_benchmark.utils import parse_compare_fail
+
+        config.option.benchmark_compare_fail = [
+            parse_compare_fail(f"min:{REGRESSION_THRESHOLD}%")
+        ]
+
+
+@pytest.fixture(scope="session")
+def run():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def session_factory(tmp_path_factory):
+    db_path = tmp_path_factory.mktemp("micro") / "bench.db"
+    return seed(f"sqlite:///{db_path}", DATASETS)
+
+
+@pytest.fixture(params=DATASETS, ids=lambda size: f"{size}-contacts")
+def dataset(request, session_factory):
+    db = session_factory()
+    user = db.query(User).filter(User.email == user_email(request.param)).first()
+    yield user, db
+    db.close()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    from src.services.resources import resources
+
+    r = fakeredis.FakeRedis()
+    monkeypatch.setattr(resources, "redis", r)
+    return r
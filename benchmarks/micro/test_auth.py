@@ -0,0 +1,46 @@
+from src.services.auth import auth_service
+
+
+def test_get_current_user_cache_hit(benchmark, run, dataset, fake_redis):
+    user, db = dataset
+    token = run(auth_service.create_access_token(data={"sub": user.email}))
+    run(auth_service.get_current_user(token, db))
+    result = benchmark(lambda: run(auth_service.get_current_user(token, db)))
+    assert result.email == user.email
+
+
+def test_get_current_user_cache_miss(benchmark, run, dataset, fake_redis):
+    user, db = dataset
+    token = run(auth_service.create_access_token(data={"sub": user.email}))
+
+    def setup():
+        fake_redis.flushall()
+
+    result = benchmark.pedantic(
+        lambda: run(auth_service.get_current_user(token, db)),
+        setup=setup,
+        rounds=200,
+    )
+    assert result.email == user.email
+
+
+def test_create_access_token(benchmark, run):
+    result = benchmark(
+        lambda: run(auth_service.create_access_token(data={"sub": "bench@example.com"}))
+    )
+    assert result
+
+
+def test_get_password_hash(benchmark):
+    result = benchmark.pedantic(
+        auth_service.get_password_hash, args=("bench123",), rounds=5
+    )
+    assert result
+
+
+def test_verify_password(benchmark):
+    hashed = auth_service.get_password_hash("bench123")
+    result = benchmark.pedantic(
+        auth_service.verify_password, args=("bench123", hashed), rounds=5
+    )
+    assert result
@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+from benchmarks.seed import generate_contacts
+from src.services.dedup import Candidate, find_duplicates
+
+
+def candidates(size: int, duplicates: float = 0.05) -> list[Candidate]:
+    """Seeded contacts with a share of re-typed copies of earlier ones."""
+    rnd = random.Random(size)
+    rows = [
+        Candidate(
+            i, c["firstname"], c["lastname"], c["email"], c["phone"], c["birthday"]
+        )
+        for i, c in enumerate(generate_contacts(1, size))
+    ]
+    for i in range(int(size * duplicates)):
+        original = rows[rnd.randrange(size)]
+        rows.append(
+            original._replace(
+                id=size + i,
+                email=original.email.upper() if rnd.random() < 0.5 else None,
+                lastname=original.lastname[:-1] + "a",
+            )
+        )
+    return rows
+
+
+@pytest.mark.parametrize("size", (10_000, 100_000), ids=lambda s: f"{s}-contacts")
+def test_find_duplicates(benchmark, size):
+    rows = candidates(size)
+    pairs = benchmark.pedantic(find_duplicates, args=(rows,), rounds=3)
+    assert len(pairs) >= size * 0.05 * 0.9
@@ -0,0 +1,52 @@
+from src.repository import contacts as repository_contacts
+from src.repository import users as repository_users
+
+
+def test_get_contacts(benchmark, run, dataset):
+    user, db = dataset
+    result = benchmark(lambda: run(repository_contacts.get_contacts(user, db)))
+    assert result
+
+
+def test_get_contacts_by_tag(benchmark, run, dataset):
+    user, db = dataset
+    result = benchmark(
+        lambda: run(repository_contacts.get_contacts(user, db, ["tag-7", "tag-42"]))
+    )
+    assert result
+
+
+def test_get_contacts_by_all_tags(benchmark, run, dataset):
+    user, db = dataset
+    result = benchmark(
+        lambda: run(
+            repository_contacts.get_contacts(user, db, ["tag-7", "tag-42"], True)
+        )
+    )
+    assert result is not None
+
+
+def test_get_birthday_per_week(benchmark, run, dataset):
+    user, db = dataset
+    result = benchmark(lambda: run(repository_contacts.get_birthday_per_week(user, db)))
+    assert result is not None
+
+
+def test_search_contact(benchmark, run, dataset):
+    user, db = dataset
+    result = benchmark(
+        lambda: run(repository_contacts.search_contact("chenko", user, db))
+    )
+    assert result
+
+
+def test_search_contact_not_found(benchmark, run, dataset):
+    user, db = dataset
+    result = benchmark(lambda: run(repository_contacts.search_contact("zzz", user, db)))
+    assert result is None
+
+
+def test_get_user_by_email(benchmark, run, dataset):
+    user, db = dataset
+    result = benchmark(lambda: run(repository_users.get_user_by_email(user.email, db)))
+    assert result.id == user.id
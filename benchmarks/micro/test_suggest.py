@@ -0,0 +1,10 @@
+from src.repository import contacts as repository_contacts
+from src.services.suggest import SuggestIndex
+
+
+def test_suggest(benchmark, run, dataset, fake_redis):
+    user, db = dataset
+    index = SuggestIndex(lambda: fake_redis)
+    index.build("0:1", run(repository_contacts.get_contact_names(user, db)))
+    result = benchmark(index.suggest, "0:1", "ole", 10)
+    assert len(result) == 10
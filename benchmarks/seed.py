@@ -0,0 +1,199 @@
+"""
+Seeded data generators for the benchmarks.
+
+The same seed always produces the same users and contacts, so runs on
+different commits work on identical datasets::
+
+    python -m benchmarks.seed --db-url sqlite:///./bench.db --contacts 1000 10000 100000
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.database.models import Base, Contact, Tag, User, contact_tags
+from src.database.phone import reverse_digits
+
+DATASETS = (1_000, 10_000, 100_000)
+# Every seeded user has TAGS tags and every contact up to MAX_TAGS of them
+TAGS = 300
+MAX_TAGS = 3
+PASSWORD = "bench123"
+FIRSTNAMES = (
+    "Olena",
+    "Andrii",
+    "Maria",
+    "Taras",
+    "Iryna",
+    "Dmytro",
+    "Sofia",
+    "Oleh",
+    "Kateryna",
+    "Bohdan",
+    "Anna",
+    "Mykola",
+    "Yulia",
+    "Petro",
+    "Nadia",
+    "Ivan",
+)
+LASTNAMES = (
+    "Shevchenko",
+    "Bondarenko",
+    "Kovalenko",
+    "Tkachenko",
+    "Kravchenko",
+    "Melnyk",
+    "Oliinyk",
+    "Lysenko",
+    "Marchenko",
+    "Rudenko",
+    "Savchenko",
+    "Boiko",
+)
+_password_hash = None
+
+
+def user_email(contacts: int, index: int = 0) -> str:
+    """
+    The user_email function returns the email of a seeded user.
+
+    :param contacts: int: The number of contacts of the user
+    :param index: int: Distinguish several users with the same dataset size
+    :return: The email address of the user
+    """
+    return f"bench-{contacts}-{index}@example.com"
+
+
+def password_hash() -> str:
+    """
+    The password_hash function hashes the benchmark password once per process.
+
+    :return: The bcrypt hash of PASSWORD
+    """
+    global _password_hash
+    if _password_hash is None:
+        _password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(
+            PASSWORD
+        )
+    return _password_hash
+
+
+def generate_contacts(user_id: int, count: int, seed: int = 0):
+    """
+    The generate_contacts function yields rows for a bulk insert into the contacts table.
+
+    :param user_id: int: The owner of the contacts
+    :param count: int: How many contacts to generate
+    :param seed: int: The seed of the random generator
+    :return: A generator of dicts
+    """
+    rnd = random.Random(f"{seed}:{user_id}")
+    start = date(1960, 1, 1)
+    for i in range(count):
+        # Bulk inserts skip the model, so the derived phone columns are set here
+        phone = f"+380{rnd.randrange(10**8, 10**9)}"
+        yield {
+            "firstname": rnd.choice(FIRSTNAMES),
+            "lastname": rnd.choice(LASTNAMES),
+            "email": f"c{user_id}-{i}@bench.example.com",
+            "phone": phone,
+            "phone_normalized": phone,
+            "phone_reversed": reverse_digits(phone),
+            "birthday": start + timedelta(days=rnd.randrange(365 * 45)),
+            "user_id": user_id,
+        }
+
+
+def generate_links(user_id: int, contact_ids, tag_ids, seed: int = 0):
+    """
+    The generate_links function yields rows for a bulk insert into the contact_tags table.
+
+    :param user_id: int: The owner of the contacts
+    :param contact_ids: The ids of the contacts
+    :param tag_ids: The ids of the tags
+    :param seed: int: The seed of the random generator
+    :return: A generator of dicts
+    """
+    rnd = random.Random(f"{seed}:{user_id}:tags")
+    for contact_id in contact_ids:
+        for tag_id in rnd.sample(tag_ids, rnd.randrange(MAX_TAGS + 1)):
+            yield {"contact_id": contact_id, "tag_id": tag_id, "user_id": user_id}
+
+
+def insert_batches(db: Session, table, rows, batch: int) -> None:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == batch:
+            db.execute(insert(table), chunk)
+            chunk = []
+    if chunk:
+        db.execute(insert(table), chunk)
+
+
+def seed_user(db: Session, email: str, contacts: int, batch: int = 5_000) -> User:
+    """
+    The seed_user function creates a confirmed user with the given number of contacts.
+    An existing user with the same email is reused, so seeding is idempotent.
+
+    :param db: Session: The database session
+    :param email: str: The email of the user
+    :param contacts: int: The number of contacts to create
+    :param batch: int: The number of rows per insert statement
+    :return: The user object
+    """
+    user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+    if user is not None:
+        return user
+    user = User(
+        username=email.split("@")[0][:50],
+        email=email,
+        password=password_hash(),
+        confirmed=True,
+    )
+    db.add(user)
+    db.flush()
+    insert_batches(db, Contact, generate_contacts(user.id, contacts), batch)
+    db.execute(
+        insert(Tag), [{"name": f"tag-{i}", "user_id": user.id} for i in range(TAGS)]
+    )
+    tag_ids = db.scalars(select(Tag.id).where(Tag.user_id == user.id)).all()
+    contact_ids = db.scalars(select(Contact.id).where(Contact.user_id == user.id))
+    links = generate_links(user.id, contact_ids.all(), sorted(tag_ids))
+    insert_batches(db, contact_tags, links, batch)
+    db.commit()
+    return user
+
+
+def seed(db_url: str, datasets=DATASETS, session_users: int = 0) -> sessionmaker:
+    """
+    The seed function creates the schema and one user per dataset size.
+
+    :param db_url: str: The database to seed
+    :param datasets: The contact counts of the seeded users
+    :param session_users: int: Extra users with 10 contacts for login and refresh scenarios
+    :return: A session factory bound to the seeded database
+    """
+    engine = create_engine(db_url)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as db:
+        for size in datasets:
+            seed_user(db, user_email(size), size)
+        for index in range(session_users):
+            seed_user(db, user_email(10, index), 10)
+    return factory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db-url", default="sqlite:///./bench.db")
+    parser.add_argument("--contacts", type=int, nargs="+", default=list(DATASETS))
+    parser.add_argument("--session-users", type=int, default=16)
+    args = parser.parse_args()
+    seed(args.db_url, args.contacts, args.session_users)
@@ -0,0 +1,212 @@
+"""
+Cold start profile of the app.
+
+Starts fresh interpreters with ``-X importtime`` and measures, in each one, the
+time to import main and to answer the first request in-process. Saves the
+medians and the slowest imports as JSON::
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --compare benchmarks/results/startup-<commit>.json
+
+The first request goes to /health/live, which touches neither the database nor
+Redis, so the run needs no running service. The heavy integrations are listed
+with whether main imported them, they should only load on first use.
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.loadtest import RESULTS_DIR, git_commit
+
+ROOT = Path(__file__).parent.parent
+LAZY_MODULES = ("cloudinary", "fastapi_mail", "jinja2", "libgravatar", "passlib")
+# The request is sent to the ASGI app directly, an HTTP client would add its own
+# imports to the measured time
+CHILD = """
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+import asyncio, json
+
+async def first_request():
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/health/live",
+        "raw_path": b"/health/live",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await main.app(scope, receive, send)
+    assert messages[0]["status"] == 200, messages
+
+asyncio.run(first_request())
+answered = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (answered - imported) * 1000,
+    "answered_at": time.time(),
+}))
+"""
+_import_line = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def parse_importtime(stderr: str, root: str = "main") -> list[dict]:
+    """
+    The parse_importtime function reads the output of ``python -X importtime``
+    and keeps the imports done by a top level module, those of the interpreter
+    startup and of the benchmark itself are left out.
+
+    :param stderr: str: The standard error of the interpreter
+    :param root: str: The top level module whose imports are kept
+    :return: The name, depth, own and cumulative milliseconds of every import
+    """
+    imports = []
+    for line in stderr.splitlines():
+        match = _import_line.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = match.groups()
+        item = {
+            "module": name,
+            "depth": len(indent) // 2,
+            "self_ms": int(own) / 1000,
+            "cumulative_ms": int(cumulative) / 1000,
+        }
+        # A module is reported after its imports, so a top level module
+        # closes the list of the imports it did
+        if item["depth"] == 0 and name != root:
+            imports = []
+            continue
+        imports.append(item)
+        if item["depth"] == 0:
+            return imports
+    return imports
+
+
+def run_once() -> dict:
+    """
+    The run_once function starts one interpreter and profiles its cold start.
+
+    :return: The timings of the run and its imports
+    """
+    launched = time.time()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = json.loads(process.stdout.strip().splitlines()[-1])
+    timings["ready_ms"] = (timings.pop("answered_at") - launched) * 1000
+    timings["imports"] = parse_importtime(process.stderr)
+    return timings
+
+
+def summarize(runs: list[dict], top: int) -> dict:
+    """
+    The summarize function keeps the medians of the runs and the slowest imports.
+
+    :param runs: list[dict]: The results of run_once
+    :param top: int: The number of imports to keep
+    :return: The summary of the runs
+    """
+    cumulative = {}
+    for run in runs:
+        for item in run["imports"]:
+            cumulative.setdefault(item["module"], []).append(item["cumulative_ms"])
+    # Top level packages only, their submodules are part of the cumulative time
+    packages = {
+        item["module"]: round(statistics.median(cumulative[item["module"]]), 2)
+        for item in runs[0]["imports"]
+        if "." not in item["module"] or item["module"].startswith("src.")
+    }
+    return {
+        "timings": {
+            key: round(statistics.median(run[key] for run in runs), 2)
+            for key in ("import_ms", "first_request_ms", "ready_ms")
+        },
+        "modules": len(runs[0]["imports"]),
+        "slowest_imports": dict(
+            sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ),
+        "lazy_modules_imported": [name for name in LAZY_MODULES if name in cumulative],
+    }
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """
+    The compare function prints the change of every timing against a previous run.
+
+    :param current: dict: The results of this run
+    :param baseline: dict: The results of the previous run
+    :return: None
+    """
+    print(f"\ncompared with {baseline['meta']['commit']}:")
+    for key, value in current["timings"].items():
+        old = baseline["timings"].get(key)
+        if old:
+            print(f"  {key:<18} {(value - old) / old * 100:+.1f}%")
+
+
+def main(args) -> dict:
+    # The first run also writes the bytecode caches, it is not measured
+    run_once()
+    runs = [run_once() for _ in range(args.runs)]
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+        },
+        **summarize(runs, args.top),
+    }
+    for key, value in result["timings"].items():
+        print(f"{key:<18} {value:>9} ms")
+    print(f"\n{result['modules']} modules, slowest:")
+    for name, value in result["slowest_imports"].items():
+        print(f"  {name:<40} {value:>9} ms")
+    if result["lazy_modules_imported"]:
+        print("\nimported at startup: " + ", ".join(result["lazy_modules_imported"]))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="A previous result file")
+    args = parser.parse_args()
+
+    result = main(args)
+    output = args.output or RESULTS_DIR / f"startup-{result['meta']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"\nsaved to {output}")
+    if args.compare:
+        compare(result, json.loads(args.compare.read_text()))
@@ -1,43 +1,71 @@
-import uvicorn
-import redis.asyncio as redis
-from fastapi import Depends, FastAPI, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
 from fastapi_limiter import FastAPILimiter
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.database.db import get_db
-from src.routes import contacts, auth, users
+from src.database.instrumentation import QueryInstrumentationMiddleware
+from src.routes import contacts, auth, users, health
 from src.conf.config import settings
+from src.services.auth import revocation_list
+from src.services.events import contact_events
+from src.services.idempotency import IdempotencyMiddleware
+from src.services.metrics import (
+    MetricsMiddleware,
+    metrics_response,
+    rate_limit_callback,
+)
+from src.services.resources import resources
+from src.services.throttle import rate_limit_identifier
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
 
-@app.on_event("startup")
-async def startup():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    The startup function is called when the application starts up.
-    It's a good place to initialize things that are used by the app, such as
-    connecting to databases or initializing caches.
+    The lifespan function opens the shared resources of the worker and starts
+    the background threads when the application starts. When it stops, after the
+    requests in progress are done, it stops the threads and closes the resources.
 
-    :return: A coroutine, so we can't use it directly
+    :param app: FastAPI: The application
+    :return: An async context manager
     """
-    r = await redis.Redis(
-        host=settings.redis_host,
-        port=settings.redis_port,
-        db=0,
-        encoding="utf-8",
-        decode_responses=True,
-    )
-    await FastAPILimiter.init(r)
+    await resources.open()
+    try:
+        await FastAPILimiter.init(
+            resources.limiter_redis,
+            identifier=rate_limit_identifier,
+            http_callback=rate_limit_callback,
+        )
+    except Exception as e:
+        # The other routes are served, rate limited ones fail until a restart
+        logger.error("initializing the rate limiter failed: %s", e)
+    revocation_list.start()
+    try:
+        yield
+    finally:
+        revocation_list.stop()
+        contact_events.stop()
+        await resources.close()
+
 
+app = FastAPI(lifespan=lifespan)
 
+
+app.add_middleware(QueryInstrumentationMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(MetricsMiddleware)
+# Added last to be outermost, so responses of the other middleware such as
+# replayed idempotent requests carry the CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "Idempotent-Replayed"],
 )
 
 
@@ -51,29 +79,27 @@ async def root():
     return {"message": "Hello World"}
 
 
-@app.get("api/healthcheacker")
-def healthcheacker(db: Session = Depends(get_db)):
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
     """
-    The healthcheacker function is used to check the health of the database.
+    The metrics function exports the application metrics for Prometheus.
 
-    :param db: Session: Pass the database connection to the function
-    :return: A dict with a message
+    :return: The metrics in the Prometheus text format
     """
-    try:
-        result = db.execute(text("SELECT 1")).fetchone()
-        if result is None:
-            raise HTTPException(
-                status_code=500, detail="Database is not configured correctly"
-            )
-        return {"message": "Welcome to FastAPI!"}
-    except Exception as e:
-        print(e)
-        raise HTTPException(status_code=500, detail="Error connecting to the database")
+    return metrics_response()
 
 
 app.include_router(auth.router, prefix="/api")
 app.include_router(contacts.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
+app.include_router(health.router)
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", port=8000, reload=True)
+    # Development server, see src/conf/gunicorn.py for production
+    import os
+
+    import uvicorn
+
+    # Logs the SQL of every query, the reloaded server reads it from the environment
+    os.environ.setdefault("DB_ECHO", "true")
+    uvicorn.run("main:app", port=settings.server_port, reload=True)
@@ -0,0 +1,53 @@
+"""Contact changes for delta sync
+
+Revision ID: 36beda245e89
+Revises: 6959e07b42ab
+Create Date: 2026-10-19 12:04:17.530912
+
+Adds the (user_id, updated_at, id) index that GET /api/contacts/changes pages
+through and the contact_tombstones table that records deleted contacts.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "36beda245e89"
+down_revision: Union[str, None] = "6959e07b42ab"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "contact_tombstones",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("contact_id", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_contact_tombstones_user_id_deleted_at",
+        "contact_tombstones",
+        ["user_id", "deleted_at", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_contacts_user_id_updated_at",
+        "contacts",
+        ["user_id", "updated_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_contacts_user_id_updated_at", table_name="contacts")
+    op.drop_index(
+        "ix_contact_tombstones_user_id_deleted_at", table_name="contact_tombstones"
+    )
+    op.drop_table("contact_tombstones")
@@ -0,0 +1,131 @@
+"""Partition contacts by user
+
+Revision ID: 6959e07b42ab
+Revises: 6ddfcbc846cb
+Create Date: 2026-10-19 10:12:41.318204
+
+On PostgreSQL the contacts table becomes a declarative HASH partitioned table
+on user_id with PARTITIONS partitions. Every query of the app filters on
+user_id, so the planner reads a single partition and its indexes stay small.
+
+A partitioned table cannot have a unique index without the partition key,
+so the unique index on email becomes a unique index on (user_id, email),
+which is the rule the API enforces anyway. Rows without a user_id are not
+reachable through the API and are not copied.
+
+The rows are copied with a single INSERT ... SELECT while the table is
+locked; run it in a maintenance window on large databases.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "6959e07b42ab"
+down_revision: Union[str, None] = "6ddfcbc846cb"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+COLUMNS = (
+    "id, firstname, lastname, email, phone, birthday, created_at, updated_at, user_id"
+)
+INDEXES = ("birthday", "email", "firstname", "lastname", "phone")
+
+
+def create_indexes(columns: Sequence[str]) -> None:
+    for column in columns:
+        op.create_index(
+            op.f(f"ix_contacts_{column}"), "contacts", [column], unique=False
+        )
+    op.create_index(op.f("ix_contacts_user_id"), "contacts", ["user_id"], unique=False)
+    op.create_index(
+        "ix_contacts_user_id_email", "contacts", ["user_id", "email"], unique=True
+    )
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(op.f("ix_contacts_email"), table_name="contacts")
+        create_indexes(["email"])
+        return
+
+    op.execute("ALTER TABLE contacts RENAME TO contacts_old")
+    op.execute("ALTER INDEX contacts_pkey RENAME TO contacts_old_pkey")
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY NONE")
+    for column in INDEXES:
+        op.drop_index(op.f(f"ix_contacts_{column}"), table_name="contacts_old")
+    op.execute("""
+        CREATE TABLE contacts (
+            id INTEGER NOT NULL DEFAULT nextval('contacts_id_seq'),
+            firstname VARCHAR(50) NOT NULL,
+            lastname VARCHAR(50) NOT NULL,
+            email VARCHAR(50),
+            phone VARCHAR(50) NOT NULL,
+            birthday DATE NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            PRIMARY KEY (id, user_id)
+        ) PARTITION BY HASH (user_id)
+        """)
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE contacts_p{remainder} PARTITION OF contacts "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+        )
+    op.execute(
+        f"INSERT INTO contacts ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM contacts_old WHERE user_id IS NOT NULL"
+    )
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id")
+    op.drop_table("contacts_old")
+    create_indexes(INDEXES)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_contacts_user_id_email", table_name="contacts")
+    op.drop_index(op.f("ix_contacts_user_id"), table_name="contacts")
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(op.f("ix_contacts_email"), table_name="contacts")
+        op.create_index(op.f("ix_contacts_email"), "contacts", ["email"], unique=True)
+        return
+
+    op.execute("ALTER TABLE contacts RENAME TO contacts_partitioned")
+    op.execute("ALTER INDEX contacts_pkey RENAME TO contacts_partitioned_pkey")
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY NONE")
+    for column in INDEXES:
+        op.drop_index(op.f(f"ix_contacts_{column}"), table_name="contacts_partitioned")
+    op.create_table(
+        "contacts",
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('contacts_id_seq')"),
+            nullable=False,
+        ),
+        sa.Column("firstname", sa.String(length=50), nullable=False),
+        sa.Column("lastname", sa.String(length=50), nullable=False),
+        sa.Column("email", sa.String(length=50), nullable=True),
+        sa.Column("phone", sa.String(length=50), nullable=False),
+        sa.Column("birthday", sa.Date(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(
+        f"INSERT INTO contacts ({COLUMNS}) SELECT {COLUMNS} FROM contacts_partitioned"
+    )
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id")
+    op.drop_table("contacts_partitioned")
+    for column in INDEXES:
+        op.create_index(
+            op.f(f"ix_contacts_{column}"),
+            "contacts",
+            [column],
+            unique=column == "email",
+        )
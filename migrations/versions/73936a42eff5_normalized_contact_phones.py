@@ -0,0 +1,122 @@
+"""Normalized contact phones
+
+Revision ID: 73936a42eff5
+Revises: 36beda245e89
+Create Date: 2026-10-19 14:21:55.072301
+
+Adds phone_normalized (E.164) and phone_reversed (its digits reversed, for
+suffix search) with their indexes, and fills them for the existing contacts
+in batches of BATCH rows. The normalization is a copy of the one of the app
+at the time, so that later changes to it do not change this migration.
+"""
+
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.conf.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "73936a42eff5"
+down_revision: Union[str, None] = "36beda245e89"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH = 5000
+EXTENSION = re.compile(r"(?i)\s*(?:ext\.?|x|#).*$")
+NOT_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone: str | None, country_code: str) -> str | None:
+    if not phone:
+        return None
+    phone = EXTENSION.sub("", phone.strip())
+    digits = NOT_DIGITS.sub("", phone)
+    if phone.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    elif not (digits.startswith(country_code) and len(digits) >= 11):
+        digits = country_code + digits
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    return f"+{digits}"
+
+
+def reverse_digits(phone: str | None) -> str | None:
+    digits = NOT_DIGITS.sub("", phone or "")
+    return digits[::-1] or None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "contacts", sa.Column("phone_normalized", sa.String(length=16), nullable=True)
+    )
+    op.add_column(
+        "contacts", sa.Column("phone_reversed", sa.String(length=15), nullable=True)
+    )
+
+    contacts = sa.table(
+        "contacts",
+        sa.column("id", sa.Integer),
+        sa.column("phone", sa.String),
+        sa.column("phone_normalized", sa.String),
+        sa.column("phone_reversed", sa.String),
+    )
+    update = (
+        contacts.update()
+        .where(contacts.c.id == sa.bindparam("_id"))
+        .values(
+            phone_normalized=sa.bindparam("normalized"),
+            phone_reversed=sa.bindparam("reversed"),
+        )
+    )
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(contacts.c.id, contacts.c.phone)
+            .where(contacts.c.id > last_id)
+            .order_by(contacts.c.id)
+            .limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        params = []
+        for contact_id, phone in rows:
+            normalized = normalize_phone(phone, settings.phone_default_country_code)
+            params.append(
+                {
+                    "_id": contact_id,
+                    "normalized": normalized,
+                    "reversed": reverse_digits(normalized),
+                }
+            )
+        conn.execute(update, params)
+        last_id = rows[-1][0]
+
+    op.create_index(
+        "ix_contacts_user_id_phone_normalized",
+        "contacts",
+        ["user_id", "phone_normalized"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_contacts_user_id_phone_reversed",
+        "contacts",
+        ["user_id", "phone_reversed"],
+        unique=False,
+        postgresql_ops={"phone_reversed": "text_pattern_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_contacts_user_id_phone_reversed", table_name="contacts")
+    op.drop_index("ix_contacts_user_id_phone_normalized", table_name="contacts")
+    op.drop_column("contacts", "phone_reversed")
+    op.drop_column("contacts", "phone_normalized")
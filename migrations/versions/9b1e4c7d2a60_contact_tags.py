@@ -0,0 +1,66 @@
+"""Contact tags
+
+Revision ID: 9b1e4c7d2a60
+Revises: 73936a42eff5
+Create Date: 2026-10-19 16:02:37.914522
+
+Adds the tags of every user and the contact_tags table linking them to
+contacts. Links are found by (tag_id, contact_id) when filtering by tag and
+by the primary key (contact_id, tag_id) when listing the tags of contacts.
+The link references contacts by (id, user_id), the primary key of the
+partitioned table.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b1e4c7d2a60"
+down_revision: Union[str, None] = "73936a42eff5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tags",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_tags_user_id_name", "tags", ["user_id", "name"], unique=True)
+    op.create_table(
+        "contact_tags",
+        sa.Column("contact_id", sa.Integer(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["contact_id", "user_id"],
+            ["contacts.id", "contacts.user_id"],
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("contact_id", "tag_id"),
+    )
+    op.create_index(
+        "ix_contact_tags_tag_id_contact_id",
+        "contact_tags",
+        ["tag_id", "contact_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_contact_tags_user_id", "contact_tags", ["user_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_contact_tags_user_id", table_name="contact_tags")
+    op.drop_index("ix_contact_tags_tag_id_contact_id", table_name="contact_tags")
+    op.drop_table("contact_tags")
+    op.drop_index("ix_tags_user_id_name", table_name="tags")
+    op.drop_table("tags")
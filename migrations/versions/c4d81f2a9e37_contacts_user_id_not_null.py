@@ -0,0 +1,38 @@
+"""Contacts user_id not null
+
+Revision ID: c4d81f2a9e37
+Revises: 9b1e4c7d2a60
+Create Date: 2026-10-19 18:20:11.402938
+
+Contacts always belong to a user. The partitioned table of PostgreSQL already
+declares user_id NOT NULL, the other databases get the constraint here; rows
+without a user_id are not reachable through the API and are deleted, like the
+partitioning migration does not copy them.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4d81f2a9e37"
+down_revision: Union[str, None] = "9b1e4c7d2a60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        return
+    op.execute("DELETE FROM contacts WHERE user_id IS NULL")
+    with op.batch_alter_table("contacts") as batch_op:
+        batch_op.alter_column("user_id", existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        return
+    with op.batch_alter_table("contacts") as batch_op:
+        batch_op.alter_column("user_id", existing_type=sa.Integer(), nullable=True)
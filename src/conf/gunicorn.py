@@ -0,0 +1,68 @@
+"""
+Gunicorn settings of the production server, read from Settings:
+
+    gunicorn -c python:src.conf.gunicorn main:app
+
+Every worker runs the application on uvicorn with uvloop and httptools, and is
+replaced after max_requests plus a random jitter, so that the workers do not all
+restart at once. On SIGTERM the workers stop accepting connections, finish the
+requests in progress and their background tasks, then run the shutdown handlers.
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty directory for /metrics to report the
+metrics of all the workers instead of the one that answered the scrape.
+"""
+
+import glob
+import multiprocessing
+import os
+
+from prometheus_client import multiprocess
+from uvicorn.workers import UvicornWorker
+
+from src.conf.config import settings
+
+bind = f"{settings.server_host}:{settings.server_port}"
+workers = settings.server_workers or multiprocessing.cpu_count()
+worker_class = "src.conf.gunicorn.Worker"
+backlog = settings.server_backlog
+keepalive = settings.server_keepalive
+timeout = settings.server_timeout
+# Leaves the workers time to run the shutdown handlers after draining
+graceful_timeout = settings.server_graceful_timeout + 5
+max_requests = settings.server_max_requests
+max_requests_jitter = settings.server_max_requests_jitter
+# Every worker opens its own connections after the fork
+preload_app = False
+
+
+class Worker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": settings.server_loop,
+        "http": settings.server_http,
+        "timeout_graceful_shutdown": settings.server_graceful_timeout,
+    }
+
+
+def on_starting(server):
+    """
+    The on_starting function removes the metrics left by a previous run.
+
+    :param server: The gunicorn arbiter
+    :return: None
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    """
+    The child_exit function drops the live gauges of a worker that exited.
+
+    :param server: The gunicorn arbiter
+    :param worker: The worker that exited
+    :return: None
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,13 +1,243 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import logging
+import random
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, sessionmaker
 
 from src.conf.config import settings
+from src.database.models import Contact, User
+from src.database.sharding import ShardMap
+from src.services.resources import resources
 
+logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=True)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _redis():
+    return resources.redis
+
+
+shard_map = ShardMap(1 + len(settings.sqlalchemy_shard_urls), _redis)
+
+
+class RoutingSession(Session):
+    """
+    A session that sends everything to the shard chosen by use_shard(), reads of
+    the primary shard to a replica inside read_replica() and everything else,
+    including every flush, to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        shard = self.info.get("shard")
+        if shard:
+            return resources.shard_engines[shard]
+        replicas = resources.replica_engines
+        if self.info.get("use_replica") and replicas and not self._flushing:
+            return random.choice(replicas)
+        if self.bind is None:
+            return resources.engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+# Unbound, the session uses the primary engine of the shared resources
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+
+
+def pin_keys(instance) -> list[str]:
+    """
+    The pin_keys function returns the keys that pin the owner of a row to the primary.
+
+    :param instance: A User or Contact being written
+    :return: A list of pin keys
+    """
+    if isinstance(instance, Contact):
+        return [f"user:{instance.user_id}"]
+    if isinstance(instance, User):
+        return [f"user:{instance.id}", f"email:{instance.email}"]
+    return []
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _collect_writes(session, flush_context):
+    if not resources.replica_engines:
+        return
+    pins = session.info.setdefault("pins", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        pins.update(pin_keys(instance))
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _pin_writers(session):
+    pins = session.info.pop("pins", None)
+    if not pins:
+        return
+    pipe = _redis().pipeline()
+    for key in pins:
+        pipe.set(f"pin:{key}", 1, ex=settings.replica_max_lag)
+    pipe.execute()
+
+
+def owner_key(db: Session, user_id: int) -> str:
+    """
+    The owner_key function names the owner of contacts across shards, whose user ids overlap.
+
+    :param db: Session: A session routed by use_shard()
+    :param user_id: int: The id of the user on its shard
+    :return: The owner key
+    """
+    return f"{db.info.get('shard') or 0}:{user_id}"
+
+
+def record_changes(db: Session, kind: str, contacts) -> None:
+    """
+    The record_changes function queues contact changes to be published when the
+    session commits and pins their owners to the primary. Flushed changes are
+    recorded automatically, bulk statements record the rows they return.
+
+    :param db: Session: The database session
+    :param kind: str: created, updated or deleted
+    :param contacts: Contacts or rows with their id, user_id, firstname, lastname and email
+    :return: None
+    """
+    changes = db.info.setdefault("changes", [])
+    # Bulk statements are not seen by _collect_writes
+    if resources.replica_engines:
+        db.info.setdefault("pins", set()).update(
+            f"user:{contact.user_id}" for contact in contacts
+        )
+    for contact in contacts:
+        names = (
+            None
+            if kind == "deleted"
+            else (contact.firstname, contact.lastname, contact.email)
+        )
+        changes.append((owner_key(db, contact.user_id), kind, contact.id, names))
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _collect_changes(session, flush_context):
+    for kind, instances in (
+        ("created", session.new),
+        ("updated", session.dirty),
+        ("deleted", session.deleted),
+    ):
+        record_changes(
+            session,
+            kind,
+            [
+                instance
+                for instance in instances
+                if isinstance(instance, Contact)
+                and (kind != "updated" or session.is_modified(instance))
+            ],
+        )
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _publish_changes(session):
+    changes = session.info.pop("changes", None)
+    if not changes:
+        return
+    from src.services.events import contact_events
+    from src.services.suggest import suggest_index
+
+    # The rows are committed, clients catch up through the changes endpoint
+    # and an index that missed the update is rebuilt at most its ttl after
+    # it was built
+    try:
+        contact_events.publish([change[:3] for change in changes])
+    except Exception as e:
+        logger.warning("publishing contact changes failed: %s", e)
+    try:
+        suggest_index.apply(changes)
+    except Exception as e:
+        logger.warning("updating the suggest index failed: %s", e)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _collect_counts(session, flush_context):
+    from src.services.stats import ContactStats
+
+    counts = session.info.setdefault("counts", defaultdict(Counter))
+
+    def count(instance, birthday, sign):
+        delta = counts[owner_key(session, instance.user_id)]
+        delta[ContactStats.TOTAL] += sign
+        delta[ContactStats.day(birthday.month, birthday.day)] += sign
+
+    for sign, instances in ((1, session.new), (-1, session.deleted)):
+        for instance in instances:
+            if isinstance(instance, Contact):
+                count(instance, instance.birthday, sign)
+    for instance in session.dirty:
+        if isinstance(instance, Contact):
+            history = inspect(instance).attrs.birthday.history
+            if history.added and history.deleted:
+                count(instance, history.deleted[0], -1)
+                count(instance, history.added[0], 1)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _apply_counts(session):
+    counts = session.info.pop("counts", None)
+    if not counts:
+        return
+    from src.services.stats import contact_stats
+
+    # Counters that missed a change are corrected when they are rebuilt
+    try:
+        contact_stats.apply(counts)
+    except Exception as e:
+        logger.warning("updating the contact stats failed: %s", e)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_writes(session):
+    session.info.pop("pins", None)
+    session.info.pop("changes", None)
+    session.info.pop("counts", None)
+
+
+@contextmanager
+def read_replica(db: Session, pin_key: str):
+    """
+    The read_replica function routes the queries of its block to a replica,
+    unless the owner wrote recently and the replicas might not have caught up.
+
+    :param db: Session: The database session
+    :param pin_key: str: The key of the owner, e.g. "user:1" or "email:a@b.com"
+    :return: A context manager
+    """
+    if not resources.replica_engines or db.info.get("shard"):
+        yield db
+        return
+    if _redis().exists(f"pin:{pin_key}"):
+        yield db
+        return
+    previous = db.info.get("use_replica", False)
+    db.info["use_replica"] = True
+    try:
+        yield db
+    finally:
+        db.info["use_replica"] = previous
+
+
+def use_shard(db: Session, email: str) -> Session:
+    """
+    The use_shard function routes the following queries of a session to the shard
+    holding the user with the given email. It is a no-op with a single database.
+
+    :param db: Session: The database session
+    :param email: str: The email of the user whose rows are queried
+    :return: The same session
+    """
+    if len(resources.shard_engines) > 1 and db.info.get("shard_email") != email:
+        db.info["shard"] = shard_map.shard_for(email)
+        db.info["shard_email"] = email
+    return db
 
 
 def get_db():
@@ -0,0 +1,138 @@
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    duration: float = 0.0
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a route executes more statements than its budget."""
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def track_queries() -> QueryStats:
+    """
+    The track_queries function starts collecting SQL statistics for the current context.
+    Every statement executed by any engine afterwards is added to the returned object.
+
+    :return: A QueryStats object that is updated in place
+    """
+    stats = QueryStats()
+    _query_stats.set(stats)
+    return stats
+
+
+def current_query_stats() -> QueryStats | None:
+    """
+    The current_query_stats function returns the statistics of the current context.
+
+    :return: A QueryStats object or None if nothing is being tracked
+    """
+    return _query_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start_time"].pop()
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += time.perf_counter() - start
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_time"):
+        conn.info["query_start_time"].pop()
+
+
+def query_budget(route: str) -> int:
+    """
+    The query_budget function returns the maximum number of statements allowed for a route.
+
+    :param route: str: The route path template
+    :return: The budget of the route, 0 means unlimited
+    """
+    return settings.db_query_budgets.get(route, settings.db_query_budget)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    ASGI middleware that counts SQL statements and database time of every request.
+    The numbers are sent to the client in the Server-Timing header and checked
+    against the configured query budget of the route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = track_queries()
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                self.check_budget(scope, stats)
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (
+                        b"server-timing",
+                        (
+                            f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", '
+                            f"app;dur={(time.perf_counter() - start) * 1000:.2f}"
+                        ).encode("latin-1"),
+                    )
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def check_budget(scope, stats: QueryStats) -> None:
+        """
+        The check_budget function compares the statements of a request with the budget of its route.
+        In strict mode (used by the test suite) an exceeded budget fails the request,
+        otherwise a warning is logged.
+
+        :param scope: The ASGI scope of the request
+        :param stats: QueryStats: The statistics of the request
+        :return: None
+        """
+        route = scope.get("route")
+        if route is None:
+            return
+        budget = query_budget(route.path)
+        if not budget or stats.count <= budget:
+            return
+        message = (
+            f"{scope['method']} {route.path} executed {stats.count} queries, "
+            f"budget is {budget}"
+        )
+        if settings.db_query_budget_strict:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -1,23 +1,136 @@
-from sqlalchemy import Column, Date, ForeignKey, Integer, String, Boolean, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column,
+    Date,
+    ForeignKey,
+    ForeignKeyConstraint,
+    Index,
+    Integer,
+    String,
+    Boolean,
+    Table,
+    func,
+)
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy.sql.functions import FunctionElement
 from sqlalchemy.sql.sqltypes import DateTime
 from sqlalchemy.ext.declarative import declarative_base
 
+from src.conf.config import settings
+from src.database.phone import normalize_phone, reverse_digits
+
 Base = declarative_base()
 
+# SQLite stores func.now() without microseconds, bound values must match it to compare
+SyncTimestamp = DateTime().with_variant(
+    sqlite.DATETIME(truncate_microseconds=True), "sqlite"
+)
+
+
+class seconds_ago(FunctionElement):
+    """
+    The time of the database clock some seconds ago, comparable with the
+    timestamps stamped by func.now() whatever the time zone of the app.
+    """
+
+    type = SyncTimestamp
+    name = "seconds_ago"
+    inherit_cache = True
+
+
+@compiles(seconds_ago)
+def _seconds_ago(element, compiler, **kw):
+    return f"now() - make_interval(secs => {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(seconds_ago, "sqlite")
+def _seconds_ago_sqlite(element, compiler, **kw):
+    # CURRENT_TIMESTAMP, the func.now() of SQLite, is UTC in this format
+    seconds = compiler.process(element.clauses, **kw)
+    return f"datetime('now', '-' || {seconds} || ' seconds')"
+
 
 class Contact(Base):
     __tablename__ = "contacts"
+    # On PostgreSQL the table is hash partitioned by user_id (see the
+    # "Partition contacts by user" migration), so unique indexes include user_id
+    __table_args__ = (
+        Index("ix_contacts_user_id_email", "user_id", "email", unique=True),
+        Index("ix_contacts_user_id_updated_at", "user_id", "updated_at", "id"),
+        Index("ix_contacts_user_id_phone_normalized", "user_id", "phone_normalized"),
+        Index(
+            "ix_contacts_user_id_phone_reversed",
+            "user_id",
+            "phone_reversed",
+            postgresql_ops={"phone_reversed": "text_pattern_ops"},
+        ),
+    )
     id = Column(Integer, primary_key=True)
     firstname = Column(String(50), nullable=False, index=True)
     lastname = Column(String(50), nullable=False, index=True)
-    email = Column(String(50), unique=True, index=True)
+    email = Column(String(50), index=True)
     phone = Column(String(50), nullable=False, index=True)
+    # Derived from phone on every write, see normalize_phone
+    phone_normalized = Column(String(16), nullable=True)
+    phone_reversed = Column(String(15), nullable=True)
     birthday = Column(Date, nullable=False, index=True)
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
-    user_id = Column(ForeignKey("users.id", ondelete="CASCADE"), default=None)
+    updated_at = Column(SyncTimestamp, default=func.now(), onupdate=func.now())
+    user_id = Column(
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
     user = relationship("User", backref="contacts")
+    # Tag names, filled in by the repository with one query for a whole list
+    tags = ()
+
+    @validates("phone")
+    def _normalize_phone(self, key, phone):
+        self.phone_normalized = normalize_phone(
+            phone, settings.phone_default_country_code
+        )
+        self.phone_reversed = reverse_digits(self.phone_normalized)
+        return phone
+
+
+class ContactTombstone(Base):
+    # Deleted contacts are kept here so that clients can sync deletes
+    __tablename__ = "contact_tombstones"
+    __table_args__ = (
+        Index(
+            "ix_contact_tombstones_user_id_deleted_at", "user_id", "deleted_at", "id"
+        ),
+    )
+    id = Column(Integer, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    deleted_at = Column(SyncTimestamp, default=func.now(), nullable=False)
+    user_id = Column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    __table_args__ = (Index("ix_tags_user_id_name", "user_id", "name", unique=True),)
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False)
+    user_id = Column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+
+# The primary key of the partitioned contacts table is (id, user_id), so the
+# link carries user_id to reference it
+contact_tags = Table(
+    "contact_tags",
+    Base.metadata,
+    Column("contact_id", Integer, primary_key=True),
+    Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Column("user_id", Integer, nullable=False),
+    ForeignKeyConstraint(
+        ["contact_id", "user_id"],
+        ["contacts.id", "contacts.user_id"],
+        ondelete="CASCADE",
+    ),
+    Index("ix_contact_tags_tag_id_contact_id", "tag_id", "contact_id"),
+    Index("ix_contact_tags_user_id", "user_id"),
+)
 
 
 class User(Base):
@@ -0,0 +1,48 @@
+"""
+Phone number helpers used to derive the phone columns of contacts. The module
+has no dependencies, so that the models can use it.
+"""
+
+import re
+
+EXTENSION = re.compile(r"(?i)\s*(?:ext\.?|x|#).*$")
+NOT_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone: str | None, country_code: str) -> str | None:
+    """
+    The normalize_phone function brings a free-form phone number to E.164.
+    Numbers written with + or 00 keep their country code, numbers with a trunk 0
+    or without a country code get the default one. Extensions are dropped.
+
+    :param phone: str | None: The phone number as entered
+    :param country_code: str: The default country code
+    :return: The number as +<digits>, or None if it cannot be a phone number
+    """
+    if not phone:
+        return None
+    phone = EXTENSION.sub("", phone.strip())
+    digits = NOT_DIGITS.sub("", phone)
+    if phone.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    elif not (digits.startswith(country_code) and len(digits) >= 11):
+        digits = country_code + digits
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    return f"+{digits}"
+
+
+def reverse_digits(phone: str | None) -> str | None:
+    """
+    The reverse_digits function reverses the digits of a phone number, so that a
+    suffix search becomes a prefix search that a b-tree index can serve.
+
+    :param phone: str | None: The phone number
+    :return: The digits in reverse order, or None without digits
+    """
+    digits = NOT_DIGITS.sub("", phone or "")
+    return digits[::-1] or None
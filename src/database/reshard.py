@@ -0,0 +1,152 @@
+"""
+Moves a user and their contacts to another shard while the application is running::
+
+    python -m src.database.reshard user@example.com 2
+
+The rows of the user are locked on the source shard for the duration of the copy,
+so no write of that user is missed by the copy; other users are not affected.
+Writes of the user that arrive meanwhile wait for the lock and then fail, since
+the rows they target are gone from the source shard: updates and deletes find
+no contact and inserts violate the foreign key to the user. Retried, they are
+routed to the target shard. Move users when they are idle, e.g. at night.
+"""
+
+import argparse
+import logging
+
+from sqlalchemy import select
+
+from src.database import db
+from src.database.models import Contact, ContactTombstone, Tag, User, contact_tags
+from src.services.resources import resources
+
+logger = logging.getLogger(__name__)
+
+
+def copy(conn, table, rows, user_id: int) -> dict:
+    """
+    The copy function inserts rows of a user into another shard, which assigns
+    them new ids.
+
+    :param conn: The connection to the target shard
+    :param table: The table of the rows
+    :param rows: The rows read from the source shard
+    :param user_id: int: The id of the user on the target shard
+    :return: A dict of the new id of every old id
+    """
+    if not rows:
+        return {}
+    inserted = conn.execute(
+        table.insert().returning(table.c.id, sort_by_parameter_order=True),
+        [
+            {**{k: v for k, v in row.items() if k != "id"}, "user_id": user_id}
+            for row in rows
+        ],
+    )
+    return {row["id"]: new_id for row, (new_id,) in zip(rows, inserted)}
+
+
+def move_user(email: str, target: int, engines=None, shards=None) -> int:
+    """
+    The move_user function copies a user and their contacts to the target shard,
+    routes the user there and deletes the rows from the source shard.
+
+    :param email: str: The email of the user to move
+    :param target: int: The index of the target shard
+    :param engines: The engines of the shards, the configured ones by default
+    :param shards: ShardMap: The shard map, the configured one by default
+    :return: The number of contacts moved
+    """
+    from src.services.auth import user_cache
+
+    engines = engines or resources.shard_engines
+    shards = shards or db.shard_map
+    if not 0 <= target < len(engines):
+        raise ValueError(f"Unknown shard {target}")
+    source = shards.shard_for(email)
+    if source == target:
+        return 0
+    users, contacts, tags = User.__table__, Contact.__table__, Tag.__table__
+    tombstones = ContactTombstone.__table__
+    with engines[source].begin() as src:
+        user = (
+            src.execute(select(users).where(users.c.email == email).with_for_update())
+            .mappings()
+            .first()
+        )
+        if user is None:
+            raise LookupError(f"No user {email} on shard {source}")
+        rows = (
+            src.execute(
+                select(contacts)
+                .where(contacts.c.user_id == user["id"])
+                .with_for_update()
+            )
+            .mappings()
+            .all()
+        )
+        tag_rows = src.execute(select(tags).where(tags.c.user_id == user["id"])).all()
+        links = src.execute(
+            select(contact_tags.c.contact_id, contact_tags.c.tag_id).where(
+                contact_tags.c.user_id == user["id"]
+            )
+        ).all()
+        # Ids are allocated by the target shard, so the user's id changes
+        with engines[target].begin() as dst:
+            user_id = dst.execute(
+                users.insert().values({k: v for k, v in user.items() if k != "id"})
+            ).inserted_primary_key[0]
+            contact_ids = copy(dst, contacts, rows, user_id)
+            tag_ids = copy(dst, tags, [row._mapping for row in tag_rows], user_id)
+            if links:
+                dst.execute(
+                    contact_tags.insert(),
+                    [
+                        {
+                            "contact_id": contact_ids[contact_id],
+                            "tag_id": tag_ids[tag_id],
+                            "user_id": user_id,
+                        }
+                        for contact_id, tag_id in links
+                    ],
+                )
+        # Cached users carry the id of the source shard, which belongs to
+        # another user on the target shard once the pin flips
+        user_cache.invalidate(email)
+        try:
+            shards.pin(email, target)
+        except Exception:
+            with engines[target].begin() as dst:
+                dst.execute(
+                    contact_tags.delete().where(contact_tags.c.user_id == user_id)
+                )
+                dst.execute(tags.delete().where(tags.c.user_id == user_id))
+                dst.execute(contacts.delete().where(contacts.c.user_id == user_id))
+                dst.execute(users.delete().where(users.c.id == user_id))
+            raise
+        src.execute(contact_tags.delete().where(contact_tags.c.user_id == user["id"]))
+        src.execute(tags.delete().where(tags.c.user_id == user["id"]))
+        src.execute(contacts.delete().where(contacts.c.user_id == user["id"]))
+        # Contact ids change too, sync tokens carry the old user id and expire
+        src.execute(tombstones.delete().where(tombstones.c.user_id == user["id"]))
+        src.execute(users.delete().where(users.c.id == user["id"]))
+    # Again once the source rows are gone, a request may have cached the user
+    # between the first invalidation and the pin
+    user_cache.invalidate(email)
+    logger.info(
+        "Moved %s with %d contacts from shard %d to %d",
+        email,
+        len(rows),
+        source,
+        target,
+    )
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move a user to another shard")
+    parser.add_argument("email")
+    parser.add_argument("shard", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    move_user(args.email, args.shard)
@@ -0,0 +1,76 @@
+import hashlib
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    The jump_hash function maps a key to one of buckets using jump consistent hashing,
+    so growing from N to N + 1 buckets only moves 1 / (N + 1) of the keys.
+
+    :param key: int: A 64 bit key
+    :param buckets: int: The number of buckets
+    :return: The bucket of the key
+    """
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+class ShardMap:
+    """
+    Maps the email of a user to the index of the database holding the user and
+    their contacts. Users moved by the reshard tool are pinned by an override in Redis.
+    """
+
+    OVERRIDES = "shard:overrides"
+
+    def __init__(self, shards: int, redis_getter):
+        """
+        :param shards: int: The number of configured databases
+        :param redis_getter: A callable returning the Redis client
+        """
+        self.shards = shards
+        self.redis_getter = redis_getter
+
+    def home(self, email: str) -> int:
+        """
+        The home function returns the shard an email hashes to, ignoring overrides.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :return: The index of the shard
+        """
+        digest = hashlib.blake2b(email.lower().encode(), digest_size=8).digest()
+        return jump_hash(int.from_bytes(digest, "big"), self.shards)
+
+    def shard_for(self, email: str) -> int:
+        """
+        The shard_for function returns the shard holding the rows of a user.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :return: The index of the shard
+        """
+        if self.shards < 2:
+            return 0
+        override = self.redis_getter().hget(self.OVERRIDES, email.lower())
+        if override is not None and int(override) < self.shards:
+            return int(override)
+        return self.home(email)
+
+    def pin(self, email: str, shard: int) -> None:
+        """
+        The pin function routes a user to a shard, or back to its hashed shard.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :param shard: int: The index of the shard
+        :return: None
+        """
+        r = self.redis_getter()
+        if shard == self.home(email):
+            r.hdel(self.OVERRIDES, email.lower())
+        else:
+            r.hset(self.OVERRIDES, email.lower(), shard)
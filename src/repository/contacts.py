@@ -1,22 +1,101 @@
+import calendar
+from collections import defaultdict
 from typing import List
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, extract, func, insert, literal, select, tuple_, update
 
-from src.database.models import Contact, User
+from src.conf.config import settings
+from src.database.db import read_replica, record_changes, use_shard
+from src.database.models import (
+    Contact,
+    ContactTombstone,
+    Tag,
+    User,
+    contact_tags,
+    seconds_ago,
+)
+from src.database.phone import normalize_phone, reverse_digits
+from src.services.dedup import Candidate
 from src.sсhemas import ContactCreate
 
+# The tags of at most this many contacts are loaded by one query
+TAGS_BY_ID = 500
 
-async def get_contacts(user: User, db: Session) -> List[Contact]:
+
+def _tagged(tags: List[str], match_all: bool, user: User):
+    # The contacts with any of the tags, or with all of them
+    links = (
+        select(contact_tags.c.contact_id)
+        .join(Tag, Tag.id == contact_tags.c.tag_id)
+        .where(Tag.user_id == user.id, Tag.name.in_(tags))
+    )
+    if match_all:
+        links = links.group_by(contact_tags.c.contact_id).having(
+            func.count() == len(set(tags))
+        )
+    return Contact.id.in_(links)
+
+
+def _attach_tags(contacts: List[Contact] | None, user: User, db: Session):
+    # One query fills in the tags of a whole list of contacts
+    if not contacts:
+        return contacts
+    names = defaultdict(list)
+    ids = [c.id for c in contacts]
+    for start in range(0, len(ids), TAGS_BY_ID):
+        rows = (
+            db.query(contact_tags.c.contact_id, Tag.name)
+            .join(Tag, Tag.id == contact_tags.c.tag_id)
+            .filter(
+                contact_tags.c.user_id == user.id,
+                contact_tags.c.contact_id.in_(ids[start : start + TAGS_BY_ID]),
+            )
+            .order_by(Tag.name)
+        )
+        for contact_id, name in rows:
+            names[contact_id].append(name)
+    for contact in contacts:
+        contact.tags = names.get(contact.id, [])
+    return contacts
+
+
+def _owned(contact_ids: List[int], user: User, db: Session) -> List[Contact]:
+    return (
+        db.query(Contact)
+        .filter(and_(Contact.user_id == user.id, Contact.id.in_(contact_ids)))
+        .all()
+    )
+
+
+async def get_contacts(
+    user: User,
+    db: Session,
+    tags: List[str] | None = None,
+    match_all: bool = False,
+    skip: int = 0,
+    limit: int | None = None,
+) -> List[Contact]:
     """
     The get_contacts function returns a list of contacts for the user.
 
     :param user: User: Get the user id from the database
     :param db: Session: Pass the database session to the function
+    :param tags: List[str] | None: Only the contacts with these tags
+    :param match_all: bool: Require all the tags instead of any of them
+    :param skip: int: The number of contacts to skip, ordered by id
+    :param limit: int | None: The maximum number of contacts, all of them if None
     :return: A list of contacts
     """
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).all()
+    use_shard(db, user.email)
+    with read_replica(db, f"user:{user.id}"):
+        contacts = db.query(Contact).filter(Contact.user_id == user.id)
+        if tags:
+            contacts = contacts.filter(_tagged(tags, match_all, user))
+        if limit is not None:
+            contacts = contacts.order_by(Contact.id).offset(skip).limit(limit)
+        contacts = _attach_tags(contacts.all(), user, db)
     return contacts
 
 
@@ -29,12 +108,34 @@ async def get_contact_by_id(contact_id: int, user: User, db: Session) -> Contact
     :param db: Session: Connect to the database
     :return: A contact object
     """
-    contacts = (
+    use_shard(db, user.email)
+    contact = (
         db.query(Contact)
         .filter(and_(Contact.id == contact_id, Contact.user_id == user.id))
         .first()
     )
-    return contacts
+    if contact:
+        _attach_tags([contact], user, db)
+    return contact
+
+
+async def get_contacts_by_ids(
+    contact_ids: List[int], user: User, db: Session
+) -> List[Contact]:
+    """
+    The get_contacts_by_ids function returns the contacts of the user with the
+    given ids in a single query, in the order of the ids.
+
+    :param contact_ids: List[int]: The ids of the contacts, without duplicates
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: The contacts found, ids that do not exist are skipped
+    """
+    use_shard(db, user.email)
+    with read_replica(db, f"user:{user.id}"):
+        contacts = _attach_tags(_owned(contact_ids, user, db), user, db)
+    found = {contact.id: contact for contact in contacts}
+    return [found[i] for i in contact_ids if i in found]
 
 
 async def get_contact_by_email(email: str, user: User, db: Session) -> Contact:
@@ -46,6 +147,7 @@ async def get_contact_by_email(email: str, user: User, db: Session) -> Contact:
     :param db: Session: Pass the database session to the function
     :return: The contact with the given email address
     """
+    use_shard(db, user.email)
     contacts = (
         db.query(Contact)
         .filter(and_(Contact.email == email, Contact.user_id == user.id))
@@ -54,36 +156,70 @@ async def get_contact_by_email(email: str, user: User, db: Session) -> Contact:
     return contacts
 
 
-async def search_contact(query: str, user: User, db: Session) -> List[Contact]:
+async def search_contact(
+    query: str,
+    user: User,
+    db: Session,
+    tags: List[str] | None = None,
+    match_all: bool = False,
+) -> List[Contact]:
     """
     The search_contact function searches for a contact in the database.
 
     :param query: str: Search the database for a contact
     :param user: User: Get the user id of the current user
     :param db: Session: Pass the database session to the function
+    :param tags: List[str] | None: Only the contacts with these tags
+    :param match_all: bool: Require all the tags instead of any of them
     :return: A list of contact objects
     """
-    contact = (
-        db.query(Contact)
-        .filter(and_(Contact.firstname.ilike(f"%{query}%"), Contact.user_id == user.id))
-        .all()
-    )
-    if contact:
-        return contact
-    contact = (
-        db.query(Contact)
-        .filter(and_(Contact.lastname.ilike(f"%{query}%"), Contact.user_id == user.id))
-        .all()
-    )
-    if contact:
-        return contact
-    contact = (
-        db.query(Contact)
-        .filter(and_(Contact.email.ilike(f"%{query}%"), Contact.user_id == user.id))
-        .all()
-    )
-    if contact:
-        return contact
+    use_shard(db, user.email)
+    conditions = [Contact.user_id == user.id]
+    if tags:
+        conditions.append(_tagged(tags, match_all, user))
+    with read_replica(db, f"user:{user.id}"):
+        for column in (Contact.firstname, Contact.lastname, Contact.email):
+            contact = (
+                db.query(Contact)
+                .filter(and_(column.ilike(f"%{query}%"), *conditions))
+                .all()
+            )
+            if contact:
+                return _attach_tags(contact, user, db)
+
+
+async def lookup_phone(
+    phone: str, suffix: bool, user: User, db: Session
+) -> List[Contact] | None:
+    """
+    The lookup_phone function finds contacts by phone number regardless of how it
+    was written, either the exact number or, caller-ID style, by its last digits.
+
+    :param phone: str: The phone number or its last digits
+    :param suffix: bool: Match the last digits instead of the whole number
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: A list of contacts, or None if phone is not a valid number
+    """
+    use_shard(db, user.email)
+    if suffix:
+        reversed_digits = reverse_digits(phone)
+        if reversed_digits is None:
+            return None
+        condition = Contact.phone_reversed.startswith(reversed_digits, autoescape=True)
+    else:
+        normalized = normalize_phone(phone, settings.phone_default_country_code)
+        if normalized is None:
+            return None
+        condition = Contact.phone_normalized == normalized
+    with read_replica(db, f"user:{user.id}"):
+        contacts = (
+            db.query(Contact)
+            .filter(and_(Contact.user_id == user.id, condition))
+            .order_by(Contact.id)
+            .all()
+        )
+        return _attach_tags(contacts, user, db)
 
 
 async def create_contact(body: ContactCreate, user: User, db: Session) -> Contact:
@@ -95,12 +231,48 @@ async def create_contact(body: ContactCreate, user: User, db: Session) -> Contac
     :param db: Session: Access the database
     :return: A contact object
     """
+    use_shard(db, user.email)
     contact = Contact(**body.model_dump(), user_id=user.id)
     db.add(contact)
     db.commit()
     return contact
 
 
+async def import_contacts(
+    bodies: List[ContactCreate], user: User, db: Session
+) -> tuple[List[int], List[str]]:
+    """
+    The import_contacts function creates many contacts at once. Contacts whose
+    email the user already has, or that repeat an email of the import, are skipped.
+
+    :param bodies: List[ContactCreate]: The contacts to create
+    :param user: User: Get the user_id from the user object
+    :param db: Session: Access the database
+    :return: The ids of the created contacts and the skipped emails
+    """
+    use_shard(db, user.email)
+    emails = {body.email for body in bodies}
+    seen = {
+        email
+        for email, in db.query(Contact.email).filter(
+            and_(Contact.user_id == user.id, Contact.email.in_(emails))
+        )
+    }
+    contacts, skipped = [], []
+    for body in bodies:
+        if body.email in seen:
+            skipped.append(body.email)
+            continue
+        seen.add(body.email)
+        contacts.append(Contact(**body.model_dump(), user_id=user.id))
+    db.add_all(contacts)
+    db.flush()
+    # The ids are read before the commit expires the contacts
+    ids = [contact.id for contact in contacts]
+    db.commit()
+    return ids, skipped
+
+
 async def update_contact(
     contact_id: int, body: ContactCreate, user: User, db: Session
 ) -> Contact:
@@ -113,6 +285,7 @@ async def update_contact(
     :param db: Session: Pass the database session to the function
     :return: A contact object
     """
+    use_shard(db, user.email)
     contact = await get_contact_by_id(contact_id, user, db)
     if contact:
         contact.firstname = body.firstname
@@ -133,13 +306,207 @@ async def delete_contact(contact_id: int, user: User, db: Session) -> Contact:
     :param db: Session: Pass the database session to the function
     :return: The deleted contact
     """
+    use_shard(db, user.email)
     contact = await get_contact_by_id(contact_id, user, db)
     if contact:
-        db.delete(contact)
+        # Tombstones older than any valid sync token are no longer needed
+        expired = seconds_ago((settings.sync_tombstone_retention_days + 1) * 86400)
+        db.query(ContactTombstone).filter(
+            ContactTombstone.user_id == user.id, ContactTombstone.deleted_at < expired
+        ).delete(synchronize_session=False)
+        _delete([contact], user, db)
         db.commit()
     return contact
 
 
+def _delete(contacts: List[Contact], user: User, db: Session) -> None:
+    # Deleted contacts leave a tombstone for the clients that sync
+    db.execute(
+        contact_tags.delete().where(
+            contact_tags.c.user_id == user.id,
+            contact_tags.c.contact_id.in_([contact.id for contact in contacts]),
+        )
+    )
+    for contact in contacts:
+        db.delete(contact)
+        db.add(ContactTombstone(contact_id=contact.id, user_id=contact.user_id))
+
+
+async def get_duplicate_candidates(user: User, db: Session) -> List[Candidate]:
+    """
+    The get_duplicate_candidates function loads the fields of every contact of the
+    user that the duplicate detection compares, without building ORM objects.
+
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: A list of candidates
+    """
+    use_shard(db, user.email)
+    with read_replica(db, f"user:{user.id}"):
+        rows = db.query(*(getattr(Contact, field) for field in Candidate._fields))
+        rows = rows.filter(Contact.user_id == user.id).all()
+    return [Candidate(*row) for row in rows]
+
+
+async def get_contact_names(user: User, db: Session) -> List[tuple]:
+    """
+    The get_contact_names function loads the id, names and email of every contact
+    of the user, the fields the suggest index is built from.
+
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: A list of (id, firstname, lastname, email) tuples
+    """
+    use_shard(db, user.email)
+    with read_replica(db, f"user:{user.id}"):
+        rows = (
+            db.query(Contact.id, Contact.firstname, Contact.lastname, Contact.email)
+            .filter(Contact.user_id == user.id)
+            .all()
+        )
+    return [tuple(row) for row in rows]
+
+
+async def merge_contacts(
+    keep_id: int, merge_ids: List[int], user: User, db: Session
+) -> Contact | None:
+    """
+    The merge_contacts function merges duplicates into one contact: the kept
+    contact takes the email of a duplicate if it has none and the tags of all
+    of them, and the duplicates are deleted.
+
+    :param keep_id: int: The id of the contact that remains
+    :param merge_ids: List[int]: The ids of its duplicates
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: The kept contact, or None if any of the contacts does not exist
+    """
+    use_shard(db, user.email)
+    ids = {keep_id, *merge_ids}
+    contacts = {
+        contact.id: contact
+        for contact in db.query(Contact).filter(
+            and_(Contact.user_id == user.id, Contact.id.in_(ids))
+        )
+    }
+    if len(contacts) != len(ids):
+        return None
+    keep = contacts.pop(keep_id)
+    email = keep.email or next((c.email for c in contacts.values() if c.email), None)
+    kept_tags = select(contact_tags.c.tag_id).where(
+        contact_tags.c.contact_id == keep_id
+    )
+    db.execute(
+        contact_tags.insert().from_select(
+            ["contact_id", "tag_id", "user_id"],
+            select(literal(keep_id), contact_tags.c.tag_id, literal(user.id))
+            .where(
+                contact_tags.c.contact_id.in_(list(contacts)),
+                contact_tags.c.tag_id.not_in(kept_tags),
+            )
+            .distinct(),
+        )
+    )
+    _delete(list(contacts.values()), user, db)
+    # The email is unique per user, the duplicate holding it must be gone first
+    db.flush()
+    keep.email = email
+    db.commit()
+    return _attach_tags([keep], user, db)[0]
+
+
+async def get_changes(
+    changed_since: tuple | None,
+    deleted_since: tuple | None,
+    limit: int,
+    user: User,
+    db: Session,
+) -> tuple[List[Contact], List[ContactTombstone]]:
+    """
+    The get_changes function returns the contacts created or updated and the
+    tombstones of the contacts deleted after the given positions, oldest first.
+    Rows newer than the sync safety lag are left for a later call: their
+    timestamp is the start of the writing transaction, so a transaction still
+    running could commit rows behind a position already handed out.
+
+    :param changed_since: tuple | None: The (updated_at, id) to continue after
+    :param deleted_since: tuple | None: The (deleted_at, id) to continue after
+    :param limit: int: The page size, up to limit + 1 rows of each are returned
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: The changed contacts and the tombstones
+    """
+    use_shard(db, user.email)
+    settled = seconds_ago(settings.sync_safety_lag)
+    with read_replica(db, f"user:{user.id}"):
+        contacts = db.query(Contact).filter(
+            Contact.user_id == user.id,
+            Contact.updated_at <= settled,
+        )
+        if changed_since:
+            contacts = contacts.filter(
+                tuple_(Contact.updated_at, Contact.id)
+                > tuple_(
+                    literal(changed_since[0], Contact.updated_at.type), changed_since[1]
+                )
+            )
+        contacts = (
+            contacts.order_by(Contact.updated_at, Contact.id).limit(limit + 1).all()
+        )
+        tombstones = db.query(ContactTombstone).filter(
+            ContactTombstone.user_id == user.id,
+            ContactTombstone.deleted_at <= settled,
+        )
+        if deleted_since:
+            tombstones = tombstones.filter(
+                tuple_(ContactTombstone.deleted_at, ContactTombstone.id)
+                > tuple_(
+                    literal(deleted_since[0], ContactTombstone.deleted_at.type),
+                    deleted_since[1],
+                )
+            )
+        tombstones = (
+            tombstones.order_by(ContactTombstone.deleted_at, ContactTombstone.id)
+            .limit(limit + 1)
+            .all()
+        )
+        _attach_tags(contacts, user, db)
+    return contacts, tombstones
+
+
+def birthday_keys(today: date, days: int) -> list[int]:
+    """
+    The birthday_keys function returns the birthdays of the window from today to
+    today plus days as month * 100 + day, the form compared by upcoming_birthdays.
+
+    :param today: date: The first day of the window
+    :param days: int: The number of days after today
+    :return: A list of keys
+    """
+    keys = []
+    for offset in range(days + 1):
+        day = today + timedelta(offset)
+        keys.append(day.month * 100 + day.day)
+        # 29 February in a non-leap year is celebrated on 1 March
+        if (day.month, day.day) == (3, 1) and not calendar.isleap(day.year):
+            keys.append(229)
+    return keys
+
+
+def upcoming_birthdays(column, today: date, days: int):
+    """
+    The upcoming_birthdays function returns the SQL condition of a birthday
+    falling within the next days, whatever the year of birth.
+
+    :param column: The date column of the birthday
+    :param today: date: The first day of the window
+    :param days: int: The number of days after today
+    :return: A boolean SQL expression
+    """
+    key = extract("month", column) * 100 + extract("day", column)
+    return key.in_(birthday_keys(today, days))
+
+
 async def get_birthday_per_week(user: User, db: Session) -> List[Contact]:
     """
     The get_birthday_per_week function returns a list of contacts whose birthday is within the next 7 days.
@@ -148,16 +515,155 @@ async def get_birthday_per_week(user: User, db: Session) -> List[Contact]:
     :param db: Session: Connect to the database
     :return: A list of contacts that have their birthday in the next 7 days
     """
-    contacts = []
-    all_contacts = await get_contacts(user, db)
-    for contact in all_contacts:
-        if (
-            timedelta(0)
-            <= (
-                datetime.now().date()
-                - (contact.birthday.replace(year=int((datetime.now()).year)))
+    use_shard(db, user.email)
+    today = datetime.now().date()
+    with read_replica(db, f"user:{user.id}"):
+        contacts = (
+            db.query(Contact)
+            .filter(
+                Contact.user_id == user.id,
+                upcoming_birthdays(Contact.birthday, today, 7),
             )
-            <= timedelta(7)
-        ):
-            contacts.append(contact)
+            .all()
+        )
+        _attach_tags(contacts, user, db)
     return contacts
+
+
+async def get_birthday_counts(user: User, db: Session) -> List[tuple]:
+    """
+    The get_birthday_counts function counts the contacts of the user by day of
+    birth, the data the contact stats are built from.
+
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: A list of (month, day, contacts) tuples
+    """
+    use_shard(db, user.email)
+    month = extract("month", Contact.birthday)
+    day = extract("day", Contact.birthday)
+    with read_replica(db, f"user:{user.id}"):
+        rows = (
+            db.query(month, day, func.count())
+            .filter(Contact.user_id == user.id)
+            .group_by(month, day)
+            .all()
+        )
+    return [tuple(row) for row in rows]
+
+
+async def get_tags(user: User, db: Session) -> List[tuple]:
+    """
+    The get_tags function returns the tags of the user with their number of contacts.
+
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: A list of (name, contacts) tuples ordered by name
+    """
+    use_shard(db, user.email)
+    with read_replica(db, f"user:{user.id}"):
+        rows = (
+            db.query(Tag.name, func.count(contact_tags.c.contact_id))
+            .outerjoin(contact_tags, contact_tags.c.tag_id == Tag.id)
+            .filter(Tag.user_id == user.id)
+            .group_by(Tag.id, Tag.name)
+            .order_by(Tag.name)
+            .all()
+        )
+    return [tuple(row) for row in rows]
+
+
+def _touch(contact_ids: List[int], user: User, db: Session) -> bool:
+    # A change of tags is a change of the contact for sync and events. Returns
+    # False, and rolls back, unless all the contacts belong to the user
+    rows = db.execute(
+        update(Contact)
+        .where(and_(Contact.user_id == user.id, Contact.id.in_(contact_ids)))
+        .values(updated_at=func.now())
+        .returning(
+            Contact.id,
+            Contact.user_id,
+            Contact.firstname,
+            Contact.lastname,
+            Contact.email,
+        )
+        .execution_options(synchronize_session=False)
+    ).all()
+    if len(rows) != len(set(contact_ids)):
+        db.rollback()
+        return False
+    record_changes(db, "updated", rows)
+    return True
+
+
+async def tag_contacts(
+    contact_ids: List[int], tags: List[str], user: User, db: Session
+) -> List[Contact] | None:
+    """
+    The tag_contacts function adds tags to contacts, creating the tags that the
+    user does not have yet. Tags a contact already has are left alone.
+
+    :param contact_ids: List[int]: The ids of the contacts
+    :param tags: List[str]: The tag names
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: The contacts, or None if any of them does not exist
+    """
+    use_shard(db, user.email)
+    if not _touch(contact_ids, user, db):
+        return None
+    names = set(tags)
+    existing = db.query(Tag.name).filter(
+        and_(Tag.user_id == user.id, Tag.name.in_(names))
+    )
+    new = names - {name for name, in existing}
+    if new:
+        db.execute(
+            insert(Tag), [{"name": name, "user_id": user.id} for name in sorted(new)]
+        )
+    linked = select(contact_tags.c.contact_id).where(
+        contact_tags.c.contact_id == Contact.id, contact_tags.c.tag_id == Tag.id
+    )
+    db.execute(
+        contact_tags.insert().from_select(
+            ["contact_id", "tag_id", "user_id"],
+            select(Contact.id, Tag.id, Contact.user_id)
+            .join(Tag, Tag.user_id == Contact.user_id)
+            .where(
+                Contact.user_id == user.id,
+                Contact.id.in_(contact_ids),
+                Tag.name.in_(names),
+                ~linked.exists(),
+            ),
+        )
+    )
+    db.commit()
+    return _attach_tags(_owned(contact_ids, user, db), user, db)
+
+
+async def untag_contacts(
+    contact_ids: List[int], tags: List[str], user: User, db: Session
+) -> List[Contact] | None:
+    """
+    The untag_contacts function removes tags from contacts. The tags remain
+    with the user even when no contact has them anymore.
+
+    :param contact_ids: List[int]: The ids of the contacts
+    :param tags: List[str]: The tag names
+    :param user: User: Get the user id of the current user
+    :param db: Session: Pass the database session to the function
+    :return: The contacts, or None if any of them does not exist
+    """
+    use_shard(db, user.email)
+    if not _touch(contact_ids, user, db):
+        return None
+    tag_ids = select(Tag.id).where(and_(Tag.user_id == user.id, Tag.name.in_(tags)))
+    db.execute(
+        contact_tags.delete().where(
+            contact_tags.c.user_id == user.id,
+            contact_tags.c.contact_id.in_(contact_ids),
+            contact_tags.c.tag_id.in_(tag_ids),
+        )
+    )
+    db.commit()
+    return _attach_tags(_owned(contact_ids, user, db), user, db)
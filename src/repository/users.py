@@ -1,6 +1,6 @@
-from libgravatar import Gravatar
 from sqlalchemy.orm import Session
 
+from src.database.db import use_shard
 from src.database.models import User
 from src.sсhemas import UserModel
 
@@ -13,6 +13,7 @@ async def get_user_by_email(email: str, db: Session) -> User:
     :param db: Session: Pass the database session into the function
     :return: The first user with the given email
     """
+    use_shard(db, email)
     return db.query(User).filter(User.email == email).first()
 
 
@@ -24,6 +25,9 @@ async def create_user(body: UserModel, db: Session) -> User:
     :param db: Session: Pass the database session into the function
     :return: A user object
     """
+    # Loaded on first use, like the other integrations, to keep the startup short
+    from libgravatar import Gravatar
+
     avatar = None
     try:
         g = Gravatar(body.email)
@@ -31,6 +35,7 @@ async def create_user(body: UserModel, db: Session) -> User:
     except Exception as e:
         print(e)
     new_user = User(**body.model_dump(), avatar=avatar)
+    use_shard(db, body.email)
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
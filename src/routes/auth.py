@@ -1,3 +1,6 @@
+import time
+from typing import List
+
 from fastapi import (
     APIRouter,
     HTTPException,
@@ -12,14 +15,25 @@ from fastapi.security import (
     HTTPAuthorizationCredentials,
     HTTPBearer,
 )
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
-from src.sсhemas import UserModel, UserResponse, TokenModel, RequestEmail
+from src.database.models import User
+from src.sсhemas import (
+    UserModel,
+    UserResponse,
+    TokenModel,
+    RequestEmail,
+    SessionResponse,
+)
 from src.repository import users as repository_users
-from src.services.auth import auth_service
+from src.services.auth import auth_service, revocation_list
 from src.services.email import send_email
+from src.services.sessions import token_store
+from src.services.throttle import auth_throttle, client_ip
 from src.conf.config import settings
+from src.services.metrics import EMAIL_QUEUE_DEPTH
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 security = HTTPBearer()
@@ -44,13 +58,24 @@ async def signup(
     :param : Get the user's email address
     :return: A dictionary with the new user and a message
     """
-    exist_user = await repository_users.get_user_by_email(body.email, db)
-    if exist_user:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="Account already exists"
-        )
+    ip = client_ip(request)
+    auth_throttle.check(ip)
+    account_exists = HTTPException(
+        status_code=status.HTTP_409_CONFLICT, detail="Account already exists"
+    )
+    if not auth_throttle.is_unknown(body.email):
+        exist_user = await repository_users.get_user_by_email(body.email, db)
+        if exist_user:
+            auth_throttle.failure(ip)
+            raise account_exists
     body.password = auth_service.get_password_hash(body.password)
-    new_user = await repository_users.create_user(body, db)
+    try:
+        new_user = await repository_users.create_user(body, db)
+    except IntegrityError:
+        db.rollback()
+        raise account_exists
+    auth_throttle.forget_unknown(new_user.email)
+    EMAIL_QUEUE_DEPTH.inc()
     background_tasks.add_task(
         send_email, new_user.email, new_user.username, request.base_url
     )
@@ -59,32 +84,58 @@ async def signup(
 
 @router.post("/login", response_model=TokenModel)
 async def login(
-    body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    request: Request,
+    body: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db),
 ):
     """
     The login function is used to authenticate a user.
+    Every login starts a new session, so a user can be logged in on several devices.
 
+    :param request: Request: Get the user agent and the address of the client
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
     :param db: Session: Pass the database session to the function
     :return: A dictionary with the access token, refresh token and a bearer
     """
+    ip = client_ip(request)
+    auth_throttle.check(ip, body.username)
+    invalid_email = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email"
+    )
+    if auth_throttle.is_unknown(body.username):
+        auth_throttle.failure(ip, body.username)
+        raise invalid_email
     user = await repository_users.get_user_by_email(body.username, db)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email"
-        )
+        auth_throttle.remember_unknown(body.username)
+        auth_throttle.failure(ip, body.username)
+        raise invalid_email
     if not user.confirmed:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed"
         )
     if not auth_service.verify_password(body.password, user.password):
+        auth_throttle.failure(ip, body.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password"
         )
+    auth_throttle.success(body.username)
 
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
+    sid = token_store.new_id()
+    access_token = await auth_service.create_access_token(
+        data={"sub": user.email, "sid": sid}
+    )
+    refresh_token = await auth_service.create_refresh_token(
+        data={"sub": user.email, "sid": sid}
+    )
+    claims = auth_service.token_claims(refresh_token)
+    token_store.start(
+        user.email,
+        sid,
+        claims["jti"],
+        claims["exp"],
+        request.headers.get("user-agent", ""),
+    )
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -95,28 +146,36 @@ async def login(
 @router.get("/refresh_token", response_model=TokenModel)
 async def refresh_token(
     credentials: HTTPAuthorizationCredentials = Security(security),
-    db: Session = Depends(get_db),
 ):
     """
     The refresh_token function is used to refresh the access token.
+    The refresh token is rotated; presenting an old refresh token again ends the
+    session and revokes the access tokens issued to it.
 
     :param credentials: HTTPAuthorizationCredentials: Get the token from the request header
-    :param db: Session: Get the database session
-    :param : Check if the user is authenticated
     :return: A dict with the new access_token, refresh_token and token type
     """
-    token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
+    payload = await auth_service.decode_refresh_payload(credentials.credentials)
+    email, sid = payload["sub"], payload.get("sid")
+    refresh_token = await auth_service.create_refresh_token(
+        data={"sub": email, "sid": sid}
+    )
+    claims = auth_service.token_claims(refresh_token)
+    if sid is None or not token_store.rotate(
+        email, sid, payload.get("jti"), claims["jti"], claims["exp"]
+    ):
+        if sid is not None:
+            # The family may be stolen, its access tokens must stop working too
+            revocation_list.revoke(
+                sid, time.time() + auth_service.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+            )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
         )
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, refresh_token, db)
+    access_token = await auth_service.create_access_token(
+        data={"sub": email, "sid": sid}
+    )
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -124,6 +183,78 @@ async def refresh_token(
     }
 
 
+@router.get("/sessions", response_model=List[SessionResponse])
+async def sessions(current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The sessions function lists the devices the current user is logged in on.
+
+    :param current_user: User: Get the current user
+    :return: A list of sessions
+    """
+    return token_store.sessions(current_user.email)
+
+
+@router.delete("/sessions/{sid}", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_session(
+    sid: str, current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The revoke_session function logs the current user out of one device.
+    Access tokens already issued to that device stop working as well.
+
+    :param sid: str: The id of the session
+    :param current_user: User: Get the current user
+    :return: None
+    """
+    if not token_store.revoke(current_user.email, sid):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found!")
+    revocation_list.revoke(
+        sid, time.time() + auth_service.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    token: str = Depends(auth_service.oauth2_scheme),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The logout function ends the session of the access token used for the request.
+
+    :param token: str: Get the access token from the authorization header
+    :param current_user: User: Get the current user
+    :return: None
+    """
+    claims = auth_service.token_claims(token)
+    if claims.get("sid"):
+        token_store.revoke(current_user.email, claims["sid"])
+        revocation_list.revoke(
+            claims["sid"],
+            time.time() + auth_service.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        )
+    else:
+        revocation_list.revoke(claims["jti"], claims["exp"])
+
+
+@router.post("/logout_all", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(
+    token: str = Depends(auth_service.oauth2_scheme),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The logout_all function logs the current user out of every device
+    and revokes every access token issued so far.
+
+    :param token: str: Get the access token from the authorization header
+    :param current_user: User: Get the current user
+    :return: None
+    """
+    claims = auth_service.token_claims(token)
+    token_store.revoke_all(current_user.email)
+    revocation_list.revoke_user(current_user.email)
+    revocation_list.revoke(claims["jti"], claims["exp"])
+
+
 @router.get("/confirmed_email/{token}")
 async def confirmed_email(token: str, db: Session = Depends(get_db)):
     """
@@ -162,11 +293,20 @@ async def request_email(
     :param : Get the user's email address
     :return: A dict with a message
     """
+    ip = client_ip(request)
+    auth_throttle.check(ip, body.email)
+    if auth_throttle.is_unknown(body.email):
+        auth_throttle.failure(ip)
+        return {"message": "Check your email for confirmation."}
     user = await repository_users.get_user_by_email(body.email, db)
-
+    if user is None:
+        auth_throttle.remember_unknown(body.email)
+        auth_throttle.failure(ip)
+        return {"message": "Check your email for confirmation."}
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
+        EMAIL_QUEUE_DEPTH.inc()
         background_tasks.add_task(
             send_email, user.email, user.username, request.base_url
         )
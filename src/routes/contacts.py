@@ -1,14 +1,48 @@
-from typing import List
+import time
+from datetime import date
+from typing import List, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status, Path
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Response,
+    status,
+    Path,
+    Query,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
+from src.conf.config import settings
+from src.database.db import get_db, owner_key, use_shard
 from src.database.models import Contact, User
-from src.sсhemas import ContactCreate, ContactResponse
+from src.sсhemas import (
+    BatchRequest,
+    BatchResponse,
+    ContactChanges,
+    ContactCreate,
+    ContactResponse,
+    DuplicateResponse,
+    ImportRequest,
+    ImportResponse,
+    MergeRequest,
+    StatsResponse,
+    SuggestResponse,
+    TagName,
+    TagRequest,
+    TagResponse,
+)
 from src.repository import contacts as repository_contacts
 from src.services.auth import auth_service
+from src.services.dedup import find_duplicates
+from src.services.events import contact_events
+from src.services.stats import contact_stats, get_counters
+from src.services.suggest import suggest_index
+from src.services.sync import decode_token, encode_token
 from src.sсhemas import ContactResponse
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
@@ -21,21 +55,129 @@ router = APIRouter(prefix="/contacts", tags=["contacts"])
     dependencies=[Depends(RateLimiter(times=10, seconds=60))],
 )
 async def get_contacts(
+    response: Response,
+    tag: List[TagName] = Query(None, max_length=20),
+    match: Literal["any", "all"] = Query("any"),
+    skip: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1, le=1000),
     db: Session = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ) -> List[Contact]:
     """
-    The get_contacts function returns a list of contacts for the current user.
+    The get_contacts function returns a list of contacts for the current user,
+    all of them or a page of them ordered by id. The X-Total-Count header holds
+    the number of contacts of all the pages, unless the page is filtered by tag.
 
+    :param response: Response: Set the X-Total-Count header
+    :param tag: List[TagName]: Only the contacts with these tags
+    :param match: str: Whether contacts need any or all of the tags
+    :param skip: int: The number of contacts to skip
+    :param limit: int: The page size, all the contacts if not given
     :param db: Session: Pass the database session to the repository layer
     :param current_user: User: Get the current user from the database
     :param : Get the current user
     :return: A list of contact objects
     """
-    contacts = await repository_contacts.get_contacts(current_user, db)
+    contacts = await repository_contacts.get_contacts(
+        current_user, db, tag, match == "all", skip, limit
+    )
+    if limit is None:
+        response.headers["X-Total-Count"] = str(len(contacts))
+    elif not tag:
+        counters = await get_counters(current_user, db)
+        response.headers["X-Total-Count"] = str(counters[contact_stats.TOTAL])
     return contacts
 
 
+@router.get(
+    "/batch",
+    response_model=BatchResponse,
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def get_contacts_batch(
+    ids: List[int] = Query([], max_length=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> dict:
+    """
+    The get_contacts_batch function returns many contacts by id with one query,
+    in the order of the ids, and the ids that were not found.
+
+    :param ids: List[int]: The ids of the contacts, repeated ids=1&ids=2
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The contacts and the missing ids
+    """
+    if not ids:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="At least one id is required",
+        )
+    return await get_batch(ids, current_user, db)
+
+
+@router.post(
+    "/batch",
+    response_model=BatchResponse,
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def post_contacts_batch(
+    body: BatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> dict:
+    """
+    The post_contacts_batch function is get_contacts_batch for lists of ids too
+    long for a URL.
+
+    :param body: BatchRequest: The ids of the contacts
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The contacts and the missing ids
+    """
+    return await get_batch(body.ids, current_user, db)
+
+
+async def get_batch(ids: List[int], user: User, db: Session) -> dict:
+    """
+    The get_batch function fetches the contacts of a batch request.
+
+    :param ids: List[int]: The requested ids, duplicates are returned once
+    :param user: User: The current user
+    :param db: Session: Pass the database session to the repository layer
+    :return: The contacts and the missing ids
+    """
+    ids = list(dict.fromkeys(ids))
+    contacts = await repository_contacts.get_contacts_by_ids(ids, user, db)
+    found = {contact.id for contact in contacts}
+    return {"contacts": contacts, "missing": [i for i in ids if i not in found]}
+
+
+@router.get(
+    "/stats",
+    response_model=StatsResponse,
+    description="No more than 30 requests per 10 seconds",
+    dependencies=[Depends(RateLimiter(times=30, seconds=10))],
+)
+async def get_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> dict:
+    """
+    The get_stats function returns the number of contacts of the current user,
+    of their birthdays in the coming days and per month. It is served from
+    counters maintained on every write, without scanning the contacts.
+
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The stats
+    """
+    counters = await get_counters(current_user, db)
+    return contact_stats.summary(counters, date.today(), settings.birthday_window_days)
+
+
 @router.get(
     "/birthday",
     response_model=List[ContactResponse],
@@ -62,6 +204,306 @@ async def contacts_birthday(
     return contacts
 
 
+@router.get(
+    "/changes",
+    response_model=ContactChanges,
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def get_changes(
+    since: str | None = Query(None),
+    limit: int = Query(settings.sync_page_size, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> dict:
+    """
+    The get_changes function returns the contacts created, updated or deleted since
+    the sync token of the previous call, or every contact without a token.
+    While more is true the client calls again with the next token right away.
+    Contacts changed in the same instant as the last one are sent again on the
+    next call, so changes are applied by id. Changes are only sent once they
+    are older than the sync safety lag.
+
+    :param since: str: The next token of the previous call
+    :param limit: int: The maximum number of contacts and of deleted ids
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The changed contacts, the deleted ids and the next token
+    """
+    changed_since = deleted_since = None
+    if since:
+        try:
+            issued, user_id, changed_since, deleted_since = decode_token(since)
+        except ValueError as err:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(err)
+            )
+        # Older tokens may have missed deletes whose tombstones were purged,
+        # tokens of another user id predate a move to another shard
+        expired = time.time() - settings.sync_tombstone_retention_days * 86400
+        if issued < expired or user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Sync token expired, sync again without a token",
+            )
+    contacts, tombstones = await repository_contacts.get_changes(
+        changed_since, deleted_since, limit, current_user, db
+    )
+    more = len(contacts) > limit or len(tombstones) > limit
+    contacts, tombstones = contacts[:limit], tombstones[:limit]
+    if contacts:
+        last = contacts[-1]
+        changed_since = (last.updated_at, last.id if more else 0)
+    if tombstones:
+        last = tombstones[-1]
+        deleted_since = (last.deleted_at, last.id if more else 0)
+    return {
+        "changed": contacts,
+        "deleted": [tombstone.contact_id for tombstone in tombstones],
+        "next": encode_token(current_user.id, changed_since, deleted_since),
+        "more": more,
+    }
+
+
+@router.get(
+    "/suggest",
+    response_model=List[SuggestResponse],
+    description="No more than 30 requests per 10 seconds",
+    dependencies=[Depends(RateLimiter(times=30, seconds=10))],
+)
+async def suggest_contacts(
+    prefix: str = Query(min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> list:
+    """
+    The suggest_contacts function completes a typed prefix to the contacts whose
+    first name, last name, full name or email starts with it. It is served from
+    Redis and meant to be called on every keystroke.
+
+    :param prefix: str: The typed text
+    :param limit: int: The maximum number of contacts
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A list of contacts
+    """
+    owner = owner_key(use_shard(db, current_user.email), current_user.id)
+    contacts = suggest_index.suggest(owner, prefix, limit)
+    if contacts is None:
+        version = suggest_index.version(owner)
+        rows = await repository_contacts.get_contact_names(current_user, db)
+        suggest_index.build(owner, rows, version)
+        contacts = suggest_index.search(rows, prefix, limit)
+    return contacts
+
+
+@router.get(
+    "/duplicates",
+    response_model=List[DuplicateResponse],
+    description="No more than 2 requests per minute",
+    dependencies=[Depends(RateLimiter(times=2, seconds=60))],
+)
+async def get_duplicates(
+    min_score: float = Query(0.6, ge=0, le=1),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> list:
+    """
+    The get_duplicates function suggests pairs of contacts that are likely the same
+    person, best first, with the fields that matched.
+
+    :param min_score: float: The lowest score suggested
+    :param limit: int: The maximum number of pairs
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A list of duplicate pairs
+    """
+    candidates = await repository_contacts.get_duplicate_candidates(current_user, db)
+    # Scoring is CPU bound, keep it off the event loop
+    pairs = await run_in_threadpool(find_duplicates, candidates, min_score)
+    return [pair._asdict() for pair in pairs[:limit]]
+
+
+@router.post(
+    "/merge",
+    response_model=ContactResponse,
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def merge_contacts(
+    body: MergeRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> Contact:
+    """
+    The merge_contacts function merges duplicates into the contact to keep.
+
+    :param body: MergeRequest: The contact to keep and its duplicates
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The kept contact
+    """
+    if body.keep_id in body.merge_ids:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="The kept contact cannot be merged into itself",
+        )
+    contact = await repository_contacts.merge_contacts(
+        body.keep_id, body.merge_ids, current_user, db
+    )
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found!")
+    return contact
+
+
+@router.get(
+    "/tags",
+    response_model=List[TagResponse],
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def get_tags(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> List[dict]:
+    """
+    The get_tags function returns the tags of the current user with the number of
+    contacts that have each of them.
+
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A list of tags
+    """
+    tags = await repository_contacts.get_tags(current_user, db)
+    return [{"name": name, "contacts": count} for name, count in tags]
+
+
+@router.post(
+    "/tags/add",
+    response_model=List[ContactResponse],
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def tag_contacts(
+    body: TagRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> List[Contact]:
+    """
+    The tag_contacts function adds tags to contacts of the current user.
+
+    :param body: TagRequest: The contacts and the tags
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The tagged contacts
+    """
+    contacts = await repository_contacts.tag_contacts(
+        body.contact_ids, body.tags, current_user, db
+    )
+    if contacts is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found!")
+    return contacts
+
+
+@router.post(
+    "/tags/remove",
+    response_model=List[ContactResponse],
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def untag_contacts(
+    body: TagRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> List[Contact]:
+    """
+    The untag_contacts function removes tags from contacts of the current user.
+
+    :param body: TagRequest: The contacts and the tags
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The untagged contacts
+    """
+    contacts = await repository_contacts.untag_contacts(
+        body.contact_ids, body.tags, current_user, db
+    )
+    if contacts is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found!")
+    return contacts
+
+
+@router.get(
+    "/lookup",
+    response_model=List[ContactResponse],
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def lookup_phone(
+    phone: str = Query(min_length=1, max_length=50),
+    suffix: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> List[Contact]:
+    """
+    The lookup_phone function finds the contacts with a phone number. With suffix
+    it matches the last digits of the numbers instead, at least
+    settings.phone_min_suffix of them.
+
+    :param phone: str: The phone number in any format, or its last digits
+    :param suffix: bool: Match the last digits of the number
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A list of contacts
+    """
+    digits = sum(c.isdigit() for c in phone)
+    if suffix and digits < settings.phone_min_suffix:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At least {settings.phone_min_suffix} digits are required",
+        )
+    contacts = await repository_contacts.lookup_phone(phone, suffix, current_user, db)
+    if contacts is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid phone number",
+        )
+    return contacts
+
+
+@router.get(
+    "/events",
+    response_class=StreamingResponse,
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def contact_events_stream(
+    last_event_id: str | None = Header(None, pattern=r"^\d+-\d+$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> StreamingResponse:
+    """
+    The contact_events_stream function streams the changes of the contacts of the
+    current user as server-sent events: created, updated and deleted with the
+    contact id, a ping comment as heartbeat and reset when the client has to
+    sync again through /changes. Reconnecting clients resume after Last-Event-ID.
+
+    :param last_event_id: str: The id of the last event the client received
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The event stream
+    """
+    owner = owner_key(use_shard(db, current_user.email), current_user.id)
+    # The stream outlives the request, an idle client must not hold a connection
+    db.close()
+    return StreamingResponse(
+        contact_events.stream(owner, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get(
     "/{contact_id}",
     response_model=ContactResponse,
@@ -96,6 +538,9 @@ async def get_contact(
 )
 async def search_contact(
     query: str,
+    response: Response,
+    tag: List[TagName] = Query(None, max_length=20),
+    match: Literal["any", "all"] = Query("any"),
     db: Session = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ) -> Contact:
@@ -103,14 +548,20 @@ async def search_contact(
     The search_contact function searches for a contact by name.
 
     :param query: str: Get the query string from the url
+    :param response: Response: Set the X-Total-Count header
+    :param tag: List[TagName]: Only the contacts with these tags
+    :param match: str: Whether contacts need any or all of the tags
     :param db: Session: Pass the database session to the repository layer
     :param current_user: User: Get the current user from the database
     :param : Get the current user from the database
     :return: A contact object
     """
-    contact = await repository_contacts.search_contact(query, current_user, db)
+    contact = await repository_contacts.search_contact(
+        query, current_user, db, tag, match == "all"
+    )
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found!")
+    response.headers["X-Total-Count"] = str(len(contact))
     return contact
 
 
@@ -146,6 +597,34 @@ async def create_contact(
     return contact
 
 
+@router.post(
+    "/import",
+    response_model=ImportResponse,
+    status_code=status.HTTP_201_CREATED,
+    description="No more than 10 requests per minute",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+)
+async def import_contacts(
+    body: ImportRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+) -> dict:
+    """
+    The import_contacts function creates up to 1000 contacts at once. Contacts
+    with an email the user already has are skipped rather than failing the import.
+    Send an Idempotency-Key header to retry an import safely.
+
+    :param body: ImportRequest: The contacts to create
+    :param db: Session: Get the database session
+    :param current_user: User: Get the user who is currently logged in
+    :return: The ids of the created contacts and the skipped emails
+    """
+    created, skipped = await repository_contacts.import_contacts(
+        body.contacts, current_user, db
+    )
+    return {"created": created, "skipped": skipped}
+
+
 @router.put(
     "/{contact_id}",
     response_model=ContactResponse,
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+from fastapi import APIRouter, Depends, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.database.db import get_db
+from src.services.resources import get_redis
+from src.conf.config import settings
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+_ready_cache: dict = {"expires": 0.0, "result": None}
+_ready_lock = asyncio.Lock()
+
+
+async def _timed_check(func) -> dict:
+    """
+    The _timed_check function runs a blocking check in the threadpool with a timeout.
+
+    :param func: The blocking function to run
+    :return: A dict with the status and the latency of the check
+    """
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            run_in_threadpool(func), timeout=settings.health_check_timeout
+        )
+        result = {"status": "ok"}
+    except asyncio.TimeoutError:
+        result = {"status": "fail", "error": "timeout"}
+    except Exception as e:
+        result = {"status": "fail", "error": str(e)}
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def pool_status(db: Session) -> dict:
+    """
+    The pool_status function reports how many connections of the pool are in use.
+
+    :param db: Session: The session whose engine pool is inspected
+    :return: A dict with the pool size, checked out connections and saturation
+    """
+    pool = db.get_bind().pool
+    if not hasattr(pool, "checkedout"):
+        return {"status": "ok"}
+    # Resources creates every engine pool with the configured overflow
+    capacity = pool.size() + max(settings.db_max_overflow, 0)
+    checked_out = pool.checkedout()
+    saturation = checked_out / capacity if capacity else 0.0
+    return {
+        "status": (
+            "ok" if saturation < settings.health_pool_saturation_limit else "fail"
+        ),
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "saturation": round(saturation, 2),
+    }
+
+
+async def check_readiness(db: Session, redis) -> dict:
+    """
+    The check_readiness function checks the database and Redis concurrently.
+    The result is cached for a short interval, and concurrent probes wait for
+    the check that is already running instead of starting their own.
+
+    :param db: Session: The session used to ping the database
+    :param redis: The Redis client to ping
+    :return: A dict with the overall status and the result of every check
+    """
+    async with _ready_lock:
+        if _ready_cache["expires"] > time.monotonic():
+            return _ready_cache["result"]
+        database, cache = await asyncio.gather(
+            _timed_check(lambda: db.execute(text("SELECT 1")).fetchone()),
+            _timed_check(redis.ping),
+        )
+        checks = {"database": database, "redis": cache, "pool": pool_status(db)}
+        result = {
+            "status": (
+                "ok"
+                if all(check["status"] == "ok" for check in checks.values())
+                else "fail"
+            ),
+            "checks": checks,
+        }
+        _ready_cache["result"] = result
+        _ready_cache["expires"] = time.monotonic() + settings.health_cache_ttl
+        return result
+
+
+@router.get("/live")
+async def live():
+    """
+    The live function tells the orchestrator that the process is running.
+    It does not touch any external service.
+
+    :return: A dict with the status
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready(
+    response: Response, db: Session = Depends(get_db), redis=Depends(get_redis)
+):
+    """
+    The ready function tells the orchestrator whether the worker can serve traffic.
+
+    :param response: Response: Set the status code to 503 when a check fails
+    :param db: Session: Pass the database session to the checks
+    :param redis: Pass the Redis client to the checks
+    :return: A dict with the overall status and the result of every check
+    """
+    result = await check_readiness(db, redis)
+    if result["status"] != "ok":
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return result
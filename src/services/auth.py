@@ -1,25 +1,35 @@
+from functools import cached_property
 from typing import Optional
-import pickle
+import uuid
+import time
 
-import redis
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
+from src.database.db import get_db, read_replica
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.services.cache import CachedLoader
+from src.services.metrics import USER_CACHE
+from src.services.resources import resources
+from src.services.revocation import RevocationList
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY = settings.jwt_secret_key
     ALGORITHM = settings.jwt_algorithm
+    ACCESS_TOKEN_EXPIRE_MINUTES = 60
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+
+    @cached_property
+    def pwd_context(self):
+        # passlib is only needed to log in and register, not to serve tokens
+        from passlib.context import CryptContext
+
+        return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -59,10 +69,11 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(minutes=60)
-        to_encode.update(
-            {"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"}
-        )
+            expire = datetime.utcnow() + timedelta(
+                minutes=self.ACCESS_TOKEN_EXPIRE_MINUTES
+            )
+        to_encode.setdefault("jti", uuid.uuid4().hex)
+        to_encode.update({"iat": time.time(), "exp": expire, "scope": "access_token"})
         encoded_access_token = jwt.encode(
             to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM
         )
@@ -84,9 +95,8 @@ class Auth:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
             expire = datetime.utcnow() + timedelta(days=7)
-        to_encode.update(
-            {"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"}
-        )
+        to_encode.setdefault("jti", uuid.uuid4().hex)
+        to_encode.update({"iat": time.time(), "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(
             to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM
         )
@@ -100,13 +110,23 @@ class Auth:
         :param refresh_token: str: Pass the refresh token to the function
         :return: The email address of the user
         """
+        payload = await self.decode_refresh_payload(refresh_token)
+        return payload["sub"]
+
+    async def decode_refresh_payload(self, refresh_token: str) -> dict:
+        """
+        The decode_refresh_payload function validates the refresh token and returns all of its claims.
+
+        :param self: Represent the instance of a class
+        :param refresh_token: str: Pass the refresh token to the function
+        :return: The claims of the token
+        """
         try:
             payload = jwt.decode(
                 refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM]
             )
             if payload["scope"] == "refresh_token":
-                email = payload["sub"]
-                return email
+                return payload
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid scope for token",
@@ -117,6 +137,36 @@ class Auth:
                 detail="Could not validate credentials",
             )
 
+    def token_claims(self, token: str) -> dict:
+        """
+        The token_claims function reads the claims of a token issued by this service
+        without verifying its signature again.
+
+        :param self: Represent the instance of a class
+        :param token: str: A token created by this service
+        :return: The claims of the token
+        """
+        return jwt.get_unverified_claims(token)
+
+    def access_token_subject(self, token: str) -> Optional[str]:
+        """
+        The access_token_subject function returns the email of a valid access token
+        without loading the user.
+
+        :param self: Represent the instance of a class
+        :param token: str: The access token
+        :return: The email, or None if the token is invalid, expired or revoked
+        """
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            return None
+        if payload.get("scope") != "access_token" or revocation_list.is_revoked(
+            payload
+        ):
+            return None
+        return payload.get("sub")
+
     async def get_current_user(
         self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
     ):
@@ -144,18 +194,18 @@ class Auth:
                     raise credentials_exception
             else:
                 raise credentials_exception
+            if revocation_list.is_revoked(payload):
+                raise credentials_exception
         except JWTError as e:
             raise credentials_exception
 
-        user = self.r.get(f"user:{email}")
+        async def load_user():
+            with read_replica(db, f"email:{email}"):
+                return await repository_users.get_user_by_email(email, db)
+
+        user = await user_cache.get(email, load_user)
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            raise credentials_exception
         return user
 
     def create_email_token(self, data: dict):
@@ -194,3 +244,7 @@ class Auth:
 
 
 auth_service = Auth()
+revocation_list = RevocationList(
+    lambda: resources.redis, max_token_age=Auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+user_cache = CachedLoader("user", 900, lambda: resources.redis, metric=USER_CACHE)
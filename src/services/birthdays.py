@@ -0,0 +1,192 @@
+"""
+Sends every user a digest of their contacts with a birthday in the coming days.
+Meant to run once a day from cron or a scheduler::
+
+    python -m src.services.birthdays [--date 2026-10-19]
+
+Users are paged by id on every shard and the contacts of a page are found with a
+single query, so memory stays bounded by the page size whatever the number of
+contacts. The last page sent is remembered in Redis, so a run that is restarted
+the same day continues where it stopped instead of sending the digests again.
+"""
+
+import argparse
+import asyncio
+import calendar
+import logging
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import select
+
+from src.conf.config import settings
+from src.database.models import Contact, User
+from src.repository.contacts import upcoming_birthdays
+from src.services.email import send_birthday_digest
+from src.services.metrics import EMAIL_QUEUE_DEPTH
+from src.services.resources import resources
+
+logger = logging.getLogger(__name__)
+
+LOCK = "birthdays:lock"
+
+
+def next_birthday(birthday: date, today: date) -> date:
+    """
+    The next_birthday function returns the date of the next birthday, today included.
+
+    :param birthday: date: The date of birth
+    :param today: date: The current date
+    :return: The date of the next birthday
+    """
+    for year in (today.year, today.year + 1):
+        try:
+            day = birthday.replace(year=year)
+        except ValueError:
+            day = date(year, 3, 1)
+        if day >= today:
+            return day
+
+
+def digests(rows, today: date) -> list[tuple]:
+    """
+    The digests function groups the birthdays found by user.
+
+    :param rows: The user id, email, username, contact first name, last name and birthday
+    :param today: date: The current date
+    :return: A list of email, username and birthdays, soonest first
+    """
+    users, contacts = {}, defaultdict(list)
+    for user_id, email, username, firstname, lastname, birthday in rows:
+        users[user_id] = (email, username)
+        day = next_birthday(birthday, today)
+        contacts[user_id].append(
+            {
+                "name": f"{firstname} {lastname}",
+                "date": f"{calendar.month_name[day.month]} {day.day}",
+                "days": (day - today).days,
+            }
+        )
+    return [
+        (*users[user_id], sorted(birthdays, key=lambda c: c["days"]))
+        for user_id, birthdays in contacts.items()
+    ]
+
+
+async def send_batch(batch: list[tuple], send, concurrency: int) -> int:
+    """
+    The send_batch function sends the digests of a page of users, at most
+    concurrency at a time.
+
+    :param batch: list[tuple]: The email, username and birthdays of every digest
+    :param send: The coroutine function that sends a digest
+    :param concurrency: int: The number of emails sent at the same time
+    :return: The number of digests sent
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send_one(email, username, contacts):
+        async with semaphore:
+            # One failing digest does not stop the others of the shard
+            try:
+                return await send(email, username, contacts)
+            except Exception:
+                logger.exception("Sending the birthday digest to %s failed", email)
+                return False
+            finally:
+                EMAIL_QUEUE_DEPTH.dec()
+
+    EMAIL_QUEUE_DEPTH.inc(len(batch))
+    results = await asyncio.gather(*(send_one(*digest) for digest in batch))
+    return sum(1 for sent in results if sent)
+
+
+async def send_digests(today: date = None, engines=None, r=None, send=None) -> int:
+    """
+    The send_digests function sends the birthday digests of every confirmed user
+    of every shard.
+
+    :param today: date: The day of the run, today by default
+    :param engines: The engines of the shards, the configured ones by default
+    :param r: The Redis client keeping the progress of the run
+    :param send: The coroutine function that sends a digest
+    :return: The number of digests sent
+    """
+    today = today or date.today()
+    engines = engines or resources.shard_engines
+    r = r or resources.redis
+    send = send or send_birthday_digest
+    # A second run started by another scheduler leaves the first one alone
+    if not r.set(LOCK, today.isoformat(), nx=True, ex=6 * 3600):
+        logger.warning("Birthday digests are already being sent")
+        return 0
+    sent = 0
+    try:
+        for shard, engine in enumerate(engines):
+            sent += await send_shard(shard, engine, today, r, send)
+    finally:
+        r.delete(LOCK)
+    return sent
+
+
+async def send_shard(shard: int, engine, today: date, r, send) -> int:
+    """
+    The send_shard function sends the birthday digests of the users of a shard,
+    one page of users at a time.
+
+    :param shard: int: The index of the shard
+    :param engine: The engine of the shard
+    :param today: date: The day of the run
+    :param r: The Redis client keeping the progress of the run
+    :param send: The coroutine function that sends a digest
+    :return: The number of digests sent
+    """
+    progress = f"birthdays:{today.isoformat()}:{shard}"
+    last_id = int(r.get(progress) or 0)
+    condition = upcoming_birthdays(
+        Contact.birthday, today, settings.birthday_window_days
+    )
+    sent = 0
+    while True:
+        # The connection is returned to the pool while the emails are sent
+        with engine.connect() as conn:
+            ids = conn.scalars(
+                select(User.id)
+                .where(User.id > last_id)
+                .order_by(User.id)
+                .limit(settings.birthday_batch_size)
+            ).all()
+            if not ids:
+                break
+            rows = conn.execute(
+                select(
+                    User.id,
+                    User.email,
+                    User.username,
+                    Contact.firstname,
+                    Contact.lastname,
+                    Contact.birthday,
+                )
+                .join(Contact, Contact.user_id == User.id)
+                .where(
+                    User.id.between(ids[0], ids[-1]),
+                    User.confirmed.is_(True),
+                    condition,
+                )
+            ).all()
+        batch = digests(rows, today)
+        sent += await send_batch(batch, send, settings.birthday_email_concurrency)
+        last_id = ids[-1]
+        r.set(progress, last_id, ex=2 * 86400)
+        logger.info(
+            "Shard %d: %d digests sent up to user %d", shard, len(batch), last_id
+        )
+    return sent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send the birthday digests")
+    parser.add_argument("--date", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logger.info("%d digests sent", asyncio.run(send_digests(args.date)))
@@ -0,0 +1,164 @@
+import asyncio
+import math
+import pickle
+import random
+import time
+import uuid
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key inside one process:
+    the first caller starts the function in a task and every caller awaits its
+    result. The task is shielded, so a caller that is cancelled, e.g. because its
+    client disconnected, does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func):
+        """
+        The do function runs func once for all concurrent callers with the same key.
+
+        :param self: Represent the instance of the class
+        :param key: str: The key that identifies the call
+        :param func: A coroutine function without arguments
+        :return: The result of func
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Callers re-raise the error, if every one of them left nobody does
+        if not task.cancelled():
+            task.exception()
+
+
+class CachedLoader:
+    """
+    A pickled Redis cache in front of a slow loader that avoids thundering herds.
+
+    Misses are coalesced within the process (SingleFlight) and across workers
+    (a short Redis lock; the others wait for the value to appear). Entries are
+    refreshed early with probability growing towards the end of their TTL
+    (probabilistic early expiration, "XFetch"), so hot keys are recomputed by
+    one request before they expire instead of by all of them after.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        ttl: int,
+        redis_getter,
+        metric=None,
+        beta: float = 1.0,
+        lock_timeout: float = 2.0,
+        lock_wait: float = 0.2,
+    ):
+        self.prefix = prefix
+        self.ttl = ttl
+        self._redis_getter = redis_getter
+        self.metric = metric
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self._flight = SingleFlight()
+
+    @property
+    def r(self):
+        return self._redis_getter()
+
+    def _count(self, result: str) -> None:
+        if self.metric is not None:
+            self.metric.labels(result).inc()
+
+    def _should_refresh(self, delta: float, expires: float) -> bool:
+        return time.time() - delta * self.beta * math.log(random.random()) >= expires
+
+    def _acquire(self, key: str) -> str | None:
+        token = uuid.uuid4().hex
+        if self.r.set(f"lock:{key}", token, nx=True, px=int(self.lock_timeout * 1000)):
+            return token
+        return None
+
+    def _release(self, key: str, token: str) -> None:
+        if self.r.get(f"lock:{key}") == token.encode():
+            self.r.delete(f"lock:{key}")
+
+    async def _load(self, key: str, loader, token: str | None) -> bytes | None:
+        try:
+            start = time.perf_counter()
+            value = await loader()
+            if value is None:
+                self.r.delete(key)
+                return None
+            delta = time.perf_counter() - start
+            data = pickle.dumps((value, delta, time.time() + self.ttl))
+            self.r.set(key, data, ex=self.ttl)
+            return data
+        finally:
+            if token is not None:
+                self._release(key, token)
+
+    async def _load_or_wait(self, key: str, loader) -> bytes | None:
+        token = self._acquire(key)
+        if token is None:
+            # another worker is loading the value, give it a moment
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+                data = self.r.get(key)
+                if data is not None:
+                    return data
+        return await self._load(key, loader, token)
+
+    async def get(self, name: str, loader):
+        """
+        The get function returns the cached value or loads it with the loader.
+        Every caller gets its own unpickled copy, so ORM objects are never
+        shared between requests.
+
+        :param self: Represent the instance of the class
+        :param name: str: The key of the value without the prefix
+        :param loader: A coroutine function that loads the value, None is not cached
+        :return: The value or None
+        """
+        key = f"{self.prefix}:{name}"
+        data = self.r.get(key)
+        if data is not None:
+            value = pickle.loads(data)
+            if not isinstance(value, tuple):
+                # entry written before values carried their metadata
+                self._count("hit")
+                return value
+            value, delta, expires = value
+            if not self._should_refresh(delta, expires):
+                self._count("hit")
+                return value
+            token = self._acquire(key)
+            if token is None:
+                self._count("hit")
+                return value
+            self._count("refresh")
+            data = await self._flight.do(key, lambda: self._load(key, loader, token))
+        else:
+            self._count("miss")
+            data = await self._flight.do(key, lambda: self._load_or_wait(key, loader))
+        return pickle.loads(data)[0] if data is not None else None
+
+    def invalidate(self, name: str) -> None:
+        """
+        The invalidate function removes a value from the cache.
+
+        :param self: Represent the instance of the class
+        :param name: str: The key of the value without the prefix
+        :return: None
+        """
+        self.r.delete(f"{self.prefix}:{name}")
@@ -0,0 +1,147 @@
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import NamedTuple
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("BFPV", "1"),
+    **dict.fromkeys("CGJKQSXZ", "2"),
+    **dict.fromkeys("DT", "3"),
+    "L": "4",
+    **dict.fromkeys("MN", "5"),
+    "R": "6",
+}
+
+
+class Candidate(NamedTuple):
+    id: int
+    firstname: str
+    lastname: str
+    email: str | None
+    phone_normalized: str | None
+    birthday: object
+
+
+class DuplicatePair(NamedTuple):
+    first_id: int
+    second_id: int
+    score: float
+    reasons: list[str]
+
+
+def soundex(name: str) -> str:
+    """
+    The soundex function returns the American Soundex code of a name, so that
+    spellings that sound alike, like Olena and Olina, share a key.
+
+    :param name: str: The name
+    :return: A letter and three digits, or an empty string for non-Latin names
+    """
+    name = "".join(c for c in name.upper() if "A" <= c <= "Z")
+    if not name:
+        return ""
+    code, last = name[0], SOUNDEX_CODES.get(name[0], "")
+    for c in name[1:]:
+        digit = SOUNDEX_CODES.get(c, "")
+        if digit and digit != last:
+            code += digit
+        if c not in "HW":
+            last = digit
+    return (code + "000")[:4]
+
+
+def full_name(contact: Candidate) -> str:
+    return f"{contact.firstname} {contact.lastname}".strip().lower()
+
+
+def blocking_keys(contact: Candidate) -> list[str]:
+    """
+    The blocking_keys function returns the keys of the blocks a contact falls into.
+    Only contacts sharing a block are compared.
+
+    :param contact: Candidate: The contact
+    :return: The phone, email and phonetic name keys of the contact
+    """
+    keys = []
+    if contact.phone_normalized:
+        keys.append(f"p:{contact.phone_normalized}")
+    if contact.email:
+        keys.append(f"e:{contact.email.lower()}")
+    first, last = soundex(contact.firstname), soundex(contact.lastname)
+    keys.append(f"n:{first}{last}" if first and last else f"n:{full_name(contact)}")
+    return keys
+
+
+def score(a: Candidate, b: Candidate) -> tuple[float, list[str]]:
+    """
+    The score function rates how likely two contacts are the same person.
+    A shared phone, email or name alone is not enough, families share phones
+    and emails and names repeat, but any two of them together are.
+
+    :param a: Candidate: A contact
+    :param b: Candidate: Another contact
+    :return: The score between 0 and 1 and the fields that matched
+    """
+    total, reasons = 0.0, []
+    if a.phone_normalized and a.phone_normalized == b.phone_normalized:
+        total += 0.4
+        reasons.append("phone")
+    if a.email and b.email and a.email.lower() == b.email.lower():
+        total += 0.4
+        reasons.append("email")
+    name_a, name_b = full_name(a), full_name(b)
+    similarity = (
+        1.0 if name_a == name_b else SequenceMatcher(None, name_a, name_b).ratio()
+    )
+    if similarity >= 0.85:
+        total += 0.45 * similarity
+        reasons.append("name")
+    if a.birthday == b.birthday:
+        total += 0.2
+        reasons.append("birthday")
+    return min(round(total, 3), 1.0), reasons
+
+
+def find_duplicates(
+    contacts: list[Candidate],
+    min_score: float = 0.6,
+    max_block: int = 50,
+    window: int = 10,
+) -> list[DuplicatePair]:
+    """
+    The find_duplicates function finds the pairs of contacts that are likely
+    duplicates. Contacts are only compared within a block, so the work grows with
+    the number of contacts rather than with its square. Blocks larger than
+    max_block, like a common name, are sorted by name and every contact is
+    compared with the next window ones only.
+
+    :param contacts: list[Candidate]: The contacts of a user
+    :param min_score: float: The lowest score reported
+    :param max_block: int: The largest block compared pair by pair
+    :param window: int: The window of the large blocks
+    :return: The pairs, best first
+    """
+    blocks = defaultdict(list)
+    for contact in contacts:
+        for key in blocking_keys(contact):
+            blocks[key].append(contact)
+
+    seen, pairs = set(), []
+    for block in blocks.values():
+        if len(block) < 2:
+            continue
+        if len(block) > max_block:
+            block.sort(key=lambda c: (c.lastname.lower(), c.firstname.lower()))
+            reach = window
+        else:
+            reach = len(block)
+        for i, a in enumerate(block):
+            for b in block[i + 1 : i + 1 + reach]:
+                pair = (a.id, b.id) if a.id < b.id else (b.id, a.id)
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                value, reasons = score(a, b)
+                if value >= min_score:
+                    pairs.append(DuplicatePair(*pair, value, reasons))
+    pairs.sort(key=lambda p: (-p.score, p.first_id, p.second_id))
+    return pairs
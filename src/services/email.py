@@ -1,25 +1,12 @@
-from pathlib import Path
+import logging
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
-from src.conf.config import settings
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Test Corp",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / "templates",
-)
+from src.services.metrics import EMAIL_QUEUE_DEPTH
+from src.services.resources import resources
+
+logger = logging.getLogger(__name__)
 
 
 async def send_email(email: EmailStr, username: str, host: str):
@@ -31,6 +18,10 @@ async def send_email(email: EmailStr, username: str, host: str):
     :param host: str: Pass the hostname of the server to the email template
     :return: A coroutine object
     """
+    # fastapi_mail is slow to import and most workers never send an email
+    from fastapi_mail import MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
     try:
         token_verification = auth_service.create_email_token({"sub": email})
         message = MessageSchema(
@@ -44,7 +35,36 @@ async def send_email(email: EmailStr, username: str, host: str):
             subtype=MessageType.html,
         )
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
+        await resources.mail.send_message(message, template_name="email_template.html")
     except ConnectionErrors as err:
         print(err)
+    finally:
+        EMAIL_QUEUE_DEPTH.dec()
+
+
+async def send_birthday_digest(email: EmailStr, username: str, contacts: list[dict]):
+    """
+    The send_birthday_digest function sends a user the list of their contacts
+    with a birthday in the coming days.
+
+    :param email: EmailStr: The email of the user
+    :param username: str: The username of the user
+    :param contacts: list[dict]: The name, date and days left of every birthday
+    :return: True if the email was sent
+    """
+    from fastapi_mail import MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
+    try:
+        message = MessageSchema(
+            subject="Upcoming birthdays",
+            recipients=[email],
+            template_body={"username": username, "contacts": contacts},
+            subtype=MessageType.html,
+        )
+
+        await resources.mail.send_message(message, template_name="birthday_digest.html")
+        return True
+    except ConnectionErrors as err:
+        logger.error("Sending the birthday digest to %s failed: %s", email, err)
+        return False
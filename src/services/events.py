@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import threading
+
+from fastapi.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.services.resources import resources
+
+logger = logging.getLogger(__name__)
+
+
+class ContactEvents:
+    """
+    Contact changes pushed to clients over server-sent events.
+
+    Every change is appended to a capped Redis stream of its owner, which lets a
+    client resume from the last event id it saw, and announced on a single
+    pub/sub channel. Each worker runs one listener thread that wakes the streams
+    of the owners it serves, so an idle connection costs a coroutine and a queue
+    rather than a Redis connection.
+    """
+
+    CHANNEL = "contact-events"
+
+    def __init__(
+        self,
+        redis_getter,
+        maxlen: int = 1000,
+        ttl: int = 86400,
+        heartbeat: float = 15.0,
+    ):
+        self._redis_getter = redis_getter
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        # owner -> {queue of a stream: the event loop serving it}
+        self._subscribers: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def r(self):
+        return self._redis_getter()
+
+    @staticmethod
+    def key(owner: str) -> str:
+        return f"events:{owner}"
+
+    def publish(self, changes: list[tuple[str, str, int]]) -> None:
+        """
+        The publish function records contact changes and wakes their listeners.
+
+        :param self: Represent the instance of the class
+        :param changes: list[tuple[str, str, int]]: The owner, the kind of change
+            (created, updated or deleted) and the contact id of each change
+        :return: None
+        """
+        pipe = self.r.pipeline()
+        for owner, kind, contact_id in changes:
+            pipe.xadd(
+                self.key(owner),
+                {"type": kind, "id": contact_id},
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+            pipe.expire(self.key(owner), self.ttl)
+        for owner in {owner for owner, _, _ in changes}:
+            pipe.publish(self.CHANNEL, owner)
+        pipe.execute()
+
+    def read(self, owner: str, after: str) -> tuple[list, bool]:
+        """
+        The read function returns the events of an owner after the given event id.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the stream
+        :param after: str: The id of the last event already sent
+        :return: The events and whether the stream still reaches back to after
+        """
+        entries = self.r.xrange(self.key(owner), min=after, count=self.maxlen + 1)
+        if entries and entries[0][0].decode() == after:
+            return entries[1:], True
+        return entries, False
+
+    async def stream(self, owner: str, last_event_id: str | None = None):
+        """
+        The stream function yields the server-sent events of an owner until the
+        client disconnects, starting after last_event_id or from now on.
+        A reset event tells the client that events were lost and it has to sync
+        through the changes endpoint.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the stream
+        :param last_event_id: str | None: The Last-Event-ID sent by the client
+        :return: An async generator of event strings
+        """
+        queue = self.subscribe(owner)
+        try:
+            last = last_event_id
+            if last is None:
+                latest = await run_in_threadpool(
+                    self.r.xrevrange, self.key(owner), count=1
+                )
+                last = latest[0][0].decode() if latest else "0-0"
+            else:
+                queue.put_nowait(None)
+            yield f"retry: {int(self.heartbeat * 1000)}\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                # Redis is read off the event loop that serves the other streams
+                entries, complete = await run_in_threadpool(self.read, owner, last)
+                if not complete and last != "0-0":
+                    yield "event: reset\ndata: {}\n\n"
+                for event_id, fields in entries:
+                    last = event_id.decode()
+                    kind = fields[b"type"].decode()
+                    data = json.dumps({"id": int(fields[b"id"])})
+                    yield f"id: {last}\nevent: {kind}\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(owner, queue)
+
+    def subscribe(self, owner: str) -> asyncio.Queue:
+        """
+        The subscribe function registers a queue that is woken on new events of an owner.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the stream
+        :return: The queue
+        """
+        self.start()
+        queue = asyncio.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers.setdefault(owner, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, owner: str, queue: asyncio.Queue) -> None:
+        """
+        The unsubscribe function removes a queue registered by subscribe.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the stream
+        :param queue: asyncio.Queue: The queue
+        :return: None
+        """
+        with self._lock:
+            queues = self._subscribers.get(owner, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._subscribers.pop(owner, None)
+
+    @staticmethod
+    def _wake(queue: asyncio.Queue) -> None:
+        # Wake-ups coalesce, the stream reads every new event at once
+        if queue.empty():
+            queue.put_nowait(None)
+
+    def notify(self, owner: str | None = None) -> None:
+        """
+        The notify function wakes the streams of an owner, or of every owner.
+        It is safe to call from any thread.
+
+        :param self: Represent the instance of the class
+        :param owner: str | None: The owner, None for all of them
+        :return: None
+        """
+        with self._lock:
+            if owner is None:
+                queues = [q for qs in self._subscribers.values() for q in qs.items()]
+            else:
+                queues = list(self._subscribers.get(owner, {}).items())
+        for queue, loop in queues:
+            try:
+                loop.call_soon_threadsafe(self._wake, queue)
+            except RuntimeError:
+                # The loop of a finished request
+                pass
+
+    def _listen(self) -> None:
+        while not self._stopped.is_set():
+            pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.CHANNEL)
+                # Events may have been missed while the subscription was down
+                self.notify()
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.notify(message["data"].decode())
+            except Exception as e:
+                logger.warning("contact events listener failed: %s", e)
+                self._stopped.wait(1.0)
+            finally:
+                pubsub.close()
+
+    def start(self) -> None:
+        """
+        The start function starts the listener thread of the worker, once.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._listen, name="contact-events-listener", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """
+        The stop function stops the listener thread.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+
+contact_events = ContactEvents(
+    lambda: resources.redis,
+    maxlen=settings.events_stream_maxlen,
+    ttl=settings.events_stream_ttl,
+    heartbeat=settings.events_heartbeat,
+)
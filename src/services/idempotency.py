@@ -0,0 +1,320 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+
+import redis
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.resources import resources
+
+PENDING = "pending"
+DONE = "done"
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+
+
+class IdempotencyStore:
+    """
+    Responses of requests sent with an Idempotency-Key, in Redis.
+
+    The first request with a key claims it with SET NX and stores its response
+    for ttl seconds. Duplicates that arrive meanwhile wait for that response:
+    those in the same process are woken by the first one, the others poll.
+    The request holding a claim renews it every third of lock_ttl while it runs,
+    so a claim only expires if the process handling the request dies and the key
+    is not stuck.
+    """
+
+    def __init__(
+        self,
+        redis_getter,
+        ttl: int = 86400,
+        lock_ttl: int = 30,
+        wait: float = 10.0,
+        poll: float = 0.05,
+    ):
+        self._redis_getter = redis_getter
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+        self.poll = poll
+        self._events: dict[str, asyncio.Event] = {}
+
+    @property
+    def r(self):
+        return self._redis_getter()
+
+    @staticmethod
+    def key(subject: str, idempotency_key: str) -> str:
+        digest = hashlib.sha256(f"{subject}\x00{idempotency_key}".encode()).hexdigest()
+        return f"idempotency:{digest}"
+
+    async def begin(self, key: str, fingerprint: str) -> dict | None:
+        """
+        The begin function claims a key, or waits for the response of the request
+        that claimed it.
+
+        :param self: Represent the instance of the class
+        :param key: str: The key of the request
+        :param fingerprint: str: The hash of the request, stored with the claim
+        :return: None if the caller has to handle the request, the record of the
+            first request otherwise, still pending if the wait timed out or if the
+            first request was a different one
+        """
+        deadline = time.monotonic() + self.wait
+        while True:
+            claim = json.dumps({"state": PENDING, "fingerprint": fingerprint})
+            if self.r.set(key, claim, nx=True, ex=self.lock_ttl):
+                self._events[key] = asyncio.Event()
+                return None
+            record = self.r.get(key)
+            if record is None:
+                # The first request failed or its claim expired, try again
+                continue
+            record = json.loads(record)
+            if (
+                record["state"] == DONE
+                or record["fingerprint"] != fingerprint
+                or time.monotonic() >= deadline
+            ):
+                return record
+            event = self._events.get(key)
+            if event is None:
+                await asyncio.sleep(self.poll)
+                continue
+            try:
+                await asyncio.wait_for(event.wait(), self.poll * 20)
+            except asyncio.TimeoutError:
+                pass
+
+    def renew(self, key: str, fingerprint: str) -> bool:
+        """
+        The renew function extends a pending claim by lock_ttl seconds.
+
+        :param self: Represent the instance of the class
+        :param key: str: The key of the request
+        :param fingerprint: str: The hash of the request
+        :return: True if the claim was still pending and is renewed
+        """
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                record = pipe.get(key)
+                if record is None:
+                    return False
+                record = json.loads(record)
+                if record["state"] != PENDING or record["fingerprint"] != fingerprint:
+                    return False
+                pipe.multi()
+                pipe.expire(key, self.lock_ttl)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                # The response was stored or the claim released meanwhile
+                return False
+
+    async def keep_claimed(self, key: str, fingerprint: str) -> None:
+        """
+        The keep_claimed function renews a claim until it is cancelled.
+
+        :param self: Represent the instance of the class
+        :param key: str: The key of the request
+        :param fingerprint: str: The hash of the request
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            if not self.renew(key, fingerprint):
+                return
+
+    def finish(self, key: str, fingerprint: str, status: int, headers, body) -> None:
+        """
+        The finish function stores the response of a claimed key.
+
+        :param self: Represent the instance of the class
+        :param key: str: The key of the request
+        :param fingerprint: str: The hash of the request
+        :param status: int: The status code of the response
+        :param headers: The raw headers of the response
+        :param body: bytes: The body of the response
+        :return: None
+        """
+        record = {
+            "state": DONE,
+            "fingerprint": fingerprint,
+            "status": status,
+            "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in headers],
+            "body": base64.b64encode(body).decode(),
+        }
+        self.r.set(key, json.dumps(record), ex=self.ttl)
+        self._wake(key)
+
+    def abort(self, key: str) -> None:
+        """
+        The abort function releases a claimed key without a response, so that a
+        retry handles the request again.
+
+        :param self: Represent the instance of the class
+        :param key: str: The key of the request
+        :return: None
+        """
+        self.r.delete(key)
+        self._wake(key)
+
+    def _wake(self, key: str) -> None:
+        event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware that makes POST, PUT and PATCH requests under the given path
+    prefixes idempotent when they carry an Idempotency-Key header. A retry with
+    the same key and the same request gets the stored response, marked with
+    Idempotent-Replayed, without reaching the application or the database.
+    Responses with a 5xx status and rejections that say nothing about the
+    request itself, such as 401, 403 and 429, are not stored, so the request
+    can be retried.
+    """
+
+    METHODS = ("POST", "PUT", "PATCH")
+    NOT_STORED = frozenset({401, 403, 429})
+
+    def __init__(
+        self, app, store: IdempotencyStore = None, prefixes=("/api/contacts",)
+    ):
+        self.app = app
+        self.store = store
+        self.prefixes = tuple(prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.METHODS
+            or not scope["path"].startswith(self.prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        authorization = headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        subject = (
+            auth_service.access_token_subject(token)
+            if idempotency_key and scheme.lower() == "bearer"
+            else None
+        )
+        if subject is None:
+            # Unauthenticated requests are rejected by the application anyway
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > 255:
+            await self.error(scope, receive, send, 400, "Idempotency-Key is too long")
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        fingerprint = hashlib.sha256(
+            b"\x00".join(
+                (
+                    scope["method"].encode(),
+                    scope["path"].encode(),
+                    scope["query_string"],
+                    body,
+                )
+            )
+        ).hexdigest()
+
+        store = self.store or idempotency_store
+        key = store.key(subject, idempotency_key)
+        record = await store.begin(key, fingerprint)
+        if record is not None:
+            if record["fingerprint"] != fingerprint:
+                await self.error(
+                    scope,
+                    receive,
+                    send,
+                    422,
+                    "Idempotency-Key was used for a different request",
+                )
+            elif record["state"] != DONE:
+                await self.error(
+                    scope,
+                    receive,
+                    send,
+                    409,
+                    "A request with this Idempotency-Key is in progress",
+                )
+            else:
+                await self.replay(record, send)
+            return
+
+        replayed = False
+
+        async def receive_body():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status, response_headers, chunks = 500, [], []
+
+        async def send_wrapper(message):
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        renewal = asyncio.create_task(store.keep_claimed(key, fingerprint))
+        try:
+            await self.app(scope, receive_body, send_wrapper)
+        except BaseException:
+            store.abort(key)
+            raise
+        finally:
+            renewal.cancel()
+        if status >= 500 or status in self.NOT_STORED:
+            store.abort(key)
+        else:
+            store.finish(key, fingerprint, status, response_headers, b"".join(chunks))
+
+    @staticmethod
+    async def replay(record: dict, send) -> None:
+        headers = [
+            (k.encode("latin-1"), v.encode("latin-1")) for k, v in record["headers"]
+        ]
+        await send(
+            {
+                "type": "http.response.start",
+                "status": record["status"],
+                "headers": [*headers, REPLAYED_HEADER],
+            }
+        )
+        await send(
+            {"type": "http.response.body", "body": base64.b64decode(record["body"])}
+        )
+
+    @staticmethod
+    async def error(scope, receive, send, status: int, detail: str) -> None:
+        await JSONResponse({"detail": detail}, status_code=status)(scope, receive, send)
+
+
+idempotency_store = IdempotencyStore(
+    lambda: resources.redis,
+    ttl=settings.idempotency_ttl,
+    lock_ttl=settings.idempotency_lock_ttl,
+    wait=settings.idempotency_wait,
+)
@@ -0,0 +1,141 @@
+import os
+import time
+
+from fastapi import Request, Response
+from fastapi_limiter import http_default_callback
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from src.database.instrumentation import current_query_stats
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+# Gauges are summed over the live workers when they run in several processes
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being processed",
+    multiprocess_mode="livesum",
+)
+DB_QUERIES = Histogram(
+    "db_queries_per_request",
+    "Number of SQL statements executed per request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds",
+    "Total time spent in SQL statements per request",
+    ["route"],
+)
+USER_CACHE = Counter(
+    "user_cache_requests_total", "Lookups in the Redis user cache", ["result"]
+)
+RATE_LIMITED = Counter(
+    "rate_limiter_rejections_total", "Requests rejected by the rate limiter", ["route"]
+)
+EMAIL_QUEUE_DEPTH = Gauge(
+    "email_queue_depth",
+    "Emails scheduled but not yet sent",
+    multiprocess_mode="livesum",
+)
+
+
+def route_template(scope) -> str:
+    """
+    The route_template function returns the path template of the matched route,
+    so that /api/contacts/1 and /api/contacts/2 end up in the same time series.
+
+    :param scope: The ASGI scope of the request
+    :return: The route path template or "unmatched"
+    """
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records latency, in-flight requests and database usage.
+    The request is observed when the last body chunk is sent, so background tasks
+    such as emails are not counted towards the latency of the route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        observed = False
+
+        def observe():
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            REQUESTS_IN_FLIGHT.dec()
+            route = route_template(scope)
+            REQUEST_LATENCY.labels(scope["method"], route, status_code).observe(
+                time.perf_counter() - start
+            )
+            stats = current_query_stats()
+            if stats is not None:
+                DB_QUERIES.labels(route).observe(stats.count)
+                DB_TIME.labels(route).observe(stats.duration)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                observe()
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            observe()
+
+
+async def rate_limit_callback(request: Request, response: Response, pexpire: int):
+    """
+    The rate_limit_callback function counts the rejection and raises the default 429 error.
+
+    :param request: Request: The rejected request
+    :param response: Response: The response of the request
+    :param pexpire: int: The remaining milliseconds of the rate limit window
+    :return: None, the default callback always raises
+    """
+    RATE_LIMITED.labels(route_template(request.scope)).inc()
+    return await http_default_callback(request, response, pexpire)
+
+
+def metrics_response() -> Response:
+    """
+    The metrics_response function renders all metrics in the Prometheus text format.
+    With PROMETHEUS_MULTIPROC_DIR set, as under the production server, the metrics
+    of all the workers are aggregated from the files they write there.
+
+    :return: A response with the exported metrics
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
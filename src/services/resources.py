@@ -0,0 +1,247 @@
+import logging
+import threading
+from functools import cached_property
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from src.conf.config import Settings, settings
+
+logger = logging.getLogger(__name__)
+
+
+class locked_cached_property(cached_property):
+    """
+    A cached_property that creates the value once even when threads, e.g. those
+    of the threadpool running the sync routes, ask for it at the same time.
+    """
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        try:
+            return instance.__dict__[self.attrname]
+        except KeyError:
+            pass
+        with instance._lock:
+            if self.attrname not in instance.__dict__:
+                instance.__dict__[self.attrname] = self.func(instance)
+            return instance.__dict__[self.attrname]
+
+
+class Resources:
+    """
+    The clients shared by the requests and the background work of a worker: the
+    databases, Redis, the mail sender and the avatar storage.
+
+    Every client is created on first use, so importing the application opens
+    nothing and each worker started by the server builds its own pools. The
+    application lifespan opens them ahead of the first requests and closes them
+    on shutdown. A client is replaced by setting its attribute, e.g. in tests
+    ``monkeypatch.setattr(resources, "redis", fakeredis.FakeRedis())``.
+    """
+
+    CLIENTS = (
+        "engine",
+        "replica_engines",
+        "shard_engines",
+        "redis",
+        "limiter_redis",
+        "mail",
+        "storage",
+    )
+
+    def __init__(self, config: Settings):
+        self.config = config
+        # Reentrant, creating the shard engines creates the primary engine
+        self._lock = threading.RLock()
+
+    def _pool_options(self, url: str) -> dict:
+        if url.startswith("sqlite"):
+            return {}
+        return {
+            "pool_size": self.config.db_pool_size,
+            "max_overflow": self.config.db_max_overflow,
+            "pool_recycle": self.config.db_pool_recycle,
+        }
+
+    @locked_cached_property
+    def engine(self) -> Engine:
+        url = self.config.sqlalchemy_database_url
+        return create_engine(url, echo=self.config.db_echo, **self._pool_options(url))
+
+    @locked_cached_property
+    def replica_engines(self) -> list[Engine]:
+        return [
+            create_engine(url, pool_pre_ping=True, **self._pool_options(url))
+            for url in self.config.sqlalchemy_replica_urls
+        ]
+
+    @locked_cached_property
+    def shard_engines(self) -> list[Engine]:
+        # Shard 0 is the primary database, its replicas are not used for other shards
+        return [
+            self.engine,
+            *(
+                create_engine(url, pool_pre_ping=True, **self._pool_options(url))
+                for url in self.config.sqlalchemy_shard_urls
+            ),
+        ]
+
+    @locked_cached_property
+    def redis(self):
+        import redis
+
+        return redis.Redis(
+            host=self.config.redis_host, port=self.config.redis_port, db=0
+        )
+
+    @locked_cached_property
+    def limiter_redis(self):
+        # The rate limiter is the only asyncio client, its pool cannot be shared
+        import redis.asyncio
+
+        return redis.asyncio.Redis(
+            host=self.config.redis_host,
+            port=self.config.redis_port,
+            db=0,
+            encoding="utf-8",
+            decode_responses=True,
+        )
+
+    @locked_cached_property
+    def mail(self):
+        from pathlib import Path
+
+        from fastapi_mail import ConnectionConfig, FastMail
+
+        return FastMail(
+            ConnectionConfig(
+                MAIL_USERNAME=self.config.mail_username,
+                MAIL_PASSWORD=self.config.mail_password,
+                MAIL_FROM=self.config.mail_from,
+                MAIL_PORT=self.config.mail_port,
+                MAIL_SERVER=self.config.mail_server,
+                MAIL_FROM_NAME="Test Corp",
+                MAIL_STARTTLS=False,
+                MAIL_SSL_TLS=True,
+                USE_CREDENTIALS=True,
+                VALIDATE_CERTS=True,
+                TEMPLATE_FOLDER=Path(__file__).parent / "templates",
+            )
+        )
+
+    @locked_cached_property
+    def storage(self):
+        import cloudinary
+        import cloudinary.uploader
+
+        cloudinary.config(
+            cloud_name=self.config.cloudinary_name,
+            api_key=self.config.cloudinary_api_key,
+            api_secret=self.config.cloudinary_api_secret,
+            secure=True,
+        )
+        return cloudinary
+
+    def warm_pools(self, connections: int) -> None:
+        """
+        The warm_pools function opens connections to Redis and to every database
+        ahead of the first requests, so that they do not wait for the connection
+        setup. Servers that cannot be reached are logged and left to connect on
+        demand.
+
+        :param self: Represent the instance of the class
+        :param connections: int: The number of connections to open per engine
+        :return: None
+        """
+        try:
+            self.redis.ping()
+        except Exception as e:
+            logger.warning("warming up redis failed: %s", e)
+        for engine in (*self.shard_engines, *self.replica_engines):
+            opened = []
+            try:
+                for _ in range(connections):
+                    connection = engine.connect()
+                    opened.append(connection)
+                    connection.exec_driver_sql("SELECT 1")
+            except Exception as e:
+                logger.warning("warming up %s failed: %s", engine.url, e)
+            finally:
+                # Closed connections go back to the pool and stay open
+                for connection in opened:
+                    connection.close()
+
+    async def open(self) -> None:
+        """
+        The open function connects the clients used by the first requests.
+        Like warm_pools, it logs the servers that cannot be reached instead of
+        failing, so that the worker starts without Redis.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        try:
+            await self.limiter_redis.ping()
+        except Exception as e:
+            logger.warning("connecting the rate limiter to redis failed: %s", e)
+        await run_in_threadpool(self.warm_pools, self.config.db_pool_warmup)
+
+    async def close(self) -> None:
+        """
+        The close function closes the clients that were created, the next use
+        creates them again.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        with self._lock:
+            created = {
+                name: self.__dict__.pop(name)
+                for name in self.CLIENTS
+                if name in self.__dict__
+            }
+        if "limiter_redis" in created:
+            await created["limiter_redis"].close()
+        if "redis" in created:
+            created["redis"].connection_pool.disconnect()
+        engines = {
+            *created.get("shard_engines", ()),
+            *created.get("replica_engines", ()),
+        }
+        if "engine" in created:
+            engines.add(created["engine"])
+        for engine in engines:
+            engine.dispose()
+
+
+resources = Resources(settings)
+
+
+def get_redis():
+    """
+    The get_redis function is a dependency that returns the shared Redis client.
+
+    :return: A Redis client
+    """
+    return resources.redis
+
+
+def get_mail():
+    """
+    The get_mail function is a dependency that returns the shared mail sender.
+
+    :return: A FastMail instance
+    """
+    return resources.mail
+
+
+def get_storage():
+    """
+    The get_storage function is a dependency that returns the configured avatar storage.
+
+    :return: The cloudinary module
+    """
+    return resources.storage
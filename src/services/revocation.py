@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """
+    Revoked access tokens, mirrored from Redis into every worker.
+
+    A token is revoked by its id (jti), by the session it belongs to (sid), or
+    by a per-user "issued before" timestamp that invalidates every token of the
+    user at once. Checking a token only reads local dicts; changes reach the
+    other workers through Redis pub/sub, and a periodic full sync repairs
+    anything missed while the subscription was down.
+
+    Revocation times and the iat of the tokens have sub-second precision, so a
+    token issued right after a revocation stays valid. Per-user revocations are
+    forgotten once they are older than max_token_age, the longest lifetime of an
+    access token, since every token they invalidate has expired by then.
+    """
+
+    IDS_KEY = "revoked:ids"
+    USERS_KEY = "revoked:before"
+    CHANNEL = "revocations"
+
+    def __init__(
+        self, redis_getter, sync_interval: float = 60.0, max_token_age: float = 3600
+    ):
+        self._redis_getter = redis_getter
+        self.sync_interval = sync_interval
+        self.max_token_age = max_token_age
+        self._ids: dict[str, float] = {}
+        self._not_before: dict[str, float] = {}
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def r(self):
+        return self._redis_getter()
+
+    def is_revoked(self, payload: dict) -> bool:
+        """
+        The is_revoked function checks the claims of an access token without any I/O.
+
+        :param self: Represent the instance of the class
+        :param payload: dict: The claims of the token
+        :return: True if the token must be rejected
+        """
+        if payload.get("jti") in self._ids or payload.get("sid") in self._ids:
+            return True
+        not_before = self._not_before.get(payload.get("sub"))
+        return not_before is not None and payload.get("iat", 0) < not_before
+
+    def revoke(self, token_id: str, expires: float) -> None:
+        """
+        The revoke function revokes a token or session id until it expires.
+
+        :param self: Represent the instance of the class
+        :param token_id: str: The jti of a token or the sid of a session
+        :param expires: float: The timestamp after which the id can be forgotten
+        :return: None
+        """
+        self._ids[token_id] = expires
+        pipe = self.r.pipeline()
+        pipe.zadd(self.IDS_KEY, {token_id: expires})
+        pipe.publish(self.CHANNEL, f"id:{expires}:{token_id}")
+        pipe.execute()
+
+    def revoke_user(self, email: str) -> None:
+        """
+        The revoke_user function revokes every token issued to a user until now.
+
+        :param self: Represent the instance of the class
+        :param email: str: The user whose tokens are revoked
+        :return: None
+        """
+        not_before = time.time()
+        self._not_before[email] = not_before
+        pipe = self.r.pipeline()
+        pipe.hset(self.USERS_KEY, email, not_before)
+        pipe.publish(self.CHANNEL, f"user:{not_before}:{email}")
+        pipe.execute()
+
+    def apply(self, message: str) -> None:
+        """
+        The apply function applies a revocation published by another worker.
+
+        :param self: Represent the instance of the class
+        :param message: str: The pub/sub message
+        :return: None
+        """
+        kind, value, key = message.split(":", 2)
+        if kind == "id":
+            self._ids[key] = float(value)
+        elif kind == "user":
+            self._not_before[key] = max(float(value), self._not_before.get(key, 0))
+
+    def sync(self) -> None:
+        """
+        The sync function replaces the local state with a snapshot from Redis
+        and drops the revocations whose tokens have expired.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        now = time.time()
+        pipe = self.r.pipeline()
+        pipe.zremrangebyscore(self.IDS_KEY, "-inf", now)
+        pipe.zrange(self.IDS_KEY, 0, -1, withscores=True)
+        pipe.hgetall(self.USERS_KEY)
+        _, ids, users = pipe.execute()
+        self._ids = {token_id.decode(): expires for token_id, expires in ids}
+        users = {email.decode(): float(value) for email, value in users.items()}
+        expired = [
+            email
+            for email, not_before in users.items()
+            if not_before < now - self.max_token_age
+        ]
+        self._not_before = {
+            email: not_before
+            for email, not_before in users.items()
+            if email not in expired
+        }
+        if expired:
+            self._forget_users(expired, users)
+
+    def _forget_users(self, emails: list[str], seen: dict[str, float]) -> None:
+        # Only delete the entries that were not revoked again since the snapshot
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(self.USERS_KEY)
+                current = pipe.hmget(self.USERS_KEY, emails)
+                stale = [
+                    email
+                    for email, value in zip(emails, current)
+                    if value is not None and float(value) == seen[email]
+                ]
+                pipe.multi()
+                if stale:
+                    pipe.hdel(self.USERS_KEY, *stale)
+                pipe.execute()
+            except redis.WatchError:
+                # Revoked meanwhile, the next sync tries again
+                pass
+
+    def _listen(self) -> None:
+        while not self._stopped.is_set():
+            pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.CHANNEL)
+                self.sync()
+                next_sync = time.monotonic() + self.sync_interval
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.apply(message["data"].decode())
+                    if time.monotonic() >= next_sync:
+                        self.sync()
+                        next_sync = time.monotonic() + self.sync_interval
+            except Exception as e:
+                logger.warning("revocation listener failed: %s", e)
+                self._stopped.wait(1.0)
+            finally:
+                pubsub.close()
+
+    def start(self) -> None:
+        """
+        The start function starts the background thread that keeps the list in sync.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._listen, name="revocation-listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        The stop function stops the background thread.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
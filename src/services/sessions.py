@@ -0,0 +1,153 @@
+import time
+import uuid
+
+from src.services.resources import resources
+
+
+class RefreshTokenStore:
+    """
+    Refresh-token sessions kept in Redis instead of the users table.
+
+    Every login starts a token family (one per device). A refresh rotates the
+    family to a new token id; presenting an already rotated token again is
+    treated as theft and revokes the whole family. Keys expire together with
+    the refresh token, so nothing has to be cleaned up.
+    """
+
+    @property
+    def r(self):
+        return resources.redis
+
+    @staticmethod
+    def family_key(sid: str) -> str:
+        return f"rt:family:{sid}"
+
+    @staticmethod
+    def user_key(email: str) -> str:
+        return f"rt:user:{email}"
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def start(self, email: str, sid: str, jti: str, exp: int, device: str = "") -> None:
+        """
+        The start function stores a new token family for a login.
+
+        :param self: Represent the instance of the class
+        :param email: str: The owner of the session
+        :param sid: str: The id of the token family
+        :param jti: str: The id of the first refresh token of the family
+        :param exp: int: The expiration timestamp of the refresh token
+        :param device: str: A description of the device, e.g. its user agent
+        :return: None
+        """
+        ttl = max(int(exp - time.time()), 1)
+        pipe = self.r.pipeline()
+        pipe.hset(
+            self.family_key(sid),
+            mapping={
+                "email": email,
+                "jti": jti,
+                "device": device[:255],
+                "created_at": int(time.time()),
+            },
+        )
+        pipe.expire(self.family_key(sid), ttl)
+        pipe.sadd(self.user_key(email), sid)
+        pipe.expire(self.user_key(email), ttl, gt=True)
+        pipe.expire(self.user_key(email), ttl, nx=True)
+        pipe.execute()
+
+    def rotate(self, email: str, sid: str, jti: str, new_jti: str, exp: int) -> bool:
+        """
+        The rotate function replaces the current refresh token of a family.
+        If the presented token is not the current one, the token was reused and
+        the family is revoked.
+
+        :param self: Represent the instance of the class
+        :param email: str: The owner of the session
+        :param sid: str: The id of the token family
+        :param jti: str: The id of the presented refresh token
+        :param new_jti: str: The id of the refresh token that replaces it
+        :param exp: int: The expiration timestamp of the new refresh token
+        :return: True if the token was rotated, False if it is unknown or reused
+        """
+        key = self.family_key(sid)
+        ttl = max(int(exp - time.time()), 1)
+
+        def rotate_family(pipe):
+            family = pipe.hgetall(key)
+            if not family or family[b"email"].decode() != email:
+                return False
+            pipe.multi()
+            if family[b"jti"].decode() != jti:
+                pipe.delete(key)
+                pipe.srem(self.user_key(email), sid)
+                return False
+            pipe.hset(key, "jti", new_jti)
+            pipe.expire(key, ttl)
+            pipe.expire(self.user_key(email), ttl, gt=True)
+            return True
+
+        return self.r.transaction(rotate_family, key, value_from_callable=True)
+
+    def sessions(self, email: str) -> list[dict]:
+        """
+        The sessions function lists the active sessions of a user.
+
+        :param self: Represent the instance of the class
+        :param email: str: The owner of the sessions
+        :return: A list of dicts with the id, device and creation time of every session
+        """
+        sids = [sid.decode() for sid in self.r.smembers(self.user_key(email))]
+        pipe = self.r.pipeline()
+        for sid in sids:
+            pipe.hgetall(self.family_key(sid))
+        result, expired = [], []
+        for sid, family in zip(sids, pipe.execute()):
+            if not family:
+                expired.append(sid)
+                continue
+            result.append(
+                {
+                    "sid": sid,
+                    "device": family[b"device"].decode(),
+                    "created_at": int(family[b"created_at"]),
+                }
+            )
+        if expired:
+            self.r.srem(self.user_key(email), *expired)
+        return result
+
+    def revoke(self, email: str, sid: str) -> bool:
+        """
+        The revoke function ends one session of a user.
+
+        :param self: Represent the instance of the class
+        :param email: str: The owner of the session
+        :param sid: str: The id of the token family
+        :return: True if the session existed
+        """
+        if not self.r.srem(self.user_key(email), sid):
+            return False
+        self.r.delete(self.family_key(sid))
+        return True
+
+    def revoke_all(self, email: str) -> None:
+        """
+        The revoke_all function ends every session of a user.
+
+        :param self: Represent the instance of the class
+        :param email: str: The owner of the sessions
+        :return: None
+        """
+        sids = self.r.smembers(self.user_key(email))
+        pipe = self.r.pipeline()
+        for sid in sids:
+            pipe.delete(self.family_key(sid.decode()))
+        pipe.delete(self.user_key(email))
+        pipe.execute()
+
+
+token_store = RefreshTokenStore()
@@ -0,0 +1,180 @@
+from collections import Counter
+from datetime import date
+
+import redis
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import owner_key, use_shard
+from src.database.models import User
+from src.repository import contacts as repository_contacts
+from src.repository.contacts import birthday_keys
+from src.services.resources import resources
+
+
+class ContactStats:
+    """
+    Contact counters of every owner in a Redis hash: the number of contacts and
+    the number of birthdays on every day of the year, so that totals and upcoming
+    birthdays are read without scanning the contacts.
+
+    Commits add their changes to the counters, the hash is built from the database
+    when missing and expires ttl seconds after it was built whatever the writes.
+    Every commit also bumps a version of the owner, and a build is only stored
+    if no commit was applied since it started reading, so a write committing
+    during a build is not lost. The expiry reconciles any remaining drift, e.g.
+    a commit counted by a build whose changes are applied right after it.
+    """
+
+    BUILT = "built"
+    TOTAL = "total"
+
+    def __init__(self, redis_getter, ttl: int = 86400):
+        self._redis_getter = redis_getter
+        self.ttl = ttl
+
+    @property
+    def r(self):
+        return self._redis_getter()
+
+    @staticmethod
+    def key(owner: str) -> str:
+        return f"stats:{owner}"
+
+    @staticmethod
+    def version_key(owner: str) -> str:
+        return f"stats:{owner}:version"
+
+    @staticmethod
+    def day(month: int, day: int) -> str:
+        return f"d:{int(month) * 100 + int(day)}"
+
+    def apply(self, deltas: dict[str, Counter]) -> None:
+        """
+        The apply function adds committed changes to the counters that are built.
+
+        :param self: Represent the instance of the class
+        :param deltas: dict[str, Counter]: The changes of every counter of every owner
+        :return: None
+        """
+        pipe = self.r.pipeline()
+        owners = list(deltas)
+        for owner in owners:
+            pipe.hexists(self.key(owner), self.BUILT)
+            for field, value in deltas[owner].items():
+                if value:
+                    pipe.hincrby(self.key(owner), field, value)
+            # A build that read the database before this commit is not stored
+            pipe.incr(self.version_key(owner))
+            pipe.expire(self.version_key(owner), self.ttl)
+        results = iter(pipe.execute())
+        stale = []
+        for owner in owners:
+            if not next(results):
+                stale.append(self.key(owner))
+            # The replies of hincrby, incr and expire
+            replies = sum(1 for value in deltas[owner].values() if value) + 2
+            for _ in range(replies):
+                next(results)
+        # Counters of an owner without a built hash would be partial, the next
+        # read builds them from the database instead
+        if stale:
+            self.r.delete(*stale)
+
+    def version(self, owner: str) -> int:
+        """
+        The version function returns the number of commits applied to the
+        counters of an owner, read before building them.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the contacts
+        :return: The version
+        """
+        return int(self.r.get(self.version_key(owner)) or 0)
+
+    def build(self, owner: str, days: list[tuple], version: int | None = None) -> dict:
+        """
+        The build function replaces the counters of an owner. With a version,
+        the counters are only stored if no commit was applied since it was read.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the contacts
+        :param days: list[tuple]: The month, day and number of birthdays of every day
+        :param version: int | None: The version read before the days
+        :return: The counters
+        """
+        counters = {self.day(month, day): count for month, day, count in days}
+        counters[self.TOTAL] = sum(count for _, _, count in days)
+        counters[self.BUILT] = 1
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(self.version_key(owner))
+                if version is not None and version != int(
+                    pipe.get(self.version_key(owner)) or 0
+                ):
+                    return counters
+                pipe.multi()
+                pipe.delete(self.key(owner))
+                pipe.hset(self.key(owner), mapping=counters)
+                pipe.expire(self.key(owner), self.ttl)
+                pipe.execute()
+            except redis.WatchError:
+                # A commit was applied meanwhile, the next read builds again
+                pass
+        return counters
+
+    def get(self, owner: str) -> dict | None:
+        """
+        The get function returns the counters of an owner.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the contacts
+        :return: The counters, or None if they have to be built first
+        """
+        counters = self.r.hgetall(self.key(owner))
+        if self.BUILT.encode() not in counters:
+            return None
+        return {k.decode(): int(v) for k, v in counters.items()}
+
+    @staticmethod
+    def summary(counters: dict, today: date, days: int) -> dict:
+        """
+        The summary function computes the stats of an owner from the counters.
+
+        :param counters: dict: The counters
+        :param today: date: The first day of the upcoming birthdays
+        :param days: int: The number of days after today
+        :return: The number of contacts, of upcoming birthdays and of birthdays per month
+        """
+        months = [0] * 12
+        for field, value in counters.items():
+            if field.startswith("d:"):
+                months[int(field[2:]) // 100 - 1] += value
+        return {
+            "contacts": counters.get(ContactStats.TOTAL, 0),
+            "upcoming_birthdays": sum(
+                counters.get(f"d:{key}", 0) for key in birthday_keys(today, days)
+            ),
+            "birthdays_by_month": months,
+        }
+
+
+contact_stats = ContactStats(lambda: resources.redis, ttl=settings.stats_ttl)
+
+
+async def get_counters(user: User, db: Session) -> dict:
+    """
+    The get_counters function returns the contact counters of a user, building
+    them from the database if they are missing.
+
+    :param user: User: The user
+    :param db: Session: Pass the database session to the repository layer
+    :return: The counters
+    """
+    owner = owner_key(use_shard(db, user.email), user.id)
+    counters = contact_stats.get(owner)
+    if counters is None:
+        version = contact_stats.version(owner)
+        rows = await repository_contacts.get_birthday_counts(user, db)
+        counters = contact_stats.build(owner, rows, version)
+    return counters
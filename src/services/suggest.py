@@ -0,0 +1,220 @@
+import json
+
+import redis
+
+from src.conf.config import settings
+from src.services.resources import resources
+
+SEPARATOR = "\x00"
+
+
+class SuggestIndex:
+    """
+    A prefix index of contact names for typeahead, one Redis sorted set per owner.
+
+    Every contact is stored under its first name, last name, full name and email
+    as members "<term>\\0<id>\\0<json>" with the same score, so a prefix query is a
+    single ZRANGEBYLEX that already carries what the client displays. A hash
+    remembers the members of each contact so that writes can replace them.
+    The index is built from the database on first use and expires ttl seconds
+    after it was built whatever the reads and writes, which bounds the drift
+    left by a failed update. Every commit also bumps a version of the owner,
+    and a build is only stored if no commit was applied since it started
+    reading, so a write committing during a build is not lost.
+    """
+
+    def __init__(self, redis_getter, ttl: int = 7 * 86400):
+        self._redis_getter = redis_getter
+        self.ttl = ttl
+
+    @property
+    def r(self):
+        return self._redis_getter()
+
+    @staticmethod
+    def keys(owner: str) -> tuple[str, str, str]:
+        return f"suggest:{owner}", f"suggest:{owner}:members", f"suggest:{owner}:ready"
+
+    @staticmethod
+    def version_key(owner: str) -> str:
+        return f"suggest:{owner}:version"
+
+    @staticmethod
+    def members(contact_id: int, firstname: str, lastname: str, email: str) -> list:
+        """
+        The members function returns the sorted set members of a contact.
+
+        :param contact_id: int: The id of the contact
+        :param firstname: str: The first name
+        :param lastname: str: The last name
+        :param email: str: The email
+        :return: A list of members
+        """
+        display = json.dumps(
+            {
+                "id": contact_id,
+                "firstname": firstname,
+                "lastname": lastname,
+                "email": email,
+            }
+        )
+        terms = {firstname, lastname, f"{firstname} {lastname}", email or ""}
+        return [
+            f"{term.casefold()}{SEPARATOR}{contact_id}{SEPARATOR}{display}"
+            for term in terms
+            if term
+        ]
+
+    def _replace(self, pipe, owner: str, contact_id: int, members: list, old) -> None:
+        index, stored, _ = self.keys(owner)
+        if old:
+            pipe.zrem(index, *json.loads(old))
+        if members:
+            pipe.zadd(index, dict.fromkeys(members, 0))
+            pipe.hset(stored, contact_id, json.dumps(members))
+        else:
+            pipe.hdel(stored, contact_id)
+
+    @staticmethod
+    def _displays(members, limit: int) -> list[dict]:
+        result = {}
+        for member in members:
+            _, contact_id, display = member.split(SEPARATOR, 2)
+            result.setdefault(contact_id, display)
+        return [json.loads(display) for display in list(result.values())[:limit]]
+
+    def apply(self, changes: list[tuple]) -> None:
+        """
+        The apply function updates the index with committed contact changes.
+        Owners whose index is not built are skipped, the first suggestion
+        builds it from the database.
+
+        :param self: Represent the instance of the class
+        :param changes: list[tuple]: The owner, the kind of change, the contact id
+            and the (firstname, lastname, email) of the contact, None if deleted
+        :return: None
+        """
+        owners = list({change[0] for change in changes})
+        pipe = self.r.pipeline()
+        for owner in owners:
+            pipe.exists(self.keys(owner)[2])
+            # A build that read the database before this commit is not stored
+            pipe.incr(self.version_key(owner))
+            pipe.expire(self.version_key(owner), self.ttl)
+        for owner, _, contact_id, _ in changes:
+            pipe.hget(self.keys(owner)[1], contact_id)
+        results = pipe.execute()
+        built = {owner for owner, ready in zip(owners, results[::3]) if ready}
+        if not built:
+            return
+        pipe = self.r.pipeline()
+        for (owner, _, contact_id, names), previous in zip(
+            changes, results[len(owners) * 3 :]
+        ):
+            if owner not in built:
+                continue
+            members = self.members(contact_id, *names) if names else []
+            self._replace(pipe, owner, contact_id, members, previous)
+        for owner in built:
+            # Keys emptied by the changes are created again without an expiry
+            for key in self.keys(owner)[:2]:
+                pipe.expire(key, self.ttl, nx=True)
+        pipe.execute()
+
+    def version(self, owner: str) -> int:
+        """
+        The version function returns the number of commits applied to the
+        index of an owner, read before building it.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the contacts
+        :return: The version
+        """
+        return int(self.r.get(self.version_key(owner)) or 0)
+
+    def build(
+        self, owner: str, contacts: list[tuple], version: int | None = None
+    ) -> bool:
+        """
+        The build function replaces the index of an owner with the given contacts.
+        With a version, the index is only stored if no commit was applied since
+        it was read.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the contacts
+        :param contacts: list[tuple]: The id, firstname, lastname and email of every contact
+        :param version: int | None: The version read before the contacts
+        :return: Whether the index was stored
+        """
+        index, stored, ready = self.keys(owner)
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(self.version_key(owner))
+                if version is not None and version != int(
+                    pipe.get(self.version_key(owner)) or 0
+                ):
+                    return False
+                pipe.multi()
+                pipe.delete(index, stored)
+                for start in range(0, len(contacts), 1000):
+                    batch = {
+                        c[0]: self.members(*c) for c in contacts[start : start + 1000]
+                    }
+                    pipe.zadd(
+                        index, {m: 0 for members in batch.values() for m in members}
+                    )
+                    pipe.hset(
+                        stored, mapping={i: json.dumps(m) for i, m in batch.items()}
+                    )
+                pipe.set(ready, 1)
+                for key in (index, stored, ready):
+                    pipe.expire(key, self.ttl)
+                pipe.execute()
+            except redis.WatchError:
+                # A commit was applied meanwhile, the next suggestion builds again
+                return False
+        return True
+
+    def suggest(self, owner: str, prefix: str, limit: int) -> list[dict] | None:
+        """
+        The suggest function returns the contacts with a name or email starting with prefix.
+
+        :param self: Represent the instance of the class
+        :param owner: str: The owner of the contacts
+        :param prefix: str: The typed prefix, case-insensitive
+        :param limit: int: The maximum number of contacts
+        :return: A list of contacts, or None if the index has to be built first
+        """
+        index, _, ready = self.keys(owner)
+        start = prefix.casefold().encode()
+        pipe = self.r.pipeline()
+        pipe.exists(ready)
+        # A contact matches with up to four terms
+        pipe.zrangebylex(index, b"[" + start, b"[" + start + b"\xff", 0, limit * 4)
+        exists, members = pipe.execute()
+        if not exists:
+            return None
+        return self._displays((member.decode() for member in members), limit)
+
+    def search(self, contacts: list[tuple], prefix: str, limit: int) -> list[dict]:
+        """
+        The search function answers a suggestion from the given contacts, in the
+        order of the index, for a build that could not be stored.
+
+        :param self: Represent the instance of the class
+        :param contacts: list[tuple]: The id, firstname, lastname and email of every contact
+        :param prefix: str: The typed prefix, case-insensitive
+        :param limit: int: The maximum number of contacts
+        :return: A list of contacts
+        """
+        start = prefix.casefold()
+        members = sorted(
+            member
+            for contact in contacts
+            for member in self.members(*contact)
+            if member.startswith(start)
+        )
+        return self._displays(members, limit)
+
+
+suggest_index = SuggestIndex(lambda: resources.redis, ttl=settings.suggest_index_ttl)
@@ -0,0 +1,46 @@
+import base64
+import json
+import time
+from datetime import datetime
+
+Cursor = tuple[datetime, int] | None
+
+
+def encode_token(user_id: int, changed: Cursor, deleted: Cursor) -> str:
+    """
+    The encode_token function packs the positions of a client in the contacts and
+    the tombstones into an opaque sync token.
+
+    :param user_id: int: The id of the user, which changes when the user is resharded
+    :param changed: Cursor: The (updated_at, id) of the last contact sent
+    :param deleted: Cursor: The (deleted_at, id) of the last tombstone sent
+    :return: The sync token
+    """
+    payload = {
+        "at": int(time.time()),
+        "u": user_id,
+        "c": changed and [changed[0].isoformat(), changed[1]],
+        "d": deleted and [deleted[0].isoformat(), deleted[1]],
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_token(token: str) -> tuple[int, int, Cursor, Cursor]:
+    """
+    The decode_token function unpacks a sync token made by encode_token.
+
+    :param token: str: The sync token
+    :return: The time the token was issued, the user id, the contacts cursor
+        and the tombstones cursor
+    :raises ValueError: If the token is malformed
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        cursors = [
+            payload[key]
+            and (datetime.fromisoformat(payload[key][0]), int(payload[key][1]))
+            for key in ("c", "d")
+        ]
+        return int(payload["at"]), int(payload["u"]), *cursors
+    except (KeyError, IndexError, TypeError, ValueError) as err:
+        raise ValueError("Invalid sync token") from err
@@ -0,0 +1,165 @@
+import ipaddress
+from functools import lru_cache
+
+from fastapi import HTTPException, Request, status
+
+from src.services.resources import resources
+from src.conf.config import settings
+
+
+@lru_cache
+def _trusted_networks(proxies: tuple[str, ...]) -> tuple:
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    networks = _trusted_networks(tuple(settings.trusted_proxies))
+    return any(ip in network for network in networks)
+
+
+def client_ip(request: Request) -> str:
+    """
+    The client_ip function returns the address of the client.
+    X-Forwarded-For is only read when the peer is one of the trusted proxies, and
+    the addresses appended by trusted proxies are skipped from the right, so a
+    client cannot choose its own address.
+
+    :param request: Request: The request
+    :return: The nearest untrusted address
+    """
+    ip = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("X-Forwarded-For")
+    if not forwarded or not _is_trusted(ip):
+        return ip
+    for address in reversed(forwarded.split(",")):
+        ip = address.strip()
+        if not _is_trusted(ip):
+            break
+    return ip
+
+
+async def rate_limit_identifier(request: Request) -> str:
+    """
+    The rate_limit_identifier function keys the rate limiter on the client
+    address of client_ip instead of the first X-Forwarded-For address.
+
+    :param request: Request: The request
+    :return: The address and the path of the request
+    """
+    return client_ip(request) + ":" + request.scope["path"]
+
+
+class AuthThrottle:
+    """
+    Cheap Redis checks that run before any database or bcrypt work in the auth routes.
+
+    Failed attempts are counted per account and per IP address in a fixed
+    window. Accounts are keyed on the exact email used for the lookup, which is
+    case-sensitive; once a counter reaches its limit the requests are rejected with 429
+    right away. Emails that are known not to exist are remembered for a short
+    time, so repeated attempts with them do not reach the users table.
+    """
+
+    @property
+    def r(self):
+        return resources.redis
+
+    @staticmethod
+    def account_key(email: str) -> str:
+        return f"auth:fail:account:{email}"
+
+    @staticmethod
+    def ip_key(ip: str) -> str:
+        return f"auth:fail:ip:{ip}"
+
+    @staticmethod
+    def unknown_key(email: str) -> str:
+        return f"auth:unknown:{email}"
+
+    def check(self, ip: str, email: str | None = None) -> None:
+        """
+        The check function rejects the request if the account or the IP address
+        has too many recent failures.
+
+        :param self: Represent the instance of the class
+        :param ip: str: The address of the client
+        :param email: str | None: The account the request is for
+        :return: None
+        """
+        keys = [self.ip_key(ip)]
+        limits = [settings.auth_max_failures_per_ip]
+        if email is not None:
+            keys.append(self.account_key(email))
+            limits.append(settings.auth_max_failures_per_account)
+        for key, count, limit in zip(keys, self.r.mget(keys), limits):
+            if count is not None and int(count) >= limit:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many failed attempts",
+                    headers={"Retry-After": str(max(self.r.ttl(key), 1))},
+                )
+
+    def failure(self, ip: str, email: str | None = None) -> None:
+        """
+        The failure function counts a failed attempt.
+
+        :param self: Represent the instance of the class
+        :param ip: str: The address of the client
+        :param email: str | None: The account the request was for
+        :return: None
+        """
+        pipe = self.r.pipeline()
+        keys = [self.ip_key(ip)]
+        if email is not None:
+            keys.append(self.account_key(email))
+        for key in keys:
+            pipe.incr(key)
+            pipe.expire(key, settings.auth_failure_window, nx=True)
+        pipe.execute()
+
+    def success(self, email: str) -> None:
+        """
+        The success function resets the failures of an account after a successful login.
+
+        :param self: Represent the instance of the class
+        :param email: str: The account
+        :return: None
+        """
+        self.r.delete(self.account_key(email))
+
+    def is_unknown(self, email: str) -> bool:
+        """
+        The is_unknown function tells whether the email was recently looked up and not found.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email
+        :return: True if the email is known not to exist
+        """
+        return bool(self.r.exists(self.unknown_key(email)))
+
+    def remember_unknown(self, email: str) -> None:
+        """
+        The remember_unknown function caches that no user has the email.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email
+        :return: None
+        """
+        self.r.set(self.unknown_key(email), 1, ex=settings.auth_negative_cache_ttl)
+
+    def forget_unknown(self, email: str) -> None:
+        """
+        The forget_unknown function drops the negative cache entry when the user is created.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email
+        :return: None
+        """
+        self.r.delete(self.unknown_key(email))
+
+
+auth_throttle = AuthThrottle()
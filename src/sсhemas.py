@@ -1,5 +1,14 @@
 from datetime import date, datetime
-from pydantic import BaseModel, EmailStr, Field
+from typing import Annotated
+
+from pydantic import BaseModel, EmailStr, Field, StringConstraints
+
+TagName = Annotated[
+    str,
+    StringConstraints(
+        strip_whitespace=True, to_lower=True, min_length=1, max_length=50
+    ),
+]
 
 
 class ContactBase(BaseModel):
@@ -20,12 +29,74 @@ class ContactResponse(BaseModel):
     lastname: str
     email: EmailStr
     phone: str
+    phone_normalized: str | None = None
     birthday: date
+    tags: list[str] = []
 
     class Config:
         orm_mode = True
 
 
+class ContactChanges(BaseModel):
+    changed: list[ContactResponse]
+    deleted: list[int]
+    next: str
+    more: bool
+
+
+class SuggestResponse(BaseModel):
+    id: int
+    firstname: str
+    lastname: str
+    email: str | None = None
+
+
+class DuplicateResponse(BaseModel):
+    first_id: int
+    second_id: int
+    score: float
+    reasons: list[str]
+
+
+class MergeRequest(BaseModel):
+    keep_id: int = Field(ge=1)
+    merge_ids: list[int] = Field(min_length=1, max_length=100)
+
+
+class TagRequest(BaseModel):
+    contact_ids: list[int] = Field(min_length=1, max_length=1000)
+    tags: list[TagName] = Field(min_length=1, max_length=20)
+
+
+class TagResponse(BaseModel):
+    name: str
+    contacts: int
+
+
+class BatchRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=1000)
+
+
+class BatchResponse(BaseModel):
+    contacts: list[ContactResponse]
+    missing: list[int]
+
+
+class ImportRequest(BaseModel):
+    contacts: list[ContactCreate] = Field(min_length=1, max_length=1000)
+
+
+class ImportResponse(BaseModel):
+    created: list[int]
+    skipped: list[str]
+
+
+class StatsResponse(BaseModel):
+    contacts: int
+    upcoming_birthdays: int
+    birthdays_by_month: list[int]
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=5, max_length=16)
     email: str
@@ -54,5 +125,11 @@ class TokenModel(BaseModel):
     token_type: str = "bearer"
 
 
+class SessionResponse(BaseModel):
+    sid: str
+    device: str
+    created_at: int
+
+
 class RequestEmail(BaseModel):
     email: EmailStr
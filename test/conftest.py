@@ -1,11 +1,16 @@
+import fakeredis
 import pytest
 from fastapi.testclient import TestClient
+from fastapi_limiter.depends import RateLimiter
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from main import app
-from src.database.models import Base
+from src.database.models import Base, User
 from src.database.db import get_db
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.resources import resources
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
@@ -14,6 +19,24 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Fail any route that executes more statements than this to catch N+1 regressions
+settings.db_query_budget = 6
+settings.db_query_budget_strict = True
+# Merging moves the tags of the duplicates before deleting them
+settings.db_query_budgets["/api/contacts/merge"] = 7
+# Changes are synced in the same second they are written
+settings.sync_safety_lag = 0
+
+
+@pytest.fixture(scope="module", autouse=True)
+def fake_redis():
+    # Redis is replaced by an in-memory server for every test module
+
+    with pytest.MonkeyPatch.context() as mp:
+        r = fakeredis.FakeRedis()
+        mp.setattr(resources, "redis", r)
+        yield r
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -51,3 +74,42 @@ def user():
         "email": "test@example.com",
         "password": "1234567890",
     }
+
+
+@pytest.fixture(scope="module")
+def no_rate_limit():
+    # FastAPILimiter.init runs on startup, which the test client does not trigger
+
+    async def allow():
+        return None
+
+    limiters = [
+        dependency.dependency
+        for route in app.routes
+        for dependency in getattr(route, "dependencies", [])
+        if isinstance(dependency.dependency, RateLimiter)
+    ]
+    for limiter in limiters:
+        app.dependency_overrides[limiter] = allow
+    yield
+    for limiter in limiters:
+        app.dependency_overrides.pop(limiter, None)
+
+
+@pytest.fixture(scope="module")
+def token(client, session, no_rate_limit):
+    session.add(
+        User(
+            username="contacts",
+            email="contacts@example.com",
+            password=auth_service.get_password_hash("1234567890"),
+            confirmed=True,
+        )
+    )
+    session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": "contacts@example.com", "password": "1234567890"},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["access_token"]
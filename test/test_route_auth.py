@@ -1,6 +1,8 @@
 from unittest.mock import MagicMock
 
 from src.database.models import User
+from src.services.auth import auth_service
+from src.conf.config import settings
 
 
 def test_create_user(client, user, monkeypatch):
@@ -69,3 +71,143 @@ def test_login_wrong_email(client, user):
     assert response.status_code == 401, response.text
     data = response.json()
     assert data["detail"] == "Invalid email"
+
+
+def login(client, user):
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get("email"), "password": user.get("password")},
+        headers={"User-Agent": "pytest"},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_refresh_token(client, user):
+    tokens = login(client, user)
+    response = client.get(
+        "/api/auth/refresh_token",
+        headers={"Authorization": f"Bearer {tokens['refresh_token']}"},
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["refresh_token"] != tokens["refresh_token"]
+    response = client.get(
+        "/api/auth/refresh_token",
+        headers={"Authorization": f"Bearer {data['refresh_token']}"},
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_refresh_token_reuse(client, user):
+    tokens = login(client, user)
+    headers = {"Authorization": f"Bearer {tokens['refresh_token']}"}
+    response = client.get("/api/auth/refresh_token", headers=headers)
+    assert response.status_code == 200, response.text
+    rotated = response.json()["refresh_token"]
+    access_token = response.json()["access_token"]
+    response = client.get(
+        "/api/users/me/", headers={"Authorization": f"Bearer {access_token}"}
+    )
+    assert response.status_code == 200, response.text
+    response = client.get("/api/auth/refresh_token", headers=headers)
+    assert response.status_code == 401, response.text
+    assert response.json()["detail"] == "Invalid refresh token"
+    for token in (access_token, tokens["access_token"]):
+        response = client.get(
+            "/api/users/me/", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 401, response.text
+    response = client.get(
+        "/api/auth/refresh_token", headers={"Authorization": f"Bearer {rotated}"}
+    )
+    assert response.status_code == 401, response.text
+
+
+def test_sessions(client, user):
+    tokens = login(client, user)
+    other = login(client, user)
+    other_sid = auth_service.token_claims(other["access_token"])["sid"]
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    response = client.get("/api/auth/sessions", headers=headers)
+    assert response.status_code == 200, response.text
+    sessions = response.json()
+    assert other_sid in [s["sid"] for s in sessions]
+    assert any(s["device"] == "pytest" for s in sessions)
+    response = client.delete(f"/api/auth/sessions/{other_sid}", headers=headers)
+    assert response.status_code == 204, response.text
+    response = client.get(
+        "/api/users/me/", headers={"Authorization": f"Bearer {other['access_token']}"}
+    )
+    assert response.status_code == 401, response.text
+    response = client.post("/api/auth/logout_all", headers=headers)
+    assert response.status_code == 204, response.text
+    response = client.get("/api/auth/sessions", headers=headers)
+    assert response.status_code == 401, response.text
+    response = client.get(
+        "/api/auth/refresh_token",
+        headers={"Authorization": f"Bearer {tokens['refresh_token']}"},
+    )
+    assert response.status_code == 401, response.text
+
+
+def test_logout(client, user):
+    tokens = login(client, user)
+    other = login(client, user)
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    response = client.get("/api/users/me/", headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.post("/api/auth/logout", headers=headers)
+    assert response.status_code == 204, response.text
+    response = client.get("/api/users/me/", headers=headers)
+    assert response.status_code == 401, response.text
+    response = client.get(
+        "/api/users/me/", headers={"Authorization": f"Bearer {other['access_token']}"}
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_login_unknown_email_cached(client, user):
+    data = {"username": "unknown@example.com", "password": user.get("password")}
+    response = client.post("/api/auth/login", data=data)
+    assert response.status_code == 401, response.text
+    assert 'desc="1 queries"' in response.headers["server-timing"]
+    response = client.post("/api/auth/login", data=data)
+    assert response.status_code == 401, response.text
+    assert response.json()["detail"] == "Invalid email"
+    assert 'desc="0 queries"' in response.headers["server-timing"]
+
+
+def test_login_unknown_email_other_case(client, user):
+    data = {"username": user.get("email").upper(), "password": user.get("password")}
+    for _ in range(2):
+        response = client.post("/api/auth/login", data=data)
+        assert response.status_code == 401, response.text
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get("email"), "password": user.get("password")},
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_login_throttled(client, user):
+    data = {"username": user.get("email"), "password": "password"}
+    headers = {"X-Forwarded-For": "10.0.0.1"}
+    for _ in range(settings.auth_max_failures_per_account):
+        response = client.post("/api/auth/login", data=data, headers=headers)
+        assert response.status_code == 401, response.text
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get("email"), "password": user.get("password")},
+        headers=headers,
+    )
+    assert response.status_code == 429, response.text
+    assert "retry-after" in response.headers
+
+
+def test_request_email_unknown(client):
+    response = client.post(
+        "/api/auth/request_email", json={"email": "nobody@example.com"}
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["message"] == "Check your email for confirmation."
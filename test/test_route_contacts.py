@@ -0,0 +1,405 @@
+import time
+
+import pytest
+
+from src.conf.config import settings
+from src.repository import contacts as repository_contacts
+from src.services.sync import decode_token, encode_token
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def create(client, token, i):
+    response = client.post(
+        "/api/contacts/",
+        json={
+            "firstname": f"John{i}",
+            "lastname": "Dou",
+            "email": f"john{i}@example.com",
+            "phone": f"{i}",
+            "birthday": "2000-01-01",
+        },
+        headers=auth(token),
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def changes(client, token, **params):
+    response = client.get("/api/contacts/changes", params=params, headers=auth(token))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_changes(client, token):
+    contacts = [create(client, token, i) for i in range(3)]
+    data = changes(client, token)
+    assert [c["id"] for c in data["changed"]] == [c["id"] for c in contacts]
+    assert data["deleted"] == []
+    assert data["more"] is False
+
+    updated = {**contacts[0], "lastname": "Updated"}
+    response = client.put(
+        f"/api/contacts/{updated['id']}", json=updated, headers=auth(token)
+    )
+    assert response.status_code == 200, response.text
+    response = client.delete(f"/api/contacts/{contacts[1]['id']}", headers=auth(token))
+    assert response.status_code == 204, response.text
+
+    data = changes(client, token, since=data["next"])
+    changed = {c["id"]: c for c in data["changed"]}
+    assert changed[updated["id"]]["lastname"] == "Updated"
+    assert contacts[1]["id"] not in changed
+    assert data["deleted"] == [contacts[1]["id"]]
+
+
+def test_changes_wait_for_safety_lag(client, token, monkeypatch):
+    monkeypatch.setattr(settings, "sync_safety_lag", 60)
+    contact = create(client, token, 20)
+    data = changes(client, token)
+    assert contact["id"] not in [c["id"] for c in data["changed"]]
+    monkeypatch.setattr(settings, "sync_safety_lag", 0)
+    data = changes(client, token, since=data["next"])
+    assert contact["id"] in [c["id"] for c in data["changed"]]
+    response = client.delete(f"/api/contacts/{contact['id']}", headers=auth(token))
+    assert response.status_code == 204, response.text
+
+
+def test_changes_pages(client, token):
+    data = changes(client, token, limit=1)
+    seen = [c["id"] for c in data["changed"]]
+    while data["more"]:
+        data = changes(client, token, since=data["next"], limit=1)
+        seen += [c["id"] for c in data["changed"]]
+    assert len(seen) == len(set(seen)) == 2
+
+
+def test_changes_invalid_token(client, token):
+    response = client.get(
+        "/api/contacts/changes", params={"since": "invalid"}, headers=auth(token)
+    )
+    assert response.status_code == 400, response.text
+
+
+def test_changes_token_of_moved_user(client, token):
+    data = changes(client, token)
+    _, user_id, changed, deleted = decode_token(data["next"])
+    response = client.get(
+        "/api/contacts/changes",
+        params={"since": encode_token(user_id + 1, changed, deleted)},
+        headers=auth(token),
+    )
+    assert response.status_code == 410, response.text
+
+
+@pytest.mark.parametrize("zone", ["America/New_York", "Asia/Tokyo"])
+def test_changes_in_local_time_zone(client, token, monkeypatch, zone):
+    # The database stamps changes in UTC whatever the time zone of the app
+    monkeypatch.setenv("TZ", zone)
+    time.tzset()
+    try:
+        data = changes(client, token)
+        contact = create(client, token, 30)
+        response = client.delete(f"/api/contacts/{contact['id']}", headers=auth(token))
+        assert response.status_code == 204, response.text
+        data = changes(client, token, since=data["next"])
+        assert contact["id"] in data["deleted"]
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_lookup_phone(client, token):
+    contact = create(client, token, 10)
+    response = client.put(
+        f"/api/contacts/{contact['id']}",
+        json={**contact, "phone": "+380 (50) 123-45-67"},
+        headers=auth(token),
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["phone_normalized"] == "+380501234567"
+
+    for params in (
+        {"phone": "050 123 45 67"},
+        {"phone": "4567", "suffix": True},
+        {"phone": "123-45-67", "suffix": True},
+    ):
+        response = client.get(
+            "/api/contacts/lookup", params=params, headers=auth(token)
+        )
+        assert response.status_code == 200, response.text
+        assert [c["id"] for c in response.json()] == [contact["id"]], params
+
+    response = client.get(
+        "/api/contacts/lookup", params={"phone": "7654567"}, headers=auth(token)
+    )
+    assert response.json() == []
+    response = client.get(
+        "/api/contacts/lookup",
+        params={"phone": "67", "suffix": True},
+        headers=auth(token),
+    )
+    assert response.status_code == 422, response.text
+
+
+def test_duplicates_and_merge(client, token):
+    ids = []
+    for firstname, email, phone in (
+        ("Olena", "olena@example.com", "+380 67 000 11 22"),
+        ("Olena", "olena.s@example.com", "067 000 1122"),
+    ):
+        response = client.post(
+            "/api/contacts/",
+            json={
+                "firstname": firstname,
+                "lastname": "Shevchenko",
+                "email": email,
+                "phone": phone,
+                "birthday": "1990-05-01",
+            },
+            headers=auth(token),
+        )
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+
+    response = client.get("/api/contacts/duplicates", headers=auth(token))
+    assert response.status_code == 200, response.text
+    pair = response.json()[0]
+    assert (pair["first_id"], pair["second_id"]) == tuple(ids)
+    assert pair["reasons"] == ["phone", "name", "birthday"]
+
+    response = client.post(
+        "/api/contacts/merge",
+        json={"keep_id": ids[0], "merge_ids": [ids[1]]},
+        headers=auth(token),
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["phone_normalized"] == "+380670001122"
+    response = client.get(f"/api/contacts/{ids[1]}", headers=auth(token))
+    assert response.status_code == 404, response.text
+    response = client.post(
+        "/api/contacts/merge",
+        json={"keep_id": ids[0], "merge_ids": [ids[1]]},
+        headers=auth(token),
+    )
+    assert response.status_code == 404, response.text
+
+
+def test_suggest(client, token, fake_redis):
+    create(client, token, 40)
+    response = client.post(
+        "/api/contacts/",
+        json={
+            "firstname": "Mykola",
+            "lastname": "Lysenko",
+            "email": "mykola@example.com",
+            "phone": "0671234567",
+            "birthday": "1990-03-22",
+        },
+        headers=auth(token),
+    )
+    assert response.status_code == 201, response.text
+
+    response = client.get(
+        "/api/contacts/suggest", params={"prefix": "john4"}, headers=auth(token)
+    )
+    assert response.status_code == 200, response.text
+    assert [c["firstname"] for c in response.json()] == ["John40"]
+    assert fake_redis.exists("suggest:0:1:ready")
+
+    for params in ({"prefix": "MYK"}, {"prefix": "mykola lys"}, {"prefix": "mykola@"}):
+        response = client.get(
+            "/api/contacts/suggest", params=params, headers=auth(token)
+        )
+        assert [c["lastname"] for c in response.json()] == ["Lysenko"], params
+    response = client.get(
+        "/api/contacts/suggest", params={"prefix": "zz"}, headers=auth(token)
+    )
+    assert response.json() == []
+
+
+def test_tags(client, token):
+    ids = [create(client, token, i)["id"] for i in (20, 21, 22)]
+    response = client.post(
+        "/api/contacts/tags/add",
+        json={"contact_ids": ids[:2], "tags": ["Family", "work "]},
+        headers=auth(token),
+    )
+    assert response.status_code == 200, response.text
+    assert [c["tags"] for c in response.json()] == [["family", "work"]] * 2
+    response = client.post(
+        "/api/contacts/tags/add",
+        json={"contact_ids": ids[1:], "tags": ["friends", "family"]},
+        headers=auth(token),
+    )
+    assert response.status_code == 200, response.text
+    response = client.post(
+        "/api/contacts/tags/remove",
+        json={"contact_ids": ids[2:], "tags": ["family"]},
+        headers=auth(token),
+    )
+    assert response.status_code == 200, response.text
+
+    def tagged(path="/api/contacts/all", **params):
+        response = client.get(path, params=params, headers=auth(token))
+        assert response.status_code == 200, response.text
+        return [c["id"] for c in response.json()]
+
+    assert tagged(tag=["family", "friends"]) == ids
+    assert tagged(tag=["family", "friends"], match="all") == [ids[1]]
+    assert tagged(tag=["unknown"]) == []
+    assert tagged("/api/contacts/search/John2", tag=["work"]) == ids[:2]
+    response = client.get(f"/api/contacts/{ids[1]}", headers=auth(token))
+    assert response.json()["tags"] == ["family", "friends", "work"]
+
+    response = client.post(
+        "/api/contacts/tags/remove",
+        json={"contact_ids": ids, "tags": ["family"]},
+        headers=auth(token),
+    )
+    assert response.status_code == 200, response.text
+    assert [c["tags"] for c in response.json()] == [
+        ["work"],
+        ["friends", "work"],
+        ["friends"],
+    ]
+    response = client.get("/api/contacts/tags", headers=auth(token))
+    assert response.json() == [
+        {"name": "family", "contacts": 0},
+        {"name": "friends", "contacts": 2},
+        {"name": "work", "contacts": 2},
+    ]
+
+    response = client.post(
+        "/api/contacts/tags/add",
+        json={"contact_ids": [ids[0], 999999], "tags": ["family"]},
+        headers=auth(token),
+    )
+    assert response.status_code == 404, response.text
+
+
+def test_tags_of_long_lists(client, token, monkeypatch):
+    ids = [create(client, token, i)["id"] for i in (50, 51, 52)]
+    for tagged, tag in ((ids[:2], "travel"), (ids[1:], "sport")):
+        response = client.post(
+            "/api/contacts/tags/add",
+            json={"contact_ids": tagged, "tags": [tag]},
+            headers=auth(token),
+        )
+        assert response.status_code == 200, response.text
+    monkeypatch.setattr(repository_contacts, "TAGS_BY_ID", 2)
+    response = client.get(
+        "/api/contacts/all", params={"tag": ["travel", "sport"]}, headers=auth(token)
+    )
+    assert response.status_code == 200, response.text
+    assert [c["id"] for c in response.json()] == ids
+    assert [c["tags"] for c in response.json()] == [
+        ["travel"],
+        ["sport", "travel"],
+        ["sport"],
+    ]
+
+
+def test_stats_and_total_count(client, token, fake_redis):
+    response = client.get("/api/contacts/all", headers=auth(token))
+    total = len(response.json())
+    assert response.headers["X-Total-Count"] == str(total)
+
+    response = client.get(
+        "/api/contacts/all", params={"skip": 1, "limit": 2}, headers=auth(token)
+    )
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 2
+    assert response.headers["X-Total-Count"] == str(total)
+    assert fake_redis.exists("stats:0:1")
+
+    response = client.get("/api/contacts/stats", headers=auth(token))
+    assert response.status_code == 200, response.text
+    stats = response.json()
+    assert stats["contacts"] == total
+    assert sum(stats["birthdays_by_month"]) == total
+
+
+def test_batch(client, token):
+    ids = [c["id"] for c in client.get("/api/contacts/all", headers=auth(token)).json()]
+    requested = [ids[2], 999999, ids[0], ids[2]]
+    response = client.get(
+        "/api/contacts/batch", params={"ids": requested}, headers=auth(token)
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [c["id"] for c in data["contacts"]] == [ids[2], ids[0]]
+    assert data["missing"] == [999999]
+
+    response = client.post(
+        "/api/contacts/batch", json={"ids": ids}, headers=auth(token)
+    )
+    assert response.status_code == 200, response.text
+    assert [c["id"] for c in response.json()["contacts"]] == ids
+    response = client.get("/api/contacts/batch", headers=auth(token))
+    assert response.status_code == 422, response.text
+
+
+def test_idempotent_create(client, token):
+    body = {
+        "firstname": "Retry",
+        "lastname": "Dou",
+        "email": "retry@example.com",
+        "phone": "0501112233",
+        "birthday": "2000-01-01",
+    }
+    headers = {**auth(token), "Idempotency-Key": "create-retry"}
+    first = client.post("/api/contacts/", json=body, headers=headers)
+    assert first.status_code == 201, first.text
+    retry = client.post(
+        "/api/contacts/",
+        json=body,
+        headers={**headers, "Origin": "http://localhost:3000"},
+    )
+    assert retry.status_code == 201, retry.text
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.headers["Access-Control-Allow-Origin"] == "http://localhost:3000"
+    assert "Idempotent-Replayed" not in first.headers
+
+    response = client.post(
+        "/api/contacts/", json={**body, "email": "other@example.com"}, headers=headers
+    )
+    assert response.status_code == 422, response.text
+    response = client.post("/api/contacts/", json=body, headers=auth(token))
+    assert response.status_code == 409, response.text
+
+
+def test_import(client, token):
+    contacts = [
+        {
+            "firstname": f"Imported{i}",
+            "lastname": "Dou",
+            "email": f"imported{i % 3}@example.com",
+            "phone": "0501112233",
+            "birthday": "2000-01-01",
+        }
+        for i in range(4)
+    ] + [
+        {
+            "firstname": "Retry",
+            "lastname": "Dou",
+            "email": "retry@example.com",
+            "phone": "0501112233",
+            "birthday": "2000-01-01",
+        }
+    ]
+    headers = {**auth(token), "Idempotency-Key": "import-1"}
+    response = client.post(
+        "/api/contacts/import", json={"contacts": contacts}, headers=headers
+    )
+    assert response.status_code == 201, response.text
+    data = response.json()
+    assert len(data["created"]) == 3
+    assert data["skipped"] == ["imported0@example.com", "retry@example.com"]
+    retry = client.post(
+        "/api/contacts/import", json={"contacts": contacts}, headers=headers
+    )
+    assert retry.json() == data
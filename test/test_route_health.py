@@ -0,0 +1,49 @@
+import fakeredis
+import pytest
+
+from src.routes import health
+from src.services.resources import resources
+
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    health._ready_cache["expires"] = 0.0
+    yield
+
+
+def test_live(client):
+    response = client.get("/health/live")
+    assert response.status_code == 200, response.text
+    assert response.json() == {"status": "ok"}
+
+
+def test_ready(client, monkeypatch):
+    monkeypatch.setattr(resources, "redis", fakeredis.FakeRedis())
+    response = client.get("/health/ready")
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["status"] == "ok"
+    assert data["checks"]["database"]["status"] == "ok"
+    assert data["checks"]["redis"]["status"] == "ok"
+    assert "saturation" in data["checks"]["pool"]
+
+
+def test_ready_redis_down(client, monkeypatch):
+    server = fakeredis.FakeServer()
+    server.connected = False
+    monkeypatch.setattr(resources, "redis", fakeredis.FakeRedis(server=server))
+    response = client.get("/health/ready")
+    assert response.status_code == 503, response.text
+    data = response.json()
+    assert data["checks"]["redis"]["status"] == "fail"
+    assert data["checks"]["database"]["status"] == "ok"
+
+
+def test_ready_cached(client, monkeypatch):
+    monkeypatch.setattr(resources, "redis", fakeredis.FakeRedis())
+    client.get("/health/ready")
+    server = fakeredis.FakeServer()
+    server.connected = False
+    monkeypatch.setattr(resources, "redis", fakeredis.FakeRedis(server=server))
+    response = client.get("/health/ready")
+    assert response.status_code == 200, response.text
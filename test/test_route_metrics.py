@@ -0,0 +1,47 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.conf.config import settings
+from src.database.instrumentation import QueryBudgetExceeded
+
+
+def test_metrics(client):
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/",status="200"}'
+        in response.text
+    )
+    assert "http_requests_in_flight" in response.text
+    assert "db_queries_per_request" in response.text
+
+
+def test_metrics_db_queries(client, user):
+    client.post(
+        "/api/auth/login",
+        data={"username": "unknown@example.com", "password": user.get("password")},
+    )
+    response = client.get("/metrics")
+    assert 'db_queries_per_request_count{route="/api/auth/login"}' in response.text
+    assert (
+        'db_queries_per_request_sum{route="/api/auth/login"} 0.0' not in response.text
+    )
+
+
+def test_server_timing(client, user):
+    response = client.post(
+        "/api/auth/login",
+        data={"username": "timing@example.com", "password": user.get("password")},
+    )
+    server_timing = response.headers["server-timing"]
+    assert server_timing.startswith("db;dur=")
+    assert 'desc="1 queries"' in server_timing
+
+
+def test_query_budget_exceeded(client, user, monkeypatch):
+    monkeypatch.setattr("src.routes.auth.send_email", MagicMock())
+    monkeypatch.setitem(settings.db_query_budgets, "/api/auth/signup", 1)
+    with pytest.raises(QueryBudgetExceeded):
+        client.post("/api/auth/signup", json={**user, "email": "budget@example.com"})
@@ -0,0 +1,40 @@
+import unittest
+
+from src.database.models import Contact
+from src.database.phone import normalize_phone, reverse_digits
+
+
+class TestNormalizePhone(unittest.TestCase):
+    def test_formats_of_one_number(self):
+        for phone in (
+            "+380 (50) 123-45-67",
+            "00380501234567",
+            "050 123 45 67",
+            "380501234567",
+            "501234567",
+            "+380501234567 ext. 12",
+        ):
+            self.assertEqual(normalize_phone(phone, "380"), "+380501234567", phone)
+
+    def test_default_country_code(self):
+        self.assertEqual(normalize_phone("(555) 123-4567", "1"), "+15551234567")
+        self.assertEqual(normalize_phone("+1 555 123 4567", "380"), "+15551234567")
+
+    def test_invalid(self):
+        for phone in (None, "", "123", "+0123456789", "+1234567890123456"):
+            self.assertIsNone(normalize_phone(phone, "380"), phone)
+
+    def test_reverse_digits(self):
+        self.assertEqual(reverse_digits("+380501234567"), "765432105083")
+        self.assertIsNone(reverse_digits(None))
+
+    def test_contact_normalized_on_write(self):
+        contact = Contact(phone="050 123 45 67")
+        self.assertEqual(contact.phone_normalized, "+380501234567")
+        contact.phone = "12"
+        self.assertIsNone(contact.phone_normalized)
+        self.assertIsNone(contact.phone_reversed)
+
+
+if __name__ == "__main__":
+    unittest.main()
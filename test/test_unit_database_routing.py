@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from datetime import date
+
+import fakeredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import db as database
+from src.database.models import Base, Contact, User
+from src.repository.contacts import tag_contacts
+from src.services.resources import resources
+
+
+class TestReadReplica(unittest.TestCase):
+    def setUp(self):
+        self.primary = create_engine("sqlite://")
+        self.replica = create_engine("sqlite://")
+        for engine, name in ((self.primary, "primary"), (self.replica, "replica")):
+            Base.metadata.create_all(bind=engine)
+            with engine.begin() as conn:
+                conn.execute(
+                    User.__table__.insert(),
+                    {"id": 1, "username": name, "email": "a@a.com", "password": "x"},
+                )
+        self.r = fakeredis.FakeRedis()
+        self.patches = [
+            patch.object(resources, "replica_engines", [self.replica]),
+            patch.object(resources, "redis", self.r),
+        ]
+        for p in self.patches:
+            p.start()
+        self.db = sessionmaker(class_=database.RoutingSession, bind=self.primary)()
+
+    def tearDown(self):
+        self.db.close()
+        for p in self.patches:
+            p.stop()
+
+    def username(self):
+        return self.db.query(User.username).filter(User.id == 1).scalar()
+
+    def test_reads_go_to_replica(self):
+        with database.read_replica(self.db, "user:1"):
+            self.assertEqual(self.username(), "replica")
+        self.assertEqual(self.username(), "primary")
+
+    def test_writer_pinned_to_primary(self):
+        contact = Contact(
+            firstname="John",
+            lastname="Dou",
+            email="test@test.com",
+            phone="1234567890",
+            birthday=date(2000, 1, 1),
+            user_id=1,
+        )
+        self.db.add(contact)
+        self.db.commit()
+        self.assertTrue(self.r.exists("pin:user:1"))
+        with database.read_replica(self.db, "user:1"):
+            self.assertEqual(self.username(), "primary")
+        with database.read_replica(self.db, "user:2"):
+            self.assertEqual(self.username(), "replica")
+
+    def test_rollback_does_not_pin(self):
+        self.db.add(
+            Contact(
+                firstname="John",
+                lastname="Dou",
+                phone="1",
+                birthday=date(2000, 1, 1),
+                user_id=1,
+            )
+        )
+        self.db.flush()
+        self.db.rollback()
+        self.assertFalse(self.r.exists("pin:user:1"))
+
+    def test_bulk_tagging_pins_writer(self):
+        with self.primary.begin() as conn:
+            conn.execute(
+                Contact.__table__.insert(),
+                {
+                    "id": 1,
+                    "firstname": "John",
+                    "lastname": "Dou",
+                    "phone": "1",
+                    "birthday": date(2000, 1, 1),
+                    "user_id": 1,
+                },
+            )
+        user = self.db.get(User, 1)
+        asyncio.run(tag_contacts([1], ["family"], user, self.db))
+        self.assertTrue(self.r.exists("pin:user:1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
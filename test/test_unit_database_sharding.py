@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from datetime import date
+
+import fakeredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import db as database
+from src.database.models import Base, Contact, User
+from src.database.reshard import move_user
+from src.database.sharding import ShardMap, jump_hash
+from src.repository.contacts import get_contacts, tag_contacts
+from src.repository.users import get_user_by_email
+from src.services.auth import user_cache
+from src.services.resources import resources
+
+
+class TestJumpHash(unittest.TestCase):
+    def test_adding_a_shard_moves_few_keys(self):
+        keys = range(0, 10_000_000, 997)
+        moved = sum(jump_hash(k, 4) != jump_hash(k, 5) for k in keys)
+        self.assertAlmostEqual(moved / len(keys), 1 / 5, delta=0.03)
+        self.assertTrue(all(jump_hash(k, 5) in (jump_hash(k, 4), 4) for k in keys))
+
+
+class TestShards(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # SQLite files stand in for the databases of three shards
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engines = [
+            create_engine(f"sqlite:///{os.path.join(self.tmp.name, f'shard{i}.db')}")
+            for i in range(3)
+        ]
+        for engine in self.engines:
+            Base.metadata.create_all(bind=engine)
+        self.r = fakeredis.FakeRedis()
+        self.shard_map = ShardMap(3, lambda: self.r)
+        self.patches = [
+            patch.object(resources, "shard_engines", self.engines),
+            patch.object(database, "shard_map", self.shard_map),
+            patch.object(resources, "redis", self.r),
+        ]
+        for p in self.patches:
+            p.start()
+        self.session = sessionmaker(
+            class_=database.RoutingSession, bind=self.engines[0]
+        )
+        self.email = "sharded@example.com"
+        self.home = self.shard_map.home(self.email)
+        with self.session() as db:
+            database.use_shard(db, self.email)
+            user = User(username="sharded", email=self.email, password="x")
+            db.add(user)
+            db.flush()
+            db.add(
+                Contact(
+                    firstname="John",
+                    lastname="Dou",
+                    email="john@example.com",
+                    phone="1",
+                    birthday=date(2000, 1, 1),
+                    user_id=user.id,
+                )
+            )
+            db.commit()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        for engine in self.engines:
+            engine.dispose()
+        self.tmp.cleanup()
+
+    def count(self, shard, model):
+        with self.engines[shard].connect() as conn:
+            return conn.execute(model.__table__.select()).fetchall()
+
+    def test_rows_stored_on_home_shard(self):
+        for shard in range(3):
+            expected = 1 if shard == self.home else 0
+            self.assertEqual(len(self.count(shard, User)), expected)
+            self.assertEqual(len(self.count(shard, Contact)), expected)
+
+    async def test_repositories_follow_the_shard_map(self):
+        with self.session() as db:
+            user = await get_user_by_email(self.email, db)
+            contacts = await get_contacts(user, db)
+        self.assertEqual(user.username, "sharded")
+        self.assertEqual([c.firstname for c in contacts], ["John"])
+
+    async def test_move_user(self):
+        with self.session() as db:
+            user = await get_user_by_email(self.email, db)
+            contacts = await get_contacts(user, db)
+            await tag_contacts([contacts[0].id], ["family"], user, db)
+        target = (self.home + 1) % 3
+        self.assertEqual(move_user(self.email, target), 1)
+        self.assertEqual(self.shard_map.shard_for(self.email), target)
+        self.assertEqual(self.count(self.home, User), [])
+        self.assertEqual(self.count(self.home, Contact), [])
+        with self.session() as db:
+            user = await get_user_by_email(self.email, db)
+            contacts = await get_contacts(user, db)
+        self.assertEqual([c.email for c in contacts], ["john@example.com"])
+        self.assertEqual(contacts[0].tags, ["family"])
+
+        self.assertEqual(move_user(self.email, self.home), 1)
+        self.assertFalse(self.r.exists(ShardMap.OVERRIDES))
+
+    def test_move_user_invalidates_cache_around_pin(self):
+        calls = []
+        target = (self.home + 1) % 3
+        with patch.object(
+            user_cache, "invalidate", side_effect=lambda email: calls.append("cache")
+        ), patch.object(
+            self.shard_map, "pin", side_effect=lambda email, shard: calls.append("pin")
+        ):
+            move_user(self.email, target)
+        self.assertEqual(calls, ["cache", "pin", "cache"])
+
+    def test_move_unknown_user(self):
+        with self.assertRaises(LookupError):
+            move_user(
+                "nobody@example.com",
+                0 if self.shard_map.home("nobody@example.com") else 1,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
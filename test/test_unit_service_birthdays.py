@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import fakeredis
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import Base, Contact, User
+from src.repository.contacts import birthday_keys
+from src.services.birthdays import next_birthday, send_digests
+
+
+class TestWindow(unittest.TestCase):
+    def test_birthday_keys(self):
+        self.assertEqual(birthday_keys(date(2026, 12, 30), 3), [1230, 1231, 101, 102])
+        self.assertIn(229, birthday_keys(date(2026, 2, 27), 2))
+        self.assertNotIn(229, birthday_keys(date(2028, 2, 27), 1))
+
+    def test_next_birthday(self):
+        today = date(2026, 10, 19)
+        self.assertEqual(next_birthday(date(1990, 10, 19), today), today)
+        self.assertEqual(next_birthday(date(1990, 1, 5), today), date(2027, 1, 5))
+        self.assertEqual(
+            next_birthday(date(2000, 2, 29), date(2027, 2, 20)), date(2027, 3, 1)
+        )
+
+
+class TestSendDigests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # SQLite files stand in for the databases of two shards
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engines = [
+            create_engine(f"sqlite:///{os.path.join(self.tmp.name, f'shard{i}.db')}")
+            for i in range(2)
+        ]
+        for shard, engine in enumerate(self.engines):
+            Base.metadata.create_all(bind=engine)
+            with Session(engine) as db:
+                for i in range(5):
+                    user = User(
+                        username=f"user{shard}{i}",
+                        email=f"user{shard}{i}@example.com",
+                        password="secret",
+                        confirmed=i != 4,
+                    )
+                    db.add(user)
+                    db.flush()
+                    for month, day in ((10, 21), (10, 19), (12, 1)):
+                        db.add(
+                            Contact(
+                                firstname=f"John{month}{day}",
+                                lastname="Dou",
+                                email=f"john{month}{day}@example.com",
+                                phone="0501234567",
+                                birthday=date(1990, month, day),
+                                user_id=user.id,
+                            )
+                        )
+                db.commit()
+        self.r = fakeredis.FakeRedis()
+        self.sent = []
+        self.batch_size = patch.object(settings, "birthday_batch_size", 2)
+        self.batch_size.start()
+
+    def tearDown(self):
+        self.batch_size.stop()
+        for engine in self.engines:
+            engine.dispose()
+        self.tmp.cleanup()
+
+    async def send(self, email, username, contacts):
+        self.sent.append((email, contacts))
+        return True
+
+    async def run_job(self):
+        return await send_digests(
+            date(2026, 10, 19), engines=self.engines, r=self.r, send=self.send
+        )
+
+    async def test_sends_one_digest_per_confirmed_user(self):
+        self.assertEqual(await self.run_job(), 8)
+        emails = [email for email, _ in self.sent]
+        self.assertEqual(len(set(emails)), 8)
+        self.assertNotIn("user04@example.com", emails)
+        _, contacts = self.sent[0]
+        self.assertEqual(
+            [(c["name"], c["date"], c["days"]) for c in contacts],
+            [("John1019 Dou", "October 19", 0), ("John1021 Dou", "October 21", 2)],
+        )
+        self.assertFalse(self.r.exists("birthdays:lock"))
+
+    async def test_failed_digest_does_not_stop_the_shard(self):
+        async def send(email, username, contacts):
+            if email == "user00@example.com":
+                raise ValueError("invalid template")
+            return await self.send(email, username, contacts)
+
+        depth = REGISTRY.get_sample_value("email_queue_depth")
+        sent = await send_digests(
+            date(2026, 10, 19), engines=self.engines, r=self.r, send=send
+        )
+        self.assertEqual(sent, 7)
+        self.assertEqual(len(self.sent), 7)
+        self.assertEqual(REGISTRY.get_sample_value("email_queue_depth"), depth)
+
+    async def test_restarted_run_continues(self):
+        await self.run_job()
+        self.assertEqual(await self.run_job(), 0)
+        self.assertEqual(len(self.sent), 8)
+
+    async def test_concurrent_run_does_nothing(self):
+        self.r.set("birthdays:lock", 1)
+        self.assertEqual(await self.run_job(), 0)
+        self.assertEqual(self.sent, [])
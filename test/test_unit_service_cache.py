@@ -0,0 +1,115 @@
+import asyncio
+import pickle
+import time
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+
+from src.services.cache import CachedLoader, SingleFlight
+
+
+class TestCachedLoader(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.r = fakeredis.FakeRedis()
+        self.cache = CachedLoader("user", 900, lambda: self.r)
+        self.calls = 0
+
+    async def loader(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"email": "test@test.com"}
+
+    async def test_miss_then_hit(self):
+        result = await self.cache.get("test@test.com", self.loader)
+        self.assertEqual(result, {"email": "test@test.com"})
+        result = await self.cache.get("test@test.com", self.loader)
+        self.assertEqual(result, {"email": "test@test.com"})
+        self.assertEqual(self.calls, 1)
+
+    async def test_concurrent_misses_coalesced(self):
+        results = await asyncio.gather(
+            *(self.cache.get("test@test.com", self.loader) for _ in range(20))
+        )
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(results), 20)
+        self.assertIsNot(results[0], results[1])
+
+    async def test_wait_for_other_worker(self):
+        self.r.set("lock:user:test@test.com", "other")
+
+        async def other_worker():
+            await asyncio.sleep(0.05)
+            self.r.set(
+                "user:test@test.com",
+                pickle.dumps(({"email": "other"}, 0.01, time.time() + 900)),
+            )
+
+        result, _ = await asyncio.gather(
+            self.cache.get("test@test.com", self.loader), other_worker()
+        )
+        self.assertEqual(result, {"email": "other"})
+        self.assertEqual(self.calls, 0)
+
+    async def test_early_refresh(self):
+        self.r.set(
+            "user:test@test.com",
+            pickle.dumps(({"email": "old"}, 10.0, time.time() + 1)),
+        )
+        with patch("src.services.cache.random.random", return_value=0.5):
+            result = await self.cache.get("test@test.com", self.loader)
+        self.assertEqual(result, {"email": "test@test.com"})
+        self.assertEqual(self.calls, 1)
+
+    async def test_no_early_refresh(self):
+        self.r.set(
+            "user:test@test.com",
+            pickle.dumps(({"email": "old"}, 0.01, time.time() + 600)),
+        )
+        result = await self.cache.get("test@test.com", self.loader)
+        self.assertEqual(result, {"email": "old"})
+        self.assertEqual(self.calls, 0)
+
+    async def test_not_found_not_cached(self):
+        async def loader():
+            return None
+
+        result = await self.cache.get("test@test.com", loader)
+        self.assertIsNone(result)
+        self.assertIsNone(self.r.get("user:test@test.com"))
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_error_propagated(self):
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("error")
+
+        results = await asyncio.gather(
+            flight.do("key", fail), flight.do("key", fail), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_cancelled_leader_does_not_cancel_waiters(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "value"
+
+        leader = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.assertEqual(await waiter, "value")
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
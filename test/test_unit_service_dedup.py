@@ -0,0 +1,40 @@
+import unittest
+from datetime import date
+
+from src.services.dedup import Candidate, find_duplicates, score, soundex
+
+
+class TestDedup(unittest.TestCase):
+    def test_soundex(self):
+        self.assertEqual(soundex("Robert"), "R163")
+        self.assertEqual(soundex("Rupert"), "R163")
+        self.assertEqual(soundex("Ashcraft"), "A261")
+        self.assertEqual(soundex("Olena"), soundex("Olina"))
+        self.assertEqual(soundex("Олена"), "")
+
+    def test_score(self):
+        a = Candidate(
+            1, "Olena", "Shevchenko", "O@x.com", "+380670001122", date(1990, 5, 1)
+        )
+        self.assertEqual(
+            score(a, a._replace(id=2, email="o@X.com", phone_normalized=None))[1],
+            ["email", "name", "birthday"],
+        )
+        # A shared phone alone is a family member rather than a duplicate
+        other = Candidate(2, "Taras", "Melnyk", None, "+380670001122", date(1960, 1, 1))
+        self.assertLess(score(a, other)[0], 0.6)
+
+    def test_find_duplicates_in_large_blocks(self):
+        contacts = [
+            Candidate(
+                i, "Ivan", f"Petrenko{i:03d}", None, None, date(2000, 1, i % 28 + 1)
+            )
+            for i in range(200)
+        ]
+        contacts.append(contacts[7]._replace(id=200, email="ivan@x.com"))
+        pairs = find_duplicates(contacts, max_block=50, window=3)
+        self.assertEqual(pairs, [(7, 200, 0.65, ["name", "birthday"])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from datetime import date
+
+import fakeredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import db as database
+from src.database.models import Base, Contact, User
+from src.services.events import ContactEvents
+
+
+class TestContactEvents(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.r = fakeredis.FakeRedis()
+        self.events = ContactEvents(lambda: self.r, heartbeat=0.05)
+
+    def tearDown(self):
+        self.events.stop()
+
+    async def next_event(self, stream):
+        return await asyncio.wait_for(anext(stream), 2.0)
+
+    async def test_live_events(self):
+        stream = self.events.stream("0:1")
+        self.assertTrue((await self.next_event(stream)).startswith("retry:"))
+        # Heartbeats are sent until the listener thread delivers the change
+        self.events.publish([("0:1", "created", 7), ("0:2", "created", 8)])
+        for _ in range(100):
+            event = await self.next_event(stream)
+            if event != ": ping\n\n":
+                break
+        self.assertIn('event: created\ndata: {"id": 7}', event)
+        await stream.aclose()
+        self.assertEqual(self.events._subscribers, {})
+
+    async def test_resume_after_last_event_id(self):
+        self.events.publish([("0:1", "created", 1)])
+        first = self.r.xrange(ContactEvents.key("0:1"))[0][0].decode()
+        self.events.publish([("0:1", "updated", 1), ("0:1", "deleted", 1)])
+        stream = self.events.stream("0:1", first)
+        await self.next_event(stream)
+        self.assertIn("event: updated", await self.next_event(stream))
+        self.assertIn("event: deleted", await self.next_event(stream))
+        self.assertEqual(await self.next_event(stream), ": ping\n\n")
+        await stream.aclose()
+
+    async def test_reset_when_events_were_trimmed(self):
+        self.events.publish([("0:1", "created", 1)])
+        stream = self.events.stream("0:1", "1-0")
+        await self.next_event(stream)
+        self.assertEqual(await self.next_event(stream), "event: reset\ndata: {}\n\n")
+        self.assertIn("event: created", await self.next_event(stream))
+        await stream.aclose()
+
+
+class TestPublishOnCommit(unittest.TestCase):
+    def test_contact_changes_published_after_commit(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        published = []
+        events = ContactEvents(lambda: fakeredis.FakeRedis())
+        events.publish = published.extend
+        patch("src.services.events.contact_events", events).start()
+        self.addCleanup(patch.stopall)
+
+        db = sessionmaker(class_=database.RoutingSession, bind=engine)()
+        db.add(User(id=1, username="events", email="events@example.com", password="x"))
+        contact = Contact(
+            firstname="John",
+            lastname="Dou",
+            phone="1",
+            birthday=date(2000, 1, 1),
+            user_id=1,
+        )
+        db.add(contact)
+        db.flush()
+        db.rollback()
+        self.assertEqual(published, [])
+
+        db.add(User(id=1, username="events", email="events@example.com", password="x"))
+        db.add(contact)
+        db.commit()
+        contact.lastname = "Updated"
+        db.commit()
+        db.delete(contact)
+        db.commit()
+        self.assertEqual(
+            published,
+            [
+                ("0:1", "created", contact.id),
+                ("0:1", "updated", contact.id),
+                ("0:1", "deleted", contact.id),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
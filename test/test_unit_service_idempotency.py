@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+
+import fakeredis
+
+from src.services.auth import auth_service
+from src.services.idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+class TestIdempotencyStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.r = fakeredis.FakeRedis()
+        self.store = IdempotencyStore(lambda: self.r, ttl=60, wait=1.0, poll=0.01)
+        self.key = self.store.key("user@example.com", "key-1")
+
+    async def test_duplicates_wait_for_the_first_response(self):
+        self.assertIsNone(await self.store.begin(self.key, "fp"))
+        waiters = [
+            asyncio.create_task(self.store.begin(self.key, "fp")) for _ in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        self.assertFalse(any(w.done() for w in waiters))
+        self.store.finish(self.key, "fp", 201, [(b"x-a", b"1")], b'{"id": 1}')
+        records = await asyncio.gather(*waiters)
+        self.assertEqual({r["status"] for r in records}, {201})
+        self.assertEqual(records[0]["headers"], [["x-a", "1"]])
+
+    async def test_abort_lets_a_retry_handle_the_request(self):
+        self.assertIsNone(await self.store.begin(self.key, "fp"))
+        waiter = asyncio.create_task(self.store.begin(self.key, "fp"))
+        await asyncio.sleep(0.02)
+        self.store.abort(self.key)
+        self.assertIsNone(await waiter)
+
+    async def test_timeout_and_other_request(self):
+        self.assertIsNone(await self.store.begin(self.key, "fp"))
+        self.assertEqual(
+            (await self.store.begin(self.key, "other"))["state"], "pending"
+        )
+        self.store.wait = 0.05
+        self.assertEqual((await self.store.begin(self.key, "fp"))["state"], "pending")
+
+    async def test_claim_renewed_while_running(self):
+        self.store.lock_ttl = 1
+        self.assertIsNone(await self.store.begin(self.key, "fp"))
+        renewal = asyncio.create_task(self.store.keep_claimed(self.key, "fp"))
+        await asyncio.sleep(1.2)
+        self.assertTrue(self.r.exists(self.key))
+        renewal.cancel()
+        self.store.finish(self.key, "fp", 201, [], b"")
+        self.assertFalse(self.store.renew(self.key, "fp"))
+        self.assertGreater(self.r.ttl(self.key), 1)
+
+    async def test_rate_limited_response_not_stored(self):
+        calls = []
+
+        async def app(scope, receive, send):
+            calls.append(scope["path"])
+            status = 429 if len(calls) == 1 else 201
+            await send({"type": "http.response.start", "status": status})
+            await send({"type": "http.response.body", "body": b""})
+
+        token = await auth_service.create_access_token({"sub": "user@example.com"})
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/api/contacts/",
+            "query_string": b"",
+            "headers": [
+                (b"authorization", f"Bearer {token}".encode()),
+                (b"idempotency-key", b"key-1"),
+            ],
+        }
+        middleware = IdempotencyMiddleware(app, store=self.store)
+        statuses = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"{}", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        for _ in range(3):
+            await middleware(scope, receive, send)
+        self.assertEqual(statuses, [429, 201, 201])
+        self.assertEqual(len(calls), 2)
+
+    def test_keys_are_scoped_by_user(self):
+        self.assertNotEqual(self.key, self.store.key("other@example.com", "key-1"))
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from src.conf.config import Settings
+from src.services import resources as module
+from src.services.resources import Resources
+
+
+class TestResources(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.resources = Resources(
+            Settings(
+                sqlalchemy_database_url=f"sqlite:///{self.path('primary.db')}",
+                sqlalchemy_shard_urls=[f"sqlite:///{self.path('shard1.db')}"],
+            )
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_clients_are_created_on_first_use(self):
+        self.assertNotIn("engine", vars(self.resources))
+        engines = self.resources.shard_engines
+        self.assertIs(engines[0], self.resources.engine)
+        self.assertEqual(len(engines), 2)
+        self.assertIs(self.resources.redis, self.resources.redis)
+
+    def test_clients_are_created_once_across_threads(self):
+        created = []
+
+        def slow_redis(**kwargs):
+            created.append(kwargs)
+            time.sleep(0.05)
+            return object()
+
+        with patch("redis.Redis", slow_redis), ThreadPoolExecutor(8) as pool:
+            clients = list(pool.map(lambda _: self.resources.redis, range(8)))
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(client is clients[0] for client in clients))
+
+    def test_warm_without_redis(self):
+        self.resources.shard_engines = []
+        self.resources.replica_engines = []
+        self.resources.redis = MagicMock()
+        self.resources.redis.ping.side_effect = ConnectionError("refused")
+        with self.assertLogs(module.logger, "WARNING"):
+            self.resources.warm_pools(1)
+
+    async def test_open_without_redis(self):
+        self.resources.shard_engines = []
+        self.resources.replica_engines = []
+        self.resources.redis = fakeredis.FakeRedis()
+        self.resources.limiter_redis = MagicMock()
+        self.resources.limiter_redis.ping.side_effect = ConnectionError("refused")
+        with self.assertLogs(module.logger, "WARNING"):
+            await self.resources.open()
+
+    async def test_warm_and_close(self):
+        engine = create_engine(f"sqlite:///{self.path('warm.db')}", poolclass=QueuePool)
+        missing = create_engine(f"sqlite:///{self.path('missing/x.db')}")
+        self.resources.engine = engine
+        self.resources.shard_engines = [engine]
+        self.resources.replica_engines = [missing]
+        self.resources.redis = fakeredis.FakeRedis()
+        with self.assertLogs(module.logger, "WARNING"):
+            self.resources.warm_pools(2)
+        self.assertEqual(engine.pool.checkedin(), 2)
+        await self.resources.close()
+        self.assertEqual(engine.pool.checkedin(), 0)
+        self.assertFalse(set(Resources.CLIENTS) & set(vars(self.resources)))
+
+
+if __name__ == "__main__":
+    unittest.main()
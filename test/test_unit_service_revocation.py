@@ -0,0 +1,62 @@
+import time
+import unittest
+
+import fakeredis
+
+from src.services.revocation import RevocationList
+
+
+class TestRevocationList(unittest.TestCase):
+    def setUp(self):
+        self.r = r = fakeredis.FakeRedis()
+        self.worker = RevocationList(lambda: r)
+        self.other = RevocationList(lambda: r)
+        self.payload = {"sub": "test@test.com", "jti": "jti", "sid": "sid", "iat": 0}
+
+    def test_not_revoked(self):
+        self.assertFalse(self.worker.is_revoked(self.payload))
+
+    def test_revoke_jti(self):
+        self.worker.revoke("jti", time.time() + 60)
+        self.assertTrue(self.worker.is_revoked(self.payload))
+
+    def test_revoke_sid(self):
+        self.worker.revoke("sid", time.time() + 60)
+        self.assertTrue(self.worker.is_revoked(self.payload))
+
+    def test_revoke_user(self):
+        self.worker.revoke_user("test@test.com")
+        self.assertTrue(self.worker.is_revoked(self.payload))
+        self.assertFalse(
+            self.worker.is_revoked({**self.payload, "iat": time.time() + 1})
+        )
+
+    def test_revoke_user_same_second(self):
+        self.worker.revoke_user("test@test.com")
+        not_before = self.worker._not_before["test@test.com"]
+        self.assertFalse(
+            self.worker.is_revoked({**self.payload, "iat": not_before + 0.001})
+        )
+
+    def test_sync_prunes_old_user_revocations(self):
+        self.r.hset(RevocationList.USERS_KEY, "old@test.com", time.time() - 7200)
+        self.worker.revoke_user("test@test.com")
+        self.other.sync()
+        self.assertNotIn("old@test.com", self.other._not_before)
+        self.assertIn("test@test.com", self.other._not_before)
+        self.assertFalse(self.r.hexists(RevocationList.USERS_KEY, "old@test.com"))
+
+    def test_sync(self):
+        self.worker.revoke("jti", time.time() + 60)
+        self.worker.revoke("expired", time.time() - 1)
+        self.other.sync()
+        self.assertTrue(self.other.is_revoked(self.payload))
+        self.assertNotIn("expired", self.other._ids)
+
+    def test_apply(self):
+        self.other.apply(f"user:{time.time()}:test@test.com")
+        self.assertTrue(self.other.is_revoked(self.payload))
+
+
+if __name__ == "__main__":
+    unittest.main()
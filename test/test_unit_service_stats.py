@@ -0,0 +1,104 @@
+import unittest
+from collections import Counter
+from datetime import date
+from unittest.mock import patch
+
+import fakeredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import db as database
+from src.database.models import Base, Contact, User
+from src.services import stats
+from src.services.stats import ContactStats
+
+
+class TestContactStats(unittest.TestCase):
+    def setUp(self):
+        self.r = fakeredis.FakeRedis()
+        self.stats = ContactStats(lambda: self.r, ttl=60)
+
+    def test_build_and_summary(self):
+        self.assertIsNone(self.stats.get("0:1"))
+        self.stats.build("0:1", [(10, 20, 2), (2, 29, 1), (12, 31, 3)])
+        counters = self.stats.get("0:1")
+        self.assertEqual(counters["total"], 6)
+        self.assertEqual(
+            self.stats.summary(counters, date(2027, 2, 27), 2),
+            {
+                "contacts": 6,
+                "upcoming_birthdays": 1,
+                "birthdays_by_month": [0, 1, 0, 0, 0, 0, 0, 0, 0, 2, 0, 3],
+            },
+        )
+        self.assertLessEqual(self.r.ttl("stats:0:1"), 60)
+
+    def test_apply(self):
+        self.stats.build("0:1", [(10, 20, 2)])
+        self.stats.apply(
+            {
+                "0:1": Counter({"total": 1, "d:1020": -1, "d:1021": 2}),
+                "0:2": Counter({"total": 1, "d:101": 1}),
+            }
+        )
+        counters = self.stats.get("0:1")
+        self.assertEqual((counters["total"], counters["d:1020"]), (3, 1))
+        self.assertEqual(counters["d:1021"], 2)
+        # Counters that were never built are left for the next read to build
+        self.assertFalse(self.r.exists("stats:0:2"))
+
+    def test_build_racing_a_commit_is_not_stored(self):
+        version = self.stats.version("0:1")
+        self.stats.apply({"0:1": Counter({"total": 1, "d:101": 1})})
+        counters = self.stats.build("0:1", [(10, 20, 2)], version)
+        self.assertEqual(counters["total"], 2)
+        self.assertIsNone(self.stats.get("0:1"))
+        self.stats.build("0:1", [(10, 20, 2), (1, 1, 1)], self.stats.version("0:1"))
+        self.assertEqual(self.stats.get("0:1")["total"], 3)
+
+
+class TestCountersFollowCommits(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=self.engine)
+        self.session = sessionmaker(class_=database.RoutingSession, bind=self.engine)
+        self.r = fakeredis.FakeRedis()
+        self.patch = patch.object(
+            stats, "contact_stats", ContactStats(lambda: self.r, ttl=60)
+        )
+        self.patch.start()
+        with self.session() as db:
+            user = User(username="stats", email="stats@example.com", password="x")
+            db.add(user)
+            db.commit()
+            self.user_id = user.id
+        stats.contact_stats.build(f"0:{self.user_id}", [])
+
+    def tearDown(self):
+        self.patch.stop()
+        self.engine.dispose()
+
+    def contact(self, i, birthday):
+        return Contact(
+            firstname=f"John{i}",
+            lastname="Dou",
+            email=f"john{i}@example.com",
+            phone="1",
+            birthday=birthday,
+            user_id=self.user_id,
+        )
+
+    def test_create_update_delete(self):
+        with self.session() as db:
+            db.add_all([self.contact(i, date(1990, 5, 1)) for i in range(3)])
+            db.commit()
+            contacts = db.query(Contact).order_by(Contact.id).all()
+            contacts[0].birthday = date(1990, 6, 2)
+            db.delete(contacts[1])
+            db.commit()
+            contacts[2].lastname = "Updated"
+            db.add(self.contact(3, date(1990, 5, 1)))
+            db.rollback()
+        counters = stats.contact_stats.get(f"0:{self.user_id}")
+        self.assertEqual(counters["total"], 2)
+        self.assertEqual((counters["d:501"], counters["d:602"]), (1, 1))
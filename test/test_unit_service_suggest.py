@@ -0,0 +1,84 @@
+import unittest
+
+import fakeredis
+
+from src.services.suggest import SuggestIndex
+
+
+class TestSuggestIndex(unittest.TestCase):
+    def setUp(self):
+        self.r = fakeredis.FakeRedis()
+        self.index = SuggestIndex(lambda: self.r, ttl=60)
+        self.index.build(
+            "0:1",
+            [
+                (1, "Olena", "Shevchenko", "olena@example.com"),
+                (2, "Oleh", "Melnyk", None),
+                (3, "Taras", "Oliinyk", "taras@example.com"),
+            ],
+        )
+
+    def ids(self, prefix, limit=10):
+        return [c["id"] for c in self.index.suggest("0:1", prefix, limit)]
+
+    def test_prefixes(self):
+        self.assertEqual(self.ids("ol"), [2, 1, 3])
+        self.assertEqual(self.ids("OL", limit=1), [2])
+        self.assertEqual(self.ids("taras@"), [3])
+        self.assertEqual(self.ids("oleh m"), [2])
+        self.assertEqual(self.ids("x"), [])
+        self.assertIsNone(self.index.suggest("0:2", "ol", 10))
+
+    def test_apply_changes(self):
+        self.index.apply(
+            [
+                ("0:1", "updated", 1, ("Alena", "Shevchenko", "olena@example.com")),
+                ("0:1", "deleted", 2, None),
+                ("0:1", "created", 4, ("Olga", "Rudenko", None)),
+            ]
+        )
+        self.assertEqual(self.ids("ole"), [1])
+        self.assertEqual(self.ids("ol"), [1, 4, 3])
+        self.assertEqual(self.ids("alena"), [1])
+        self.assertEqual(self.r.ttl("suggest:0:1"), 60)
+
+    def test_apply_skips_unbuilt_index(self):
+        self.index.apply([("0:2", "created", 5, ("Olga", "Rudenko", None))])
+        self.assertFalse(self.r.exists("suggest:0:2", "suggest:0:2:members"))
+        self.assertIsNone(self.index.suggest("0:2", "ol", 10))
+
+    def test_build_skipped_after_commit(self):
+        version = self.index.version("0:2")
+        self.index.apply([("0:2", "created", 5, ("Olga", "Rudenko", None))])
+        self.assertFalse(self.index.build("0:2", [], version))
+        self.assertIsNone(self.index.suggest("0:2", "ol", 10))
+        version = self.index.version("0:2")
+        rows = [(5, "Olga", "Rudenko", None)]
+        self.assertTrue(self.index.build("0:2", rows, version))
+        self.assertEqual(self.ids("ol"), [2, 1, 3])
+        self.assertEqual(
+            self.index.suggest("0:2", "ol", 10),
+            [{"id": 5, "firstname": "Olga", "lastname": "Rudenko", "email": None}],
+        )
+
+    def test_search_matches_index(self):
+        rows = [
+            (1, "Olena", "Shevchenko", "olena@example.com"),
+            (2, "Oleh", "Melnyk", None),
+            (3, "Taras", "Oliinyk", "taras@example.com"),
+        ]
+        for prefix, limit in (("ol", 10), ("OL", 1), ("oleh m", 10), ("x", 10)):
+            self.assertEqual(
+                self.index.search(rows, prefix, limit),
+                self.index.suggest("0:1", prefix, limit),
+            )
+
+    def test_reads_keep_expiry(self):
+        self.r.expire("suggest:0:1:ready", 5)
+        self.ids("ol")
+        self.index.apply([("0:1", "deleted", 2, None)])
+        self.assertLessEqual(self.r.ttl("suggest:0:1:ready"), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from starlette.requests import Request
+
+from src.conf.config import settings
+from src.services.throttle import client_ip
+
+
+def make_request(peer: str, forwarded: str | None = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+
+class TestClientIp(unittest.TestCase):
+    def setUp(self):
+        self.trusted_proxies = settings.trusted_proxies
+        settings.trusted_proxies = ["10.0.0.0/8"]
+
+    def tearDown(self):
+        settings.trusted_proxies = self.trusted_proxies
+
+    def test_no_header(self):
+        self.assertEqual(client_ip(make_request("10.0.0.1")), "10.0.0.1")
+
+    def test_untrusted_peer(self):
+        request = make_request("203.0.113.7", "198.51.100.1")
+        self.assertEqual(client_ip(request), "203.0.113.7")
+
+    def test_trusted_peer(self):
+        request = make_request("10.0.0.1", "198.51.100.1")
+        self.assertEqual(client_ip(request), "198.51.100.1")
+
+    def test_spoofed_header_behind_proxy(self):
+        request = make_request("10.0.0.1", "1.2.3.4, 198.51.100.1, 10.0.0.2")
+        self.assertEqual(client_ip(request), "198.51.100.1")
+
+
+if __name__ == "__main__":
+    unittest.main()